@@ -0,0 +1,98 @@
+"""
+Load posts with comments, replies and likes through the commands, one post at a time, and through the bulk
+import, for each batch size, in rows per second.
+
+    python -m benchmarks.bulk_import --posts 2000 --comments 4 --likes 4 --batch-size 500 2000 10000
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import typing as t
+import uuid
+
+from src.app import bootstrap
+from src.app import views
+from src.app.adapters import importer
+from src.app.domain import commands
+from src.app.domain import model
+from src.app.service_layer import unit_of_work
+
+
+def write(path: str, posts: int, comments: int, likes: int) -> int:
+    """
+    Write `posts` posts, each with `comments` comments, every other one a reply, and `likes` likes. Returns the number of rows.
+    """
+    author_id = str(uuid.uuid4())
+    rows = 0
+    with open(path, "w") as f:
+        for _ in range(posts):
+            post_id = model.uuid7()
+            lines: list[dict[str, t.Any]] = [
+                {"type": "post", "id": post_id, "title": "benchmark import", "content": "benchmark content", "author_id": author_id}
+            ]
+            comment_id = None
+            for i in range(comments):
+                level, parent = (1, comment_id) if i % 2 else (0, None)
+                comment_id = model.uuid7()
+                lines.append(
+                    {
+                        "type": "comment",
+                        "id": comment_id,
+                        "content": "c",
+                        "author_id": author_id,
+                        "level": level,
+                        "post_id": post_id,
+                        "comment_id": parent,
+                    }
+                )
+            lines += [{"type": "like", "id": model.uuid7(), "user_id": f"user-{i}", "post_id": post_id} for i in range(likes)]
+            f.writelines(json.dumps(line) + "\n" for line in lines)
+            rows += len(lines)
+    return rows
+
+
+def through_commands(bus, posts: int, comments: int, likes: int) -> int:
+    author_id = str(uuid.uuid4())
+    for _ in range(posts):
+        title = f"benchmark import {uuid.uuid4()}"
+        bus.handle(commands.CreatePostCommand(title=title, content="benchmark content", author_id=author_id))
+        post_id = views.find_post(title, bus.uow)[0]["id"]
+        for _ in range(comments):
+            bus.handle(commands.CommentPostCommand(post_id=post_id, user_id=author_id, content="c"))
+        for i in range(likes):
+            bus.handle(commands.LikePostCommand(post_id=post_id, user_id=f"user-{i}"))
+    return posts * (1 + comments + likes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--posts", type=int, default=2_000)
+    parser.add_argument("--comments", type=int, default=4)
+    parser.add_argument("--likes", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[500, 2_000, 10_000])
+    args = parser.parse_args()
+
+    uow = unit_of_work.SqlAlchemyUnitOfWork()
+    bus = bootstrap.bootstrap(uow=uow)
+    print(f"{'load':>16} {'rows':>8} {'seconds':>8} {'rows/s':>9}")
+
+    sample = max(args.posts // 20, 1)
+    start = time.perf_counter()
+    rows = through_commands(bus, sample, args.comments, args.likes)
+    elapsed = time.perf_counter() - start
+    print(f"{'commands':>16} {rows:>8} {elapsed:>8.2f} {rows / elapsed:>9.0f}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for batch_size in args.batch_size:
+            path = os.path.join(tmp, f"{batch_size}.ndjson")
+            rows = write(path, args.posts, args.comments, args.likes)
+            with uow.session_factory() as session:
+                stats = importer.from_file(session, path, batch_size=batch_size)
+            print(f"{f'import {batch_size}':>16} {rows:>8} {stats.seconds:>8.2f} {stats.rows_per_second:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
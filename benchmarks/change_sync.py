@@ -0,0 +1,71 @@
+"""
+Compare how much a client downloads to catch up after `--edits` edits: refetching every page of an author's
+posts against reading the change log from its last cursor.
+
+    python -m benchmarks.change_sync --posts 500 --edits 5 10 50
+"""
+
+import argparse
+import time
+
+import sqlalchemy as sa
+
+from benchmarks.query_counts import seed
+from src.app import bootstrap
+from src.app import views
+from src.app.adapters import orm
+from src.app.domain import commands
+from src.app.entrypoints import schema
+
+
+def refetch(bus, author_id: str, page: int) -> bytes:
+    body, offset = b"", 0
+    while True:
+        params = schema.GetPostsRequest(title=None, content=None, author_id=author_id, order=["-created_time"], limit=page, offset=offset)
+        posts = views.get_posts(params, bus.uow, feed=True)
+        body += views.dumps(posts)
+        if len(posts) < page:
+            return body
+        offset += page
+
+
+def sync(bus, cursor: int, page: int) -> bytes:
+    body = b""
+    while True:
+        result = views.get_changes(cursor, page, bus.uow)
+        body += views.dumps(result)
+        cursor = result["cursor"]
+        if not result["has_more"]:
+            return body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--posts", type=int, default=500)
+    parser.add_argument("--edits", type=int, nargs="+", default=[5, 10, 50])
+    parser.add_argument("--page", type=int, default=100)
+    args = parser.parse_args()
+
+    bus = bootstrap.bootstrap()
+    author_id = seed(bus, args.posts, 1)
+    params = schema.GetPostsRequest(title=None, content=None, author_id=author_id, order=["-created_time"], limit=args.posts, offset=0)
+    post_ids = [post["id"] for post in views.get_posts(params, bus.uow, feed=True)]
+
+    print(f"{'edits':>6} {'refetch KB':>11} {'refetch ms':>11} {'sync KB':>8} {'sync ms':>8}")
+    for edits in args.edits:
+        with bus.uow.unit_of_work() as uow_ctx:
+            cursor = uow_ctx.session.scalar(sa.select(sa.func.coalesce(sa.func.max(orm.changes.c.id), 0)))
+        for post_id in post_ids[:edits]:
+            bus.handle(commands.EditPostCommand(post_id=post_id, user_id=author_id, title="edited", content="edited"))
+
+        start = time.perf_counter()
+        full = refetch(bus, author_id, args.page)
+        full_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        delta = sync(bus, cursor, args.page)
+        delta_ms = (time.perf_counter() - start) * 1000
+        print(f"{edits:>6} {len(full) / 1024:>11.1f} {full_ms:>11.1f} {len(delta) / 1024:>8.1f} {delta_ms:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
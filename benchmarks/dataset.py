@@ -0,0 +1,194 @@
+"""
+Generate a reproducible dataset of posts with images, comment threads and likes, for benchmarks and capacity tests.
+
+The same `--seed` and shape always give the same records, ids and times included. Likes, comments and images per
+post follow power laws: most posts get a few, some get very many. Comments reply to recent comments more often
+than to old ones, so threads go down to the deepest level a reply may have. Text is drawn from a pool of Faker
+sentences made once per seed, as making them per record would take longer than loading them.
+
+Records are in the line format of the export. They are written to `--out`, as CSV for a .csv path and NDJSON
+otherwise, for `python main.py --import`, or without `--out` loaded straight into the configured database.
+Image rows point to no stored object.
+
+    python -m benchmarks.dataset --posts 20000 --seed 1 --out dataset.ndjson
+    python -m benchmarks.dataset --posts 20000 --seed 1
+"""
+
+import argparse
+import collections
+import csv
+import dataclasses
+import datetime
+import json
+import random
+import time
+import typing as t
+import uuid
+
+import faker
+import sqlalchemy as sa
+
+from src.app.adapters import export
+from src.app.adapters import importer
+from src.app.domain import model
+from src.app.service_layer.unit_of_work import POSTGRES_URI
+
+MAX_LEVEL = max(t.get_args(model.MAX_LEVEL_DEPTH))
+EPOCH = datetime.datetime(2024, 1, 1)
+
+
+@dataclasses.dataclass(frozen=True)
+class Shape:
+    """
+    How the generated posts look. The lower a power law's alpha, the heavier its tail.
+    """
+
+    users: int = 100_000
+    likes_alpha: float = 1.2
+    max_likes: int = 10_000
+    comments_alpha: float = 1.3
+    max_comments: int = 1_000
+    comment_likes_alpha: float = 2.0
+    max_comment_likes: int = 500
+    reply_ratio: float = 0.6
+    images_alpha: float = 1.5
+    max_images: int = 30
+
+
+def _power_law(rng: random.Random, alpha: float, cap: int) -> int:
+    return min(int(rng.paretovariate(alpha)) - 1, cap)
+
+
+def _uuid7(rng: random.Random, when: datetime.datetime) -> str:
+    # model.uuid7 with the clock and randomness of the dataset
+    value = int(when.replace(tzinfo=datetime.timezone.utc).timestamp() * 1000) << 80 | rng.getrandbits(80)
+    value = value & ~(0xF << 76) | 0x7 << 76
+    value = value & ~(0x3 << 62) | 0x2 << 62
+    return str(uuid.UUID(int=value))
+
+
+def generate(posts: int, seed: int = 0, shape: Shape = Shape()) -> t.Iterator[dict]:
+    """
+    Yield `posts` posts, each followed by its images, its comments parents first, and the likes of both.
+    """
+    rng = random.Random(seed)
+    fake = faker.Faker()
+    fake.seed_instance(seed)
+    titles = [fake.sentence() for _ in range(1_000)]
+    paragraphs = [fake.paragraph(nb_sentences=5) for _ in range(1_000)]
+    sentences = [fake.sentence(nb_words=12) for _ in range(1_000)]
+
+    def user() -> str:
+        return f"user-{rng.randrange(shape.users)}"
+
+    def likes(when: datetime.datetime, n: int, post_id: str, comment_id: str | None) -> t.Iterator[dict]:
+        for i in rng.sample(range(shape.users), min(n, shape.users)):
+            at = when + datetime.timedelta(seconds=rng.expovariate(1 / 3600))
+            yield {
+                "type": "like",
+                "id": _uuid7(rng, at),
+                "user_id": f"user-{i}",
+                "post_id": post_id,
+                "comment_id": comment_id,
+                "created_time": at.isoformat(),
+            }
+
+    clock = EPOCH
+    for _ in range(posts):
+        clock += datetime.timedelta(seconds=rng.expovariate(1 / 60))
+        post_id, created = _uuid7(rng, clock), clock.isoformat()
+        yield {
+            "type": "post",
+            "id": post_id,
+            "title": rng.choice(titles),
+            "content": rng.choice(paragraphs),
+            "author_id": user(),
+            "version": 1,
+            "created_time": created,
+            "updated_time": created,
+        }
+        for i in range(_power_law(rng, shape.images_alpha, shape.max_images)):
+            yield {
+                "type": "image",
+                "id": _uuid7(rng, clock),
+                "path": f"posts/{post_id}/{i}.png",
+                "post_id": post_id,
+                "created_time": created,
+            }
+
+        # comments that may still be replied to, newest last
+        open_comments: list[tuple[str, int]] = []
+        comment_likes = []
+        when = clock
+        for _ in range(_power_law(rng, shape.comments_alpha, shape.max_comments)):
+            when += datetime.timedelta(seconds=rng.expovariate(1 / 600))
+            parent_id, level = None, 0
+            if open_comments and rng.random() < shape.reply_ratio:
+                parent_id, parent_level = open_comments[max(len(open_comments) - 1 - int(rng.expovariate(0.5)), 0)]
+                level = parent_level + 1
+            comment_id = _uuid7(rng, when)
+            if level < MAX_LEVEL:
+                open_comments.append((comment_id, level))
+            yield {
+                "type": "comment",
+                "id": comment_id,
+                "content": rng.choice(sentences),
+                "author_id": user(),
+                "level": level,
+                "post_id": post_id,
+                "comment_id": parent_id,
+                "version": 1,
+                "created_time": when.isoformat(),
+                "updated_time": when.isoformat(),
+            }
+            comment_likes.append((when, comment_id, _power_law(rng, shape.comment_likes_alpha, shape.max_comment_likes)))
+
+        yield from likes(clock, _power_law(rng, shape.likes_alpha, shape.max_likes), post_id, None)
+        for when, comment_id, n in comment_likes:
+            yield from likes(when, n, post_id, comment_id)
+
+
+def write(records: t.Iterable[dict], path: str) -> None:
+    with open(path, "w", newline="") as f:
+        if path.endswith(".csv"):
+            fields = ["type"] + list(dict.fromkeys(name for fields in importer.FIELDS.values() for name, _ in fields))
+            writer = csv.DictWriter(f, fields)
+            writer.writeheader()
+            writer.writerows(records)
+        else:
+            f.writelines(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--users", type=int, default=Shape.users)
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    args = parser.parse_args()
+
+    counts: collections.Counter[str] = collections.Counter()
+
+    def counted() -> t.Iterator[dict]:
+        for record in generate(args.posts, args.seed, Shape(users=args.users)):
+            counts[record["type"]] += 1
+            yield record
+
+    start = time.perf_counter()
+    if args.out:
+        write(counted(), args.out)
+    else:
+        with sa.create_engine(POSTGRES_URI).connect() as conn:
+            importer.load(conn, enumerate(counted(), 1), args.batch_size)
+    elapsed = time.perf_counter() - start
+
+    rows = sum(counts.values())
+    print(
+        " ".join(f"{entity}s={counts[entity]}" for entity in export.TABLES),
+        f"rows={rows} seconds={elapsed:.1f} rows/s={rows / elapsed:.0f}",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Compare exporting an author's posts by paging through GET /posts with offsets against the streaming NDJSON
+export, in time and peak Python memory, as the number of posts grows.
+
+    python -m benchmarks.export --posts 1000 5000 20000
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.query_counts import seed
+from src.app import bootstrap
+from src.app import views
+from src.app.entrypoints import schema
+from src.app.service_layer import unit_of_work
+
+
+def measure(fn) -> tuple[int, float, float]:
+    # timed apart from the traced run, as tracing slows allocations down
+    start = time.perf_counter()
+    rows = fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return rows, elapsed, peak / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--posts", type=int, nargs="+", default=[1_000, 5_000, 20_000])
+    parser.add_argument("--page", type=int, default=100)
+    args = parser.parse_args()
+
+    uow = unit_of_work.SqlAlchemyUnitOfWork()
+    bus = bootstrap.bootstrap(uow=uow)
+    print(f"{'posts':>7} {'offset s':>9} {'offset MiB':>11} {'export s':>9} {'export MiB':>11}")
+    for posts in args.posts:
+        author_id = seed(bus, posts, 0)
+
+        def paged() -> int:
+            rows, offset = 0, 0
+            while True:
+                params = schema.GetPostsRequest(
+                    title=None, content=None, author_id=author_id, order=["+created_time"], limit=args.page, offset=offset
+                )
+                page = views.get_posts(params, bus.uow, core=True)
+                rows += len(page)
+                if len(page) < args.page:
+                    return rows
+                offset += args.page
+
+        def streamed() -> int:
+            return sum(chunk.count(b"\n") for chunk in views.export_ndjson(uow, author_id))
+
+        _, offset_s, offset_mib = measure(paged)
+        _, export_s, export_mib = measure(streamed)
+        print(f"{posts:>7} {offset_s:>9.2f} {offset_mib:>11.1f} {export_s:>9.2f} {export_mib:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Measure the fan-out of live post updates: events published per window, messages serialized and the time
+a flush takes to reach every subscriber, compared with serializing one message per event per subscriber.
+
+    python -m benchmarks.live_updates --subscribers 1000 10000 --posts 10 --events 1000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from src.app.adapters import broadcast
+
+
+async def run(subscribers: int, posts: int, events: int) -> dict:
+    broadcaster = broadcast.Broadcaster(window=3600, queue_size=events + 1)
+    post_ids = [f"post-{i}" for i in range(posts)]
+    queues = [broadcaster.subscribe(post_ids[i % posts]) for i in range(subscribers)]
+
+    start = time.perf_counter()
+    for _ in range(events):
+        broadcaster.publish(random.choice(post_ids), like_delta=1)
+    publish = time.perf_counter() - start
+
+    start = time.perf_counter()
+    broadcaster.flush()
+    flush = time.perf_counter() - start
+
+    # what sending every event to every subscriber of its post, unmerged, would cost
+    start = time.perf_counter()
+    for _ in range(events):
+        update = {"post_id": random.choice(post_ids), "like_delta": 1, "comment_delta": 0}
+        for _ in range(subscribers // posts):
+            f"event: update\ndata: {json.dumps(update)}\n\n".encode()
+    naive = time.perf_counter() - start
+
+    delivered = sum(queue.qsize() for queue in queues)
+    return {
+        "publish_us": publish / events * 1e6,
+        "flush_ms": flush * 1e3,
+        "naive_ms": naive * 1e3,
+        "delivered": delivered,
+        **broadcaster.stats.model_dump(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[1_000, 10_000])
+    parser.add_argument("--posts", type=int, default=10)
+    parser.add_argument("--events", type=int, default=1_000)
+    args = parser.parse_args()
+
+    print(f"{'subscribers':>12} {'publish us':>11} {'messages':>9} {'delivered':>10} {'flush ms':>9} {'unmerged ms':>12}")
+    for subscribers in args.subscribers:
+        r = asyncio.run(run(subscribers, args.posts, args.events))
+        print(
+            f"{subscribers:>12} {r['publish_us']:>11.2f} {r['messages']:>9} {r['delivered']:>10} {r['flush_ms']:>9.2f} {r['naive_ms']:>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Load the API with a mix of reads and writes from `--concurrency` clients for `--duration` seconds, and report the
+throughput and latency percentiles and histogram of every operation as JSON.
+
+Without `--url` the app is driven in-process through ASGI, with image uploads kept in memory. With `--url`
+requests go to a running server, for example `uvicorn src.app.entrypoints.app:app`, and uploads to its storage.
+Each run creates its own `--posts` posts first, the first `--hot` of them getting most of the likes.
+
+    python -m benchmarks.load_test --mix mixed --concurrency 32 --duration 30 --out report.json
+    python -m benchmarks.load_test --mix feed=60,like_hot=40 --url http://127.0.0.1:8000
+"""
+
+import argparse
+import asyncio
+import bisect
+import collections
+import contextlib
+import dataclasses
+import itertools
+import json
+import random
+import time
+import typing as t
+import uuid
+
+import httpx
+
+from src.app.adapters import file_storage
+
+MIXES = {
+    "read": {"feed": 50, "post": 30, "comments": 20},
+    "mixed": {"feed": 40, "post": 20, "comments": 10, "like_hot": 15, "comment": 10, "attach": 5},
+    "write": {"like_hot": 40, "comment": 40, "attach": 20},
+}
+# upper bounds of the latency histogram buckets, in milliseconds
+BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1_000, 2_000, 5_000]
+
+
+@dataclasses.dataclass
+class Target:
+    author_id: str
+    post_ids: list[str]
+    hot_ids: list[str]
+    # cumulative weights of the hot posts, the k-th drawing 1/k of the likes
+    hot_weights: list[float]
+
+
+@dataclasses.dataclass
+class Samples:
+    latencies: list[float] = dataclasses.field(default_factory=list)
+    statuses: collections.Counter[str] = dataclasses.field(default_factory=collections.Counter)
+
+
+Operation = t.Callable[[httpx.AsyncClient, random.Random, Target], t.Awaitable[httpx.Response]]
+
+
+async def feed(client: httpx.AsyncClient, rng: random.Random, target: Target) -> httpx.Response:
+    return await client.get("/posts", params={"limit": 20, "offset": 20 * rng.randrange(5)}, headers={"user-id": "load-test"})
+
+
+async def post(client: httpx.AsyncClient, rng: random.Random, target: Target) -> httpx.Response:
+    return await client.get(f"/posts/{rng.choice(target.post_ids)}", headers={"user-id": "load-test"})
+
+
+async def comments(client: httpx.AsyncClient, rng: random.Random, target: Target) -> httpx.Response:
+    return await client.get(f"/posts/{rng.choice(target.post_ids)}/comments", headers={"user-id": "load-test"})
+
+
+async def like_hot(client: httpx.AsyncClient, rng: random.Random, target: Target) -> httpx.Response:
+    [post_id] = rng.choices(target.hot_ids, cum_weights=target.hot_weights)
+    return await client.post(f"/posts/{post_id}/like", headers={"user-id": f"load-test-{rng.randrange(100_000)}"})
+
+
+async def comment(client: httpx.AsyncClient, rng: random.Random, target: Target) -> httpx.Response:
+    post_id = rng.choice(target.post_ids)
+    return await client.post(f"/posts/{post_id}/comments", json={"content": "load test comment"}, headers={"user-id": "load-test"})
+
+
+async def attach(client: httpx.AsyncClient, rng: random.Random, target: Target) -> httpx.Response:
+    files = {"images": (f"{uuid.uuid4()}.png", rng.randbytes(4096), "image/png")}
+    return await client.post(f"/posts/{rng.choice(target.post_ids)}/images", files=files, headers={"user-id": target.author_id})
+
+
+OPERATIONS: dict[str, Operation] = {op.__name__: op for op in (feed, post, comments, like_hot, comment, attach)}
+
+
+def parse_mix(value: str) -> dict[str, int]:
+    if value in MIXES:
+        return MIXES[value]
+    mix = {name: int(weight) for name, _, weight in (part.partition("=") for part in value.split(","))}
+    if unknown := set(mix) - set(OPERATIONS):
+        raise argparse.ArgumentTypeError(f"unknown operations {sorted(unknown)}, expected some of {sorted(OPERATIONS)}")
+    return mix
+
+
+async def prepare(client: httpx.AsyncClient, posts: int, hot: int) -> Target:
+    author_id = f"load-test-author-{uuid.uuid4()}"
+    for i in range(posts):
+        response = await client.post(
+            "/posts", json={"title": f"load test {i}", "content": "load test content"}, headers={"user-id": author_id}
+        )
+        response.raise_for_status()
+    post_ids: list[str] = []
+    while len(post_ids) < posts:
+        params: dict[str, str | int] = {
+            "author_id": author_id,
+            "order": "+created_time",
+            "limit": 100,
+            "offset": len(post_ids),
+            "fields": "id",
+        }
+        response = await client.get("/posts", params=params, headers={"user-id": author_id})
+        response.raise_for_status()
+        post_ids += [p["id"] for p in response.json()]
+    hot_ids = post_ids[:hot]
+    return Target(author_id, post_ids, hot_ids, list(itertools.accumulate(1 / k for k in range(1, len(hot_ids) + 1))))
+
+
+async def worker(
+    client: httpx.AsyncClient,
+    rng: random.Random,
+    target: Target,
+    mix: dict[str, int],
+    record_from: float,
+    until: float,
+    samples: dict[str, Samples],
+) -> None:
+    names, weights = list(mix), list(itertools.accumulate(mix.values()))
+    while (start := time.perf_counter()) < until:
+        [name] = rng.choices(names, cum_weights=weights)
+        try:
+            status = str((await OPERATIONS[name](client, rng, target)).status_code)
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        if start >= record_from:
+            samples[name].latencies.append(time.perf_counter() - start)
+            samples[name].statuses[status] += 1
+
+
+def summarize(samples: Samples, seconds: float) -> dict:
+    latencies = sorted(ms * 1000 for ms in samples.latencies)
+    errors = sum(n for status, n in samples.statuses.items() if not status.isdigit() or int(status) >= 400)
+    if not latencies:
+        return {"requests": 0, "errors": errors}
+
+    def percentile(q: float) -> float:
+        return round(latencies[min(int(q * len(latencies)), len(latencies) - 1)], 3)
+
+    counts = [0] * (len(BUCKETS) + 1)
+    for latency in latencies:
+        counts[bisect.bisect_left(BUCKETS, latency)] += 1
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": dict(samples.statuses),
+        "rps": round(len(latencies) / seconds, 1),
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 3),
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+            "max": round(latencies[-1], 3),
+        },
+        "histogram_ms": {f"<={bound}": n for bound, n in zip(BUCKETS + ["inf"], counts)},
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    async with contextlib.AsyncExitStack() as stack:
+        if args.url:
+            client = httpx.AsyncClient(base_url=args.url, timeout=30)
+        else:
+            from src.app.entrypoints import app
+
+            api = app.create_app()
+            api.state.bus.uow.storage_factory = file_storage.InMemoryFileStorage
+            # ASGITransport doesn't run the lifespan that maps the models and connects
+            await stack.enter_async_context(api.router.lifespan_context(api))
+            client = httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=api, raise_app_exceptions=False), base_url="http://load-test", timeout=30
+            )
+
+        await stack.enter_async_context(client)
+        target = await prepare(client, args.posts, args.hot)
+        samples = {name: Samples() for name in args.mix}
+        start = time.perf_counter()
+        record_from, until = start + args.warmup, start + args.warmup + args.duration
+        await asyncio.gather(
+            *(worker(client, random.Random(args.seed + i), target, args.mix, record_from, until, samples) for i in range(args.concurrency))
+        )
+
+    operations = {name: summarize(s, args.duration) for name, s in samples.items()}
+    requests = sum(s["requests"] for s in operations.values())
+    return {
+        "target": args.url or "asgi",
+        "mix": args.mix,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "requests": requests,
+        "errors": sum(s["errors"] for s in operations.values()),
+        "rps": round(requests / args.duration, 1),
+        "operations": operations,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mix", type=parse_mix, default="mixed", help=f"one of {sorted(MIXES)} or op=weight,... of {sorted(OPERATIONS)}")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--posts", type=int, default=200)
+    parser.add_argument("--hot", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", default=None)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print(f"{'operation':<10} {'requests':>9} {'errors':>7} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, s in report["operations"].items():
+        latency = s.get("latency_ms", {})
+        row = [latency.get(k, float("nan")) for k in ("p50", "p95", "p99", "max")]
+        print(f"{name:<10} {s['requests']:>9} {s['errors']:>7} {s.get('rps', 0):>8.1f}", " ".join(f"{v:>8.1f}" for v in row))
+    print(f"{'total':<10} {report['requests']:>9} {report['errors']:>7} {report['rps']:>8.1f}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
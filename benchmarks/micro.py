@@ -0,0 +1,274 @@
+"""
+Time the hot paths of the domain, the message bus, the unit of work and the repository, one call at a time, and
+flag the ones that got slower than a saved baseline.
+
+Each case is timed like `timeit`: looped for at least 0.2 seconds, `--repeat` times, keeping the fastest run.
+Cases under `db.` need the configured database, the others run in memory.
+
+    python -m benchmarks.micro run --save benchmarks/baselines/main.json
+    python -m benchmarks.micro compare benchmarks/baselines/main.json --threshold 0.1
+    python -m benchmarks.micro compare old.json new.json
+"""
+
+import argparse
+import functools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import timeit
+import typing as t
+import uuid
+
+from src.app import bootstrap
+from src.app import views
+from src.app.adapters import orm
+from src.app.adapters import repository
+from src.app.domain import commands
+from src.app.domain import events
+from src.app.domain import model
+from src.app.entrypoints import schema
+from src.app.service_layer import messagebus
+from src.app.service_layer import unit_of_work
+
+# a case sets itself up and returns the call to time
+CASES: dict[str, t.Callable[[], t.Callable[[], t.Any]]] = {}
+
+
+def case(name: str):
+    def register(setup: t.Callable[[], t.Callable[[], t.Any]]):
+        CASES[name] = setup
+        return setup
+
+    return register
+
+
+def _post(images: int = 3) -> model.Post:
+    post = model.Post.create("benchmark title", "benchmark content " * 20, "benchmark-author")
+    post.likes, post.comments, post.images = [], [], []
+    for i in range(images):
+        post.add_image(f"posts/{post.id}/{i}.png")
+    return post
+
+
+@case("domain.post_like_unlike")
+def post_like_unlike():
+    post = _post()
+
+    def like_unlike():
+        post.like_unlike("benchmark-user")
+        post.like_unlike("benchmark-user")
+
+    return like_unlike
+
+
+@case("domain.post_model_dump")
+def post_model_dump():
+    return _post().model_dump
+
+
+@case("domain.comment_model_dump")
+def comment_model_dump():
+    return model.Comment.create("benchmark comment", "benchmark-author", 0, str(uuid.uuid4())).model_dump
+
+
+@case("bus.command_construction")
+def command_construction():
+    return lambda: commands.CreatePostCommand(title="benchmark title", content="benchmark content", author_id="benchmark-author")
+
+
+@case("bus.handle_command")
+def handle_command():
+    def handler(cmd: commands.CreatePostCommand, uow: unit_of_work.AbstractUnitOfWork):
+        pass
+
+    uow = unit_of_work.InMemoryUnitOfWork()
+    injected = bootstrap.inject_dependencies(handler, {"uow": uow, "ranking": None})
+    bus = messagebus.MessageBus(uow, {}, {commands.CreatePostCommand: injected})
+    cmd = commands.CreatePostCommand(title="benchmark title", content="benchmark content", author_id="benchmark-author")
+    return lambda: bus.handle(cmd)
+
+
+@case("bus.handle_command_and_event")
+def handle_command_and_event():
+    uow = unit_of_work.InMemoryUnitOfWork()
+    post = _post(0)
+    uow.posts.seen = {post}
+    event = events.CreatedPostEvent(post_id=post.id, author_id=post.author_id)
+
+    def command_handler(cmd: commands.CreatePostCommand, uow: unit_of_work.AbstractUnitOfWork):
+        post.events.append(event)
+
+    def event_handler(event: events.CreatedPostEvent):
+        pass
+
+    bus = messagebus.MessageBus(
+        uow,
+        {events.CreatedPostEvent: [bootstrap.inject_dependencies(event_handler, {"uow": uow})]},
+        {commands.CreatePostCommand: bootstrap.inject_dependencies(command_handler, {"uow": uow})},
+    )
+    cmd = commands.CreatePostCommand(title="benchmark title", content="benchmark content", author_id="benchmark-author")
+    return lambda: bus.handle(cmd)
+
+
+@case("uow.collect_new_events_100_seen")
+def collect_new_events_100_seen():
+    uow = unit_of_work.InMemoryUnitOfWork()
+    uow.posts.seen = {_post(0) for _ in range(100)}
+    return lambda: list(uow.collect_new_events())
+
+
+@case("bus.create_and_like_post_in_memory")
+def create_and_like_post_in_memory():
+    # the handlers themselves, without the database
+    uow = unit_of_work.InMemoryUnitOfWork()
+    bus = bootstrap.bootstrap(start_orm=False, uow=uow)
+    posts = uow.posts
+
+    def create_and_like():
+        bus.handle(commands.CreatePostCommand(title="benchmark title", content="benchmark content", author_id="benchmark-author"))
+        post_id = next(reversed(posts.records))
+        bus.handle(commands.LikePostCommand(post_id=post_id, user_id="benchmark-user"))
+
+    return create_and_like
+
+
+@functools.cache
+def _bus() -> messagebus.MessageBus:
+    return bootstrap.bootstrap()
+
+
+def _db_post() -> str:
+    bus = _bus()
+    title = f"benchmark micro {uuid.uuid4()}"
+    bus.handle(commands.CreatePostCommand(title=title, content="benchmark content", author_id="benchmark-micro"))
+    return views.find_post(title, bus.uow)[0]["id"]
+
+
+@case("db.repository_get")
+def repository_get():
+    post_id = _db_post()
+    session = unit_of_work.SqlAlchemyUnitOfWork().session_factory()
+    posts = repository.SqlAlchemyRepository(session, model.Post)
+
+    def get():
+        posts.get(post_id)
+        session.expunge_all()
+        session.rollback()
+
+    return get
+
+
+@case("db.repository_query")
+def repository_query():
+    _db_post()
+    session = unit_of_work.SqlAlchemyUnitOfWork().session_factory()
+    posts = repository.SqlAlchemyRepository(session, model.Post)
+
+    def query():
+        posts.query(author_id="benchmark-micro", title="no such title")
+        session.rollback()
+
+    return query
+
+
+@case("db.views_get_posts")
+def views_get_posts():
+    _db_post()
+    params = schema.GetPostsRequest(title=None, content=None, author_id="benchmark-micro", order=["-created_time"], limit=10, offset=0)
+    return lambda: views.get_posts(params, _bus().uow, core=True)
+
+
+@case("db.views_get_posts_serialized")
+def views_get_posts_serialized():
+    _db_post()
+    params = schema.GetPostsRequest(title=None, content=None, author_id="benchmark-micro", order=["-created_time"], limit=10, offset=0)
+
+    def serialized():
+        posts = views.get_posts(params, _bus().uow, core=True)
+        return [schema.SparsePostResponse.model_validate(p).model_dump_json() for p in posts]
+
+    return serialized
+
+
+def measure(fn: t.Callable[[], t.Any], repeat: int) -> dict:
+    timer = timeit.Timer(fn)
+    loops, _ = timer.autorange()
+    runs = [seconds / loops * 1e9 for seconds in timer.repeat(repeat, loops)]
+    return {"ns": round(min(runs), 1), "median_ns": round(statistics.median(runs), 1), "loops": loops}
+
+
+def run(only: list[str], repeat: int) -> dict:
+    orm.start_mappers()
+    results = {}
+    for name, setup in CASES.items():
+        if only and not any(name.startswith(prefix) for prefix in only):
+            continue
+        results[name] = measure(setup(), repeat)
+        print(f"{name:<36} {results[name]['ns']:>14,.0f} ns", file=sys.stderr)
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {"commit": commit, "python": platform.python_version(), "machine": platform.node(), "cases": results}
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[str]:
+    """
+    Print the change of every case in both, returning the cases slower than `threshold` times their baseline.
+    """
+    regressions = []
+    print(f"{'case':<36} {'baseline ns':>14} {'current ns':>14} {'change':>8}")
+    for name, result in current["cases"].items():
+        if name not in baseline["cases"]:
+            continue
+        before, after = baseline["cases"][name]["ns"], result["ns"]
+        change = after / before - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<36} {before:>14,.0f} {after:>14,.0f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", action="append", default=[], help="run the cases starting with this prefix, e.g. domain.")
+    parser.add_argument("--repeat", type=int, default=5)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run")
+    run_parser.add_argument("--save", metavar="FILE", default=None)
+    compare_parser = subparsers.add_parser("compare")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current", nargs="?", default=None, help="saved results, or run the cases now")
+    compare_parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        results = run(args.only, args.repeat)
+        if args.save:
+            os.makedirs(os.path.dirname(args.save) or ".", exist_ok=True)
+            with open(args.save, "w") as f:
+                json.dump(results, f, indent=2)
+        else:
+            print(json.dumps(results, indent=2))
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if args.current:
+        with open(args.current) as f:
+            current = json.load(f)
+    else:
+        current = run(args.only, args.repeat)
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} cases regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
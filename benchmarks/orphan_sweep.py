@@ -0,0 +1,64 @@
+"""
+Upload `--objects` image objects, give a row to all but `--orphan-ratio` of them, and sweep the orphans:
+once deleting them one by one, once with multi-object deletes, for each page size.
+
+    python -m benchmarks.orphan_sweep --objects 2000 --orphan-ratio 0.5 --page-size 100 1000
+"""
+
+import argparse
+import datetime
+import io
+import time
+import uuid
+
+from src.app import bootstrap
+from src.app.adapters import file_storage
+from src.app.adapters import orphans
+from src.app.domain import model
+from src.app.service_layer import unit_of_work
+
+
+class OneByOne(file_storage.MinIOFileStorage):
+    def _delete_many(self, paths: list[str]) -> list[str]:
+        return file_storage.AbstractFileStorage._delete_many(self, paths)
+
+
+def upload(bus, storage: file_storage.MinIOFileStorage, n: int, orphan_ratio: float) -> str:
+    prefix = f"posts/benchmark-{uuid.uuid4()}/"
+    with bus.uow.unit_of_work("seed") as uow_ctx:
+        for i in range(n):
+            path = f"{prefix}{i:06}.png"
+            storage.client.put_object(storage.BUCKET_NAME, path, io.BytesIO(b"png"), 3)
+            if i >= n * orphan_ratio:
+                uow_ctx.images.add(model.Image.create(path, str(uuid.uuid4())))
+        uow_ctx.commit()
+    return prefix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--objects", type=int, default=2_000)
+    parser.add_argument("--orphan-ratio", type=float, default=0.5)
+    parser.add_argument("--page-size", type=int, nargs="+", default=[100, 1_000])
+    args = parser.parse_args()
+
+    uow = unit_of_work.SqlAlchemyUnitOfWork()
+    bus = bootstrap.bootstrap(uow=uow)
+
+    def lookup(paths: list[str]) -> set[str]:
+        with bus.uow.unit_of_work("sweep_orphan_images") as uow_ctx:
+            return orphans.referenced(uow_ctx.session, paths)
+
+    print(f"{'page':>6} {'delete':>11} {'listed':>7} {'orphans':>8} {'seconds':>8} {'objects/s':>10}")
+    for page_size in args.page_size:
+        for label, storage_class in [("one by one", OneByOne), ("bulk", file_storage.MinIOFileStorage)]:
+            storage = storage_class(uow.minio_client)
+            prefix = upload(bus, storage, args.objects, args.orphan_ratio)
+            start = time.perf_counter()
+            stats = orphans.sweep(storage, lookup, page_size=page_size, min_age=datetime.timedelta(0), prefix=prefix)
+            elapsed = time.perf_counter() - start
+            print(f"{page_size:>6} {label:>11} {stats.listed:>7} {stats.orphans:>8} {elapsed:>8.2f} {stats.listed / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
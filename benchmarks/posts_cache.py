@@ -0,0 +1,49 @@
+"""
+Replay a skewed mix of GET /posts queries with and without the result cache, with a write every `--write-every` reads.
+
+    python -m benchmarks.posts_cache --authors 20 --reads 2000 --write-every 100
+"""
+
+import argparse
+import random
+import time
+
+from benchmarks.query_counts import seed
+from src.app import bootstrap
+from src.app import views
+from src.app.adapters import cache
+from src.app.domain import commands
+from src.app.entrypoints import schema
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--authors", type=int, default=20)
+    parser.add_argument("--reads", type=int, default=2000)
+    parser.add_argument("--write-every", type=int, default=100)
+    parser.add_argument("--ttl", type=float, default=5.0)
+    args = parser.parse_args()
+
+    # the bus invalidates the cache the cached run reads through
+    posts_cache = cache.ResultCache(1024, args.ttl)
+    bus = bootstrap.bootstrap(posts_cache=posts_cache)
+    authors = [seed(bus, 10, 0) for _ in range(args.authors)]
+    # the default page plus author filters, the most popular authors queried the most
+    queries = [None] * args.authors + [author for rank, author in enumerate(authors) for _ in range(args.authors - rank)]
+
+    for label, read_cache in [("uncached", None), ("cached", posts_cache)]:
+        rng = random.Random(0)
+        start = time.perf_counter()
+        for i in range(args.reads):
+            author_id = rng.choice(queries)
+            params = schema.GetPostsRequest(title=None, content=None, author_id=author_id, order=["-created_time"], limit=10, offset=0)
+            views.get_posts(params, bus.uow, feed=True, cache=read_cache)
+            if i % args.write_every == 0:
+                bus.handle(commands.CreatePostCommand(title="write", content="write", author_id=rng.choice(authors)))
+        rate = args.reads / (time.perf_counter() - start)
+        hit_rate = read_cache.stats.hit_rate if read_cache is not None else 0.0
+        print(f"{label:<9} {rate:>8.0f} reads/s  hit rate {hit_rate:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Compare inserts, lookups and index size of random text uuid4 keys against native uuid7 keys.
+
+    python -m benchmarks.primary_keys --rows 200000
+"""
+
+import argparse
+import random
+import time
+import uuid
+
+import sqlalchemy as sa
+
+from src.app.domain import model
+from src.app.service_layer.unit_of_work import POSTGRES_URI
+
+KINDS = {
+    "text uuid4": ("varchar", lambda: str(uuid.uuid4())),
+    "uuid uuid7": ("uuid", model.uuid7),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--batch", type=int, default=5_000)
+    parser.add_argument("--lookups", type=int, default=5_000)
+    args = parser.parse_args()
+
+    engine = sa.create_engine(POSTGRES_URI)
+    print(f"{'keys':<12} {'inserts/s':>10} {'lookups/s':>10} {'index MB':>9}")
+    for label, (column_type, new_id) in KINDS.items():
+        with engine.begin() as conn:
+            conn.exec_driver_sql(f"CREATE TEMP TABLE bench_keys (id {column_type} PRIMARY KEY, post_id {column_type})")
+            ids = []
+            start = time.perf_counter()
+            for _ in range(0, args.rows, args.batch):
+                batch = [{"id": new_id(), "post_id": new_id()} for _ in range(args.batch)]
+                conn.execute(sa.text(f"INSERT INTO bench_keys VALUES (CAST(:id AS {column_type}), CAST(:post_id AS {column_type}))"), batch)
+                ids += [row["id"] for row in batch]
+            inserts = args.rows / (time.perf_counter() - start)
+
+            lookup = sa.text(f"SELECT post_id FROM bench_keys WHERE id = CAST(:id AS {column_type})")
+            sample = random.sample(ids, args.lookups)
+            start = time.perf_counter()
+            for id in sample:
+                conn.execute(lookup, {"id": id}).scalar()
+            lookups = args.lookups / (time.perf_counter() - start)
+
+            size = conn.exec_driver_sql("SELECT pg_relation_size('bench_keys_pkey')").scalar_one() / 2**20
+            conn.exec_driver_sql("DROP TABLE bench_keys")
+        print(f"{label:<12} {inserts:>10.0f} {lookups:>10.0f} {size:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
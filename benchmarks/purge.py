@@ -0,0 +1,71 @@
+"""
+Delete a post with many comments and likes, then purge it: the latency of the delete request, and the purge's
+throughput and longest transaction for each batch size.
+
+    python -m benchmarks.purge --comments 5000 --likes 5000 --batch-size 100 500 2000
+"""
+
+import argparse
+import time
+import uuid
+
+from src.app import bootstrap
+from src.app.adapters import purge
+from src.app.domain import commands
+from src.app.domain import model
+
+LEVELS: tuple[model.MAX_LEVEL_DEPTH, ...] = (0, 1, 2, 3)
+
+
+def seed(bus, comments: int, likes: int) -> tuple[str, str]:
+    author_id = str(uuid.uuid4())
+    with bus.uow.unit_of_work("seed") as uow_ctx:
+        post = model.Post.create("benchmark purge", "benchmark content", author_id)
+        uow_ctx.posts.add(post)
+        # threads of a comment and three nested replies
+        comment_ids: list[str] = []
+        for i in range(comments):
+            level = LEVELS[i % 4]
+            comment = model.Comment.create("benchmark comment", author_id, level, post.id, comment_ids[-1] if level else None)
+            uow_ctx.comments.add(comment)
+            comment_ids.append(comment.id)
+        for i in range(likes):
+            if i % 2:
+                uow_ctx.session.add(model.Like.create(f"user-{i}", post_id=post.id))
+            else:
+                uow_ctx.session.add(model.Like.create(f"user-{i}", comment_id=comment_ids[i % len(comment_ids)]))
+        uow_ctx.commit()
+        return post.id, author_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--comments", type=int, default=5_000)
+    parser.add_argument("--likes", type=int, default=5_000)
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[100, 500, 2_000])
+    args = parser.parse_args()
+
+    bus = bootstrap.bootstrap()
+    print(f"{'batch':>6} {'delete ms':>10} {'rows':>7} {'batches':>8} {'rows/s':>9} {'longest batch ms':>17}")
+    for batch_size in args.batch_size:
+        post_id, author_id = seed(bus, args.comments, args.likes)
+        start = time.perf_counter()
+        bus.handle(commands.DeletePostCommand(post_id=post_id, user_id=author_id))
+        delete_ms = (time.perf_counter() - start) * 1000
+
+        rows, batches, longest = 0, 0, 0.0
+        step = purge.Step()
+        start = time.perf_counter()
+        while not step.done:
+            batch_start = time.perf_counter()
+            with bus.uow.unit_of_work("purge_deleted_posts") as uow_ctx:
+                step = purge.step(uow_ctx.session, post_id, batch_size)
+                uow_ctx.commit()
+            longest = max(longest, time.perf_counter() - batch_start)
+            rows, batches = rows + step.rows, batches + 1
+        elapsed = time.perf_counter() - start
+        print(f"{batch_size:>6} {delete_ms:>10.1f} {rows:>7} {batches:>8} {rows / elapsed:>9.0f} {longest * 1000:>17.1f}")
+
+
+if __name__ == "__main__":
+    main()
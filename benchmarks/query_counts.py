@@ -0,0 +1,82 @@
+"""
+Report the SQL statements, rows and DB time each view and handler spends per call.
+
+    python -m benchmarks.query_counts --posts 50 --images 3
+"""
+
+import argparse
+import uuid
+
+from src.app import bootstrap
+from src.app import views
+from src.app.adapters import feed
+from src.app.adapters import query_stats
+from src.app.domain import commands
+from src.app.domain import model
+from src.app.entrypoints import schema
+
+
+def seed(bus, posts: int, images: int) -> str:
+    """
+    Create `posts` posts with `images` image rows and one comment each, all by a fresh author, and project them into post_feed.
+    """
+    author_id = str(uuid.uuid4())
+    with bus.uow.unit_of_work("seed") as uow_ctx:
+        post_ids = []
+        for i in range(posts):
+            post = model.Post.create(f"benchmark post {i}", "benchmark content", author_id)
+            uow_ctx.posts.add(post)
+            post_ids.append(post.id)
+            for j in range(images):
+                uow_ctx.images.add(model.Image.create(f"posts/{post.id}/{j}.png", post.id))
+            uow_ctx.comments.add(model.Comment.create("benchmark comment", author_id, 0, post.id))
+        uow_ctx.session.flush()
+        feed.project(uow_ctx.session, post_ids)
+        uow_ctx.commit()
+    return author_id
+
+
+def measure(label: str, fn) -> None:
+    with query_stats.capture() as captured:
+        fn()
+    statements = sum(stats.statements for stats in captured)
+    rows = sum(stats.rows for stats in captured)
+    db_time = sum(stats.db_time for stats in captured) * 1000
+    print(f"{label:<26} {statements:>10} {rows:>8} {db_time:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--posts", type=int, default=50)
+    parser.add_argument("--images", type=int, default=3)
+    args = parser.parse_args()
+
+    bus = bootstrap.bootstrap()
+    author_id = seed(bus, args.posts, args.images)
+    params = schema.GetPostsRequest(title=None, content=None, author_id=author_id, order=["-created_time"], limit=args.posts, offset=0)
+    post = views.get_posts(params, bus.uow)[0]
+    comment = views.get_comments(post["id"], bus.uow)[0]
+
+    print(f"{'endpoint':<26} {'statements':>10} {'rows':>8} {'db ms':>10}")
+    measure("GET /posts", lambda: views.get_posts(params, bus.uow))
+    measure("GET /posts (post_feed)", lambda: views.get_posts(params, bus.uow, feed=True))
+    measure("GET /posts/{id}", lambda: views.get_post(post["id"], bus.uow))
+    measure("GET /posts/{id}/comments", lambda: views.get_comments(post["id"], bus.uow))
+    measure("GET /comments/{id}/reply", lambda: views.get_reply_comments(comment["id"], bus.uow))
+    measure("POST /posts", lambda: bus.handle(commands.CreatePostCommand(title="t", content="c", author_id=author_id)))
+    measure("PUT /posts/{id}", lambda: bus.handle(commands.EditPostCommand(user_id=author_id, post_id=post["id"], title="t", content="c")))
+    measure("POST /posts/{id}/like", lambda: bus.handle(commands.LikePostCommand(post_id=post["id"], user_id=author_id)))
+    measure(
+        "POST /posts/{id}/comments", lambda: bus.handle(commands.CommentPostCommand(post_id=post["id"], user_id=author_id, content="c"))
+    )
+    measure("POST /comments/{id}/like", lambda: bus.handle(commands.LikeCommentCommand(comment_id=comment["id"], user_id=author_id)))
+    measure(
+        "POST /comments/{id}/reply",
+        lambda: bus.handle(commands.ReplyCommentCommand(comment_id=comment["id"], user_id=author_id, content="r")),
+    )
+    measure("DELETE /comments/{id}", lambda: bus.handle(commands.DeleteCommentCommand(comment_id=comment["id"], user_id=author_id)))
+    measure("DELETE /posts/{id}", lambda: bus.handle(commands.DeletePostCommand(post_id=post["id"], user_id=author_id)))
+
+
+if __name__ == "__main__":
+    main()
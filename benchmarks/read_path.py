@@ -0,0 +1,45 @@
+"""
+Compare rows/sec serialized by `views.get_posts` through the ORM, through Core projections and from post_feed.
+
+    python -m benchmarks.read_path --page 100 --repeat 50
+"""
+
+import argparse
+import json
+import time
+
+from benchmarks.query_counts import seed
+from src.app import bootstrap
+from src.app import views
+from src.app.entrypoints import schema
+
+
+def rows_per_second(fn, repeat: int) -> float:
+    fn()  # warm up
+    rows = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        page = fn()
+        json.dumps(page)
+        rows += len(page)
+    return rows / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--page", type=int, default=100)
+    parser.add_argument("--images", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    bus = bootstrap.bootstrap()
+    author_id = seed(bus, args.page, args.images)
+    params = schema.GetPostsRequest(title=None, content=None, author_id=author_id, order=["-created_time"], limit=args.page, offset=0)
+
+    for label, core, feed in [("orm", False, False), ("core", True, False), ("feed", False, True)]:
+        rate = rows_per_second(lambda: views.get_posts(params, bus.uow, core=core, feed=feed), args.repeat)
+        print(f"get_posts {label:<5} {rate:>10.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
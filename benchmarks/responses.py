@@ -0,0 +1,56 @@
+"""
+Compare req/sec of the read endpoints with validated responses and with FAST_RESPONSES.
+
+    python -m benchmarks.responses --page 100 --repeat 100
+"""
+
+import argparse
+import time
+
+from fastapi.testclient import TestClient
+
+from benchmarks.query_counts import seed
+from src.app import views
+from src.app.config import settings
+from src.app.entrypoints.app import app
+
+
+def requests_per_second(client: TestClient, url: str, repeat: int) -> float:
+    client.get(url)  # warm up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        client.get(url)
+    return repeat / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--page", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    bus = app.state.bus
+    # entered so the lifespan maps the models before seeding
+    with TestClient(app) as client:
+        author_id = seed(bus, args.page, 0)
+        client.headers["user-id"] = author_id
+        post = client.get(f"/posts?author_id={author_id}&limit=1").json()[0]
+        comment_id = views.get_comments(post["id"], bus.uow)[0]["id"]
+        urls = {
+            "GET /posts": f"/posts?author_id={author_id}&limit={args.page}",
+            "GET /posts/{id}": f"/posts/{post['id']}",
+            "GET /posts/{id}/comments": f"/posts/{post['id']}/comments",
+            "GET /comments/{id}/reply": f"/comments/{comment_id}/reply",
+        }
+
+        print(f"{'endpoint':<26} {'validated':>10} {'fast':>10}")
+        for label, url in urls.items():
+            rates = []
+            for fast in (False, True):
+                settings.FAST_RESPONSES = fast
+                rates.append(requests_per_second(client, url, args.repeat))
+            print(f"{label:<26} {rates[0]:>10.0f} {rates[1]:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
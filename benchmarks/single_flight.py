@@ -0,0 +1,42 @@
+"""
+Fire concurrent GET /posts/{id} reads for one post, with and without single flight, and count the database reads.
+
+    python -m benchmarks.single_flight --threads 64 --rounds 20
+"""
+
+import argparse
+import concurrent.futures
+import time
+
+from benchmarks.query_counts import seed
+from src.app import bootstrap
+from src.app import views
+from src.app.adapters import query_stats
+from src.app.adapters import singleflight
+from src.app.entrypoints import schema
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    bus = bootstrap.bootstrap()
+    author_id = seed(bus, 1, 2)
+    params = schema.GetPostsRequest(title=None, content=None, author_id=author_id, order=[], limit=1, offset=0)
+    post_id = views.get_posts(params, bus.uow, feed=True)[0]["id"]
+
+    with concurrent.futures.ThreadPoolExecutor(args.threads) as pool:
+        for label, flights in [("direct", None), ("single flight", singleflight.Group())]:
+            before = query_stats.metrics["get_post"].count
+            start = time.perf_counter()
+            for _ in range(args.rounds):
+                list(pool.map(lambda _: views.get_post(post_id, bus.uow, flights=flights), range(args.threads)))
+            elapsed = time.perf_counter() - start
+            reads = query_stats.metrics["get_post"].count - before
+            print(f"{label:<14} {args.threads * args.rounds / elapsed:>8.0f} req/s {reads:>6} db reads")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Compare the top-K latency of the trending heap with sorting every score, as the number of posts grows.
+
+    python -m benchmarks.trending --posts 10000 100000 1000000 --top 20
+"""
+
+import argparse
+import heapq
+import random
+import time
+
+from src.app.adapters import trending
+
+
+def per_call_us(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--posts", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'posts':>10} {'incr us':>10} {'heap top us':>12} {'sort all us':>12}")
+    for posts in args.posts:
+        scores = trending.HeapSortedSet()
+        ids = [str(i) for i in range(posts)]
+        start = time.perf_counter()
+        for post_id in ids:
+            scores.incr(post_id, random.random())
+        incr = (time.perf_counter() - start) / posts * 1e6
+
+        heap_top = per_call_us(lambda: scores.top(args.top), args.repeat)
+        sort_all = per_call_us(lambda: heapq.nlargest(args.top, scores._scores.items(), key=lambda item: item[1]), args.repeat)
+        print(f"{posts:>10} {incr:>10.2f} {heap_top:>12.1f} {sort_all:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Measure how throughput scales with the number of server workers, from 1 to `--max-workers`.
+
+For each worker count the pre-fork server is started on its own port, loaded with a `benchmarks.load_test` mix
+over HTTP, and stopped. The load generator is a single process on the same machine, taking a core of its own:
+scaling past the cores left to the server, or past what one process can send, measures the generator instead.
+More than one worker needs TRENDING_BACKEND=redis in the environment, as the server refuses to start them otherwise.
+
+    python -m benchmarks.workers --max-workers 8 --mix read --concurrency 64 --duration 20 --out workers.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks import load_test
+
+
+def worker_counts(max_workers: int) -> list[int]:
+    counts = [1]
+    while counts[-1] * 2 < max_workers:
+        counts.append(counts[-1] * 2)
+    return counts + [max_workers] if max_workers > 1 else counts
+
+
+def wait_until_serving(url: str, server: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"server exited with {server.returncode}")
+        try:
+            httpx.get(f"{url}/posts", params={"limit": 1}, headers={"user-id": "benchmark"}, timeout=1).raise_for_status()
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise TimeoutError(f"server not serving {url} after {timeout} seconds")
+
+
+def measure(workers: int, port: int, args: argparse.Namespace) -> dict:
+    url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "src.app.entrypoints.server", "--workers", str(workers), "--host", "127.0.0.1", "--port", str(port)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_serving(url, server)
+        load = argparse.Namespace(**{**vars(args), "url": url})
+        return asyncio.run(load_test.run(load))
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--mix", type=load_test.parse_mix, default="read")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--posts", type=int, default=200)
+    parser.add_argument("--hot", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    results: list[dict] = []
+    # latencies of the slowest operation
+    print(f"{'workers':>7} {'rps':>8} {'speedup':>8} {'efficiency':>10} {'errors':>7} {'p50 ms':>8} {'p99 ms':>8}")
+    for i, workers in enumerate(worker_counts(args.max_workers)):
+        # a port per run, as the last one's may still be in TIME_WAIT
+        report = measure(workers, args.port + i, args)
+        latencies = [s["latency_ms"] for s in report["operations"].values() if "latency_ms" in s]
+        speedup = report["rps"] / results[0]["rps"] if results and results[0]["rps"] else 1.0
+        results.append({"workers": workers, "rps": report["rps"], "speedup": round(speedup, 2), "report": report})
+        p50 = max((lat["p50"] for lat in latencies), default=float("nan"))
+        p99 = max((lat["p99"] for lat in latencies), default=float("nan"))
+        print(
+            f"{workers:>7} {report['rps']:>8.1f} {speedup:>8.2f} {speedup / workers:>10.0%} {report['errors']:>7} {p50:>8.1f} {p99:>8.1f}"
+        )
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"cpus": os.cpu_count(), "mix": args.mix, "concurrency": args.concurrency, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,79 @@
+"""
+Apply the schema migrations to the configured database.
+
+    python main.py             # migrate to the latest version
+    python main.py --target 1  # migrate up to version 1
+    python main.py --status    # list applied and pending migrations
+    python main.py --rebuild-feed  # re-project every post into post_feed
+    python main.py --reconcile-counters  # recount comment and reply counters and repair drift
+    python main.py --rebuild-trending  # re-seed the TRENDING_BACKEND=redis ranking from the counters
+    python main.py --purge-deleted  # purge soft-deleted posts once
+    python main.py --purge-worker   # purge soft-deleted posts every PURGE_INTERVAL_SECONDS
+    python main.py --sweep-orphans [--dry-run] [--start-after PATH]  # delete stored images without a row
+    python main.py --export FILE [--author-id ID]  # export as NDJSON, resuming from FILE.checkpoint
+    python main.py --import FILE  # import NDJSON, or CSV for a .csv FILE, resuming from FILE.checkpoint
+"""
+
+import argparse
+import logging
+import time
+
 import sqlalchemy as sa
 
-from src.app.adapters.orm import metadata
+from src.app import bootstrap
+from src.app.adapters import export
+from src.app.adapters import importer
+from src.app.adapters import migrations
+from src.app.config import settings
+from src.app.domain import commands
 from src.app.service_layer.unit_of_work import POSTGRES_URI
 
-metadata.create_all(bind=sa.create_engine(POSTGRES_URI))
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--target", type=int, default=None)
+parser.add_argument("--status", action="store_true")
+parser.add_argument("--rebuild-feed", action="store_true")
+parser.add_argument("--reconcile-counters", action="store_true")
+parser.add_argument("--rebuild-trending", action="store_true")
+parser.add_argument("--purge-deleted", action="store_true")
+parser.add_argument("--purge-worker", action="store_true")
+parser.add_argument("--sweep-orphans", action="store_true")
+parser.add_argument("--dry-run", action="store_true")
+parser.add_argument("--start-after", default=None)
+parser.add_argument("--export", metavar="FILE", default=None)
+parser.add_argument("--author-id", default=None)
+parser.add_argument("--import", dest="import_file", metavar="FILE", default=None)
+args = parser.parse_args()
+
+logging.basicConfig(level=logging.INFO)
+engine = sa.create_engine(POSTGRES_URI)
+
+if args.status:
+    applied = migrations.applied(engine)
+    for migration in migrations.MIGRATIONS:
+        print(f"{migration.version:>4} {migration.name:<48} {applied.get(migration.version, 'pending')}")
+elif args.rebuild_feed:
+    bootstrap.bootstrap().handle(commands.RebuildPostFeedCommand())
+elif args.reconcile_counters:
+    bootstrap.bootstrap().handle(commands.ReconcileCountersCommand())
+elif args.rebuild_trending:
+    bootstrap.bootstrap().handle(commands.RebuildTrendingCommand())
+elif args.purge_deleted or args.purge_worker:
+    bus = bootstrap.bootstrap()
+    while True:
+        bus.handle(commands.PurgeDeletedPostsCommand(batch_size=settings.PURGE_BATCH_SIZE))
+        if not args.purge_worker:
+            break
+        time.sleep(settings.PURGE_INTERVAL_SECONDS)
+elif args.sweep_orphans:
+    command = commands.SweepOrphanImagesCommand(
+        deletes_per_second=settings.ORPHAN_SWEEP_DELETES_PER_SECOND, dry_run=args.dry_run, start_after=args.start_after
+    )
+    bootstrap.bootstrap().handle(command)
+elif args.export:
+    with engine.connect().execution_options(isolation_level="REPEATABLE READ") as conn:
+        print(f"exported {export.to_file(conn, args.export, author_id=args.author_id)} rows")
+elif args.import_file:
+    with engine.connect() as conn:
+        print(f"imported {importer.from_file(conn, args.import_file).model_dump()}")
+else:
+    migrations.migrate(engine, target=args.target)
@@ -0,0 +1,159 @@
+"""
+This module fans post updates out to the clients streaming `GET /posts/{id}/events`.
+
+Bus handlers publish deltas from whatever thread they run on. Deltas for a post are merged until the next
+flush, once per `window` seconds, so a burst of likes becomes one message. Each message is serialized
+once and the same bytes are queued for every subscriber of the post. A subscriber that falls
+`queue_size` messages behind gets a single `resync` message instead, telling it to refetch the post.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import dataclasses
+import json
+import threading
+import typing as t
+
+from src.app.config import settings
+
+RESYNC = b"event: resync\ndata: {}\n\n"
+
+
+@dataclasses.dataclass
+class BroadcastStats:
+    published: int = 0
+    messages: int = 0
+    deliveries: int = 0
+    resyncs: int = 0
+
+    def model_dump(self) -> dict:
+        return dataclasses.asdict(self)
+
+
+def _message(update: dict) -> bytes:
+    return f"event: update\ndata: {json.dumps(update, separators=(',', ':'))}\n\n".encode()
+
+
+class Broadcaster:
+    """
+    Per-post subscriber queues, fed by one flush task on the event loop.
+    """
+
+    def __init__(
+        self,
+        window: float = settings.LIVE_UPDATES_WINDOW_SECONDS,
+        queue_size: int = settings.LIVE_UPDATES_QUEUE_SIZE,
+    ):
+        self.window = window
+        self.queue_size = queue_size
+        self.stats = BroadcastStats()
+        self._pending: dict[str, dict] = {}
+        self._subscribers: collections.defaultdict[str, set[asyncio.Queue]] = collections.defaultdict(set)
+        self._lock = threading.Lock()
+        self._flusher: asyncio.Task | None = None
+        self._resync = False
+
+    def subscribers(self, post_id: str) -> int:
+        return len(self._subscribers.get(post_id, ()))
+
+    def publish(self, post_id: str, like_delta: int = 0, comment_delta: int = 0, version: int | None = None) -> None:
+        """
+        Merge a delta into the next update of `post_id`. Safe to call from any thread, and free without subscribers.
+        """
+        with self._lock:
+            if post_id not in self._subscribers:
+                return
+            self.stats.published += 1
+            update = self._pending.setdefault(post_id, {"post_id": post_id, "like_delta": 0, "comment_delta": 0})
+            update["like_delta"] += like_delta
+            update["comment_delta"] += comment_delta
+            if version is not None:
+                update["version"] = max(version, update.get("version", version))
+
+    def resync(self) -> None:
+        """
+        Tell every subscriber to refetch its post at the next flush, after updates may have been lost.
+        Safe to call from any thread.
+        """
+        with self._lock:
+            self._resync = True
+
+    def subscribe(self, post_id: str) -> asyncio.Queue:
+        """
+        Start receiving the updates of `post_id`. Must be called on the event loop that reads the queue.
+        """
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        with self._lock:
+            self._subscribers[post_id].add(queue)
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_forever())
+        return queue
+
+    def unsubscribe(self, post_id: str, queue: asyncio.Queue) -> None:
+        with self._lock:
+            queues = self._subscribers.get(post_id)
+            if queues is None:
+                return
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[post_id]
+                self._pending.pop(post_id, None)
+
+    async def stream(
+        self, post_id: str, first: bytes = b"", heartbeat: float = settings.LIVE_UPDATES_HEARTBEAT_SECONDS
+    ) -> t.AsyncGenerator[bytes, None]:
+        """
+        Yield `first`, then the Server-Sent Events of `post_id` with a comment line after every `heartbeat`
+        seconds of silence, until the consumer stops iterating.
+        """
+        queue = self.subscribe(post_id)
+        try:
+            if first:
+                yield first
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+        finally:
+            self.unsubscribe(post_id, queue)
+
+    async def _flush_forever(self) -> None:
+        while self._subscribers:
+            await asyncio.sleep(self.window)
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Send every merged update to the subscribers of its post.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            targets = [(update, list(self._subscribers.get(post_id, ()))) for post_id, update in pending.items()]
+            resync, self._resync = self._resync, False
+            everyone = [queue for queues in self._subscribers.values() for queue in queues] if resync else []
+
+        if resync:
+            # the refetch covers the pending deltas too
+            for queue in everyone:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESYNC)
+                self.stats.resyncs += 1
+            return
+
+        for update, queues in targets:
+            message = _message(update)
+            self.stats.messages += 1
+            for queue in queues:
+                if queue.full():
+                    # the deltas this subscriber missed are lost, so have it refetch the post instead
+                    while not queue.empty():
+                        queue.get_nowait()
+                    queue.put_nowait(RESYNC)
+                    self.stats.resyncs += 1
+                    continue
+                queue.put_nowait(message)
+                self.stats.deliveries += 1
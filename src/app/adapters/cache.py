@@ -0,0 +1,166 @@
+"""
+This module contains the in-process cache of `GET /posts` results.
+
+Entries are invalidated by generations instead of by scanning keys. Every create, edit or delete of a post
+bumps the global generation and the generation of its author. A listing filtered by author is tied to that
+author's generation, so it survives writes by other authors; any other listing is tied to the global one.
+An entry whose generation moved on is a miss. Like and comment counts in a cached page may lag by up to the TTL.
+"""
+
+from __future__ import annotations
+
+import collections
+import dataclasses
+import itertools
+import logging
+import threading
+import time
+import typing as t
+
+logger = logging.getLogger(__name__)
+
+REPORT_EVERY = 1000
+
+
+class Generations:
+    """
+    The global generation and one per author, all drawn from one increasing counter.
+
+    The author table is bounded: an author that is dropped falls back to the highest generation dropped so far,
+    which still differs from whatever its cached entries were stored with.
+    """
+
+    def __init__(self, max_authors: int = 10_000):
+        self.max_authors = max_authors
+        self._counter = itertools.count(1)
+        self._global = 0
+        self._authors: collections.OrderedDict[str, int] = collections.OrderedDict()
+        self._dropped = 0
+        self._lock = threading.Lock()
+
+    def bump(self, author_id: str) -> None:
+        with self._lock:
+            self._global = next(self._counter)
+            self._authors[author_id] = self._global
+            self._authors.move_to_end(author_id)
+            while len(self._authors) > self.max_authors:
+                _, dropped = self._authors.popitem(last=False)
+                self._dropped = max(self._dropped, dropped)
+
+    def of(self, author_id: str | None) -> int:
+        """
+        The generation a listing filtered by `author_id`, or unfiltered when None, depends on.
+        """
+        if author_id is None:
+            return self._global
+        return self._authors.get(author_id, self._dropped)
+
+
+@dataclasses.dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    invalidated: int = 0
+    expired: int = 0
+    evicted: int = 0
+    coalesced: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def model_dump(self) -> dict:
+        return {**dataclasses.asdict(self), "hit_rate": round(self.hit_rate, 4)}
+
+
+@dataclasses.dataclass
+class _Entry:
+    value: t.Any
+    generation: int
+    expires: float
+
+
+class ResultCache:
+    """
+    A bounded LRU of view results with a TTL, generation checks and one computation per missing key.
+
+    Concurrent misses on the same key wait for the first caller's result instead of all querying the database.
+    Cached results are shared between callers and must not be mutated.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, generations: Generations | None = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.generations = generations or Generations()
+        self.stats = CacheStats()
+        self._entries: collections.OrderedDict[t.Hashable, _Entry] = collections.OrderedDict()
+        self._inflight: dict[t.Hashable, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def invalidate(self, author_id: str) -> None:
+        self.generations.bump(author_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _lookup(self, key: t.Hashable, generation: int) -> _Entry | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.generation != generation:
+            self.stats.invalidated += 1
+        elif entry.expires < time.monotonic():
+            self.stats.expired += 1
+        else:
+            self._entries.move_to_end(key)
+            return entry
+        del self._entries[key]
+        return None
+
+    def get_or_compute(self, key: t.Hashable, author_id: str | None, compute: t.Callable[[], t.Any]) -> t.Any:
+        """
+        Return the cached result for `key`, or compute and cache it. `author_id` is the listing's author filter.
+        """
+        if self.max_entries <= 0:
+            return compute()
+
+        while True:
+            with self._lock:
+                generation = self.generations.of(author_id)
+                entry = self._lookup(key, generation)
+                if entry is not None:
+                    self.stats.hits += 1
+                    self._report()
+                    return entry.value
+                inflight = self._inflight.get(key)
+                if inflight is None:
+                    self.stats.misses += 1
+                    self._report()
+                    inflight = self._inflight[key] = threading.Event()
+                    break
+                self.stats.coalesced += 1
+            # another caller is computing this key: wait for it, then look again
+            inflight.wait(self.ttl)
+
+        try:
+            value = compute()
+            with self._lock:
+                self._entries[key] = _Entry(value, generation, time.monotonic() + self.ttl)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.stats.evicted += 1
+            return value
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            inflight.set()
+
+    def _report(self) -> None:
+        if (self.stats.hits + self.stats.misses) % REPORT_EVERY == 0:
+            logger.info("posts cache: %s", self.stats.model_dump())
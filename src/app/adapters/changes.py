@@ -0,0 +1,93 @@
+"""
+This module maintains `changes`, the log `GET /posts/changes` syncs clients from.
+
+Every create, edit, like and delete of a post and every create, like and delete of a comment appends a row,
+in the transaction of the write, so that the log misses no committed write and logs none rolled back. Likes are
+logged as edits. Deletes stay in the log as tombstones. A deleted post takes its comments with it, and a deleted
+comment takes its replies, so neither logs a tombstone for each of those.
+
+Writers don't wait on one another. Each row stores the id of the transaction that wrote it, and the log is read
+in `(xact_id, id)` order, and only up to the oldest transaction still in flight: every transaction below
+`pg_snapshot_xmin` has ended, and any transaction yet to commit has a larger id, so a reader that has seen a row
+will never later find one before it. A row's id is the change cursor, standing for its place in that order.
+Rows logged before transaction ids were stored have an `xact_id` of 0 and keep their id order.
+"""
+
+import typing as t
+
+import sqlalchemy as sa
+
+from src.app.adapters import orm
+
+POST = "post"
+COMMENT = "comment"
+
+CREATED = "created"
+EDITED = "edited"
+DELETED = "deleted"
+
+
+class Change(t.NamedTuple):
+    """
+    A row of the change log, as kept in memory by `unit_of_work.InMemoryUnitOfWork`.
+    """
+
+    id: int
+    entity: str
+    entity_id: str
+    post_id: str
+    op: str
+
+
+def record(conn: sa.Connection | sa.orm.Session, entity: str, entity_id: str, post_id: str, op: str) -> None:
+    """
+    Append a change in the caller's transaction, which should commit right after.
+    """
+    conn.execute(orm.changes.insert().values(entity=entity, entity_id=entity_id, post_id=post_id, op=op))
+
+
+def record_created(conn: sa.Connection | sa.orm.Session, entity: str, rows: list[tuple[str, str]]) -> None:
+    """
+    Append the creation of every `(entity_id, post_id)` in `rows`, in the caller's transaction, in order.
+    """
+    if not rows:
+        return
+    conn.execute(orm.changes.insert(), [{"entity": entity, "entity_id": i, "post_id": p, "op": CREATED} for i, p in rows])
+
+
+def read(conn: sa.Connection | sa.orm.Session, since: int, limit: int) -> tuple[list[sa.Row], bool]:
+    """
+    Up to `limit` changes after cursor `since`, oldest first, and whether more follow.
+    Changes of transactions that may still be in flight are held back until every transaction before them ended.
+    """
+    # a cursor whose row is gone resumes after every legacy row with a smaller id
+    after = sa.select(orm.changes.c.xact_id).where(orm.changes.c.id == since).scalar_subquery()
+    horizon = sa.cast(sa.cast(sa.func.pg_snapshot_xmin(sa.func.pg_current_snapshot()), sa.Text), sa.BigInteger)
+    stmt = (
+        sa.select(orm.changes)
+        .where(
+            sa.tuple_(orm.changes.c.xact_id, orm.changes.c.id) > sa.tuple_(sa.func.coalesce(after, 0), sa.literal(since)),
+            orm.changes.c.xact_id < horizon,
+        )
+        .order_by(orm.changes.c.xact_id, orm.changes.c.id)
+        .limit(limit + 1)
+    )
+    rows = conn.execute(stmt).all()
+    return list(rows[:limit]), len(rows) > limit
+
+
+def backfill(conn: sa.Connection) -> None:
+    """
+    Log a creation for every post and comment not in the log yet, in the order they were created.
+    Comments detached from any post are left out, as no view shows them.
+    """
+    logged = sa.select(orm.changes.c.entity_id)
+    for entity, table, post_id in ((POST, orm.posts, orm.posts.c.id), (COMMENT, orm.comments, orm.comments.c.post_id)):
+        conn.execute(
+            orm.changes.insert().from_select(
+                ["entity", "entity_id", "post_id", "op"],
+                sa.select(sa.literal(entity), table.c.id, post_id, sa.literal(CREATED))
+                .where(table.c.id.not_in(logged), post_id.is_not(None))
+                .order_by(table.c.created_time),
+            )
+        )
@@ -0,0 +1,100 @@
+"""
+This module reconciles the denormalized `posts.comment_count` and `comments.reply_count` counters.
+
+Handlers keep both counters in step with the comments they add and delete, in the same transaction.
+`reconcile_posts` and `reconcile_comments` recount them from the comments table one keyset-paginated batch
+at a time and repair any drift, for example after rows were written outside the handlers. Each batch is
+meant to be committed on its own, so that repairing never holds the row locks of more than one batch. `recount` recounts every counter of given rows,
+likes included, for rows bulk loaded without any counters.
+"""
+
+import logging
+
+import sqlalchemy as sa
+
+from src.app.adapters import feed
+from src.app.adapters import orm
+
+logger = logging.getLogger(__name__)
+
+
+def _batch(conn: sa.Connection | sa.orm.Session, table: sa.Table, after: str | None, batch_size: int) -> list[str]:
+    stmt = sa.select(table.c.id).order_by(table.c.id).limit(batch_size)
+    if after is not None:
+        stmt = stmt.where(table.c.id > after)
+    return list(conn.execute(stmt).scalars())
+
+
+def reconcile_posts(conn: sa.Connection | sa.orm.Session, after: str | None, batch_size: int = 500) -> tuple[str | None, int]:
+    """
+    Recount `comment_count` of the next `batch_size` posts after `after`, repair those that drifted and re-project
+    them into post_feed.
+
+    Returns the last post of the batch, None once there are no more, and the number of repaired posts.
+    """
+    ids = _batch(conn, orm.posts, after, batch_size)
+    if not ids:
+        return None, 0
+    comment_count = sa.select(sa.func.count()).where(orm.comments.c.post_id == orm.posts.c.id).scalar_subquery()
+    post_ids = list(
+        conn.execute(
+            orm.posts.update()
+            .where(orm.posts.c.id.in_(ids), orm.posts.c.comment_count.is_distinct_from(comment_count))
+            .values(comment_count=comment_count)
+            .returning(orm.posts.c.id)
+        ).scalars()
+    )
+    if post_ids:
+        feed.project(conn, post_ids)
+    return ids[-1], len(post_ids)
+
+
+def reconcile_comments(conn: sa.Connection | sa.orm.Session, after: str | None, batch_size: int = 500) -> tuple[str | None, int]:
+    """
+    Recount `reply_count` of the next `batch_size` comments after `after` and repair those that drifted.
+
+    Returns the last comment of the batch, None once there are no more, and the number of repaired comments.
+    """
+    ids = _batch(conn, orm.comments, after, batch_size)
+    if not ids:
+        return None, 0
+    replies = orm.comments.alias("replies")
+    reply_count = sa.select(sa.func.count()).where(replies.c.comment_id == orm.comments.c.id).scalar_subquery()
+    comment_ids = list(
+        conn.execute(
+            orm.comments.update()
+            .where(orm.comments.c.id.in_(ids), orm.comments.c.reply_count.is_distinct_from(reply_count))
+            .values(reply_count=reply_count)
+            .returning(orm.comments.c.id)
+        ).scalars()
+    )
+    return ids[-1], len(comment_ids)
+
+
+def recount(conn: sa.Connection | sa.orm.Session, post_ids: list[str], comment_ids: list[str]) -> None:
+    """
+    Recount every counter of `post_ids` and `comment_ids`, likes included, and re-project those posts into post_feed.
+
+    Meant for rows written in bulk, whose counters were not kept by the handlers at all.
+    """
+    post_likes = sa.select(sa.func.count()).where(orm.likes.c.post_id == orm.posts.c.id, orm.likes.c.comment_id.is_(None))
+    comment_count = sa.select(sa.func.count()).where(orm.comments.c.post_id == orm.posts.c.id)
+    if post_ids:
+        conn.execute(
+            orm.posts.update()
+            .where(orm.posts.c.id.in_(post_ids))
+            .values(like_count=post_likes.scalar_subquery(), comment_count=comment_count.scalar_subquery())
+        )
+
+    replies = orm.comments.alias("replies")
+    comment_likes = sa.select(sa.func.count()).where(orm.likes.c.comment_id == orm.comments.c.id)
+    reply_count = sa.select(sa.func.count()).where(replies.c.comment_id == orm.comments.c.id)
+    if comment_ids:
+        conn.execute(
+            orm.comments.update()
+            .where(orm.comments.c.id.in_(comment_ids))
+            .values(like_count=comment_likes.scalar_subquery(), reply_count=reply_count.scalar_subquery())
+        )
+
+    if post_ids:
+        feed.project(conn, post_ids)
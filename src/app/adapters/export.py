@@ -0,0 +1,145 @@
+"""
+This module exports posts, images, comments and likes as NDJSON, one row per line.
+
+Rows are streamed from a server-side cursor `batch_size` rows at a time, so memory stays constant whatever the
+size of the dataset. Tables are exported parents first and each in id order, so every row has a position, its
+`Cursor`, that an interrupted export resumes after. Read in one REPEATABLE READ transaction, every table comes
+from the same snapshot.
+
+Every line holds a row's columns plus its `type`. With an `author_id`, the export holds the author's history:
+their posts with those posts' images, their comments and their likes. Soft-deleted posts keep their `deleted_time`.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import datetime
+import json
+import logging
+import os
+import time
+import typing as t
+import uuid
+
+import sqlalchemy as sa
+
+from src.app.adapters import orm
+
+logger = logging.getLogger(__name__)
+
+TABLES: dict[str, sa.Table] = {
+    "post": orm.posts,
+    "image": orm.images,
+    "comment": orm.comments,
+    "like": orm.likes,
+}
+
+
+@dataclasses.dataclass(frozen=True)
+class Cursor:
+    """
+    The position of a row in the export: its type and id.
+    """
+
+    entity: str
+    after: str | None = None
+
+    def __str__(self) -> str:
+        return f"{self.entity}:{self.after or ''}"
+
+    @classmethod
+    def parse(cls, value: str) -> Cursor:
+        """
+        Parse `<type>:<id>`, raising ValueError for an unknown type or an id that isn't a UUID.
+        """
+        entity, _, after = value.partition(":")
+        if entity not in TABLES:
+            raise ValueError(f"unknown export cursor {value!r}")
+        if after:
+            try:
+                uuid.UUID(after)
+            except ValueError:
+                raise ValueError(f"export cursor {value!r} has no valid id") from None
+        return cls(entity, after or None)
+
+
+def _author_filter(entity: str, author_id: str) -> sa.ColumnElement:
+    if entity == "post":
+        return orm.posts.c.author_id == author_id
+    if entity == "image":
+        return orm.images.c.post_id.in_(sa.select(orm.posts.c.id).where(orm.posts.c.author_id == author_id))
+    if entity == "comment":
+        return orm.comments.c.author_id == author_id
+    return orm.likes.c.user_id == author_id
+
+
+def _default(value: t.Any) -> str:
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def records(
+    conn: sa.Connection | sa.orm.Session,
+    author_id: str | None = None,
+    after: Cursor | None = None,
+    batch_size: int = 1000,
+) -> t.Iterator[tuple[Cursor, bytes]]:
+    """
+    Yield every exported row after `after` as a newline-terminated JSON line, with its cursor.
+    """
+    entities = list(TABLES)
+    for entity in entities[entities.index(after.entity) if after else 0 :]:
+        table = TABLES[entity]
+        stmt = sa.select(table).order_by(table.c.id)
+        if author_id is not None:
+            stmt = stmt.where(_author_filter(entity, author_id))
+        if after is not None and after.entity == entity and after.after is not None:
+            stmt = stmt.where(table.c.id > after.after)
+
+        for row in conn.execute(stmt.execution_options(yield_per=batch_size)):
+            line = json.dumps({"type": entity, **row._asdict()}, default=_default, separators=(",", ":"))
+            yield Cursor(entity, row.id), line.encode() + b"\n"
+
+
+def to_file(
+    conn: sa.Connection | sa.orm.Session,
+    path: str,
+    author_id: str | None = None,
+    batch_size: int = 1000,
+    checkpoint_every: int = 10_000,
+) -> int:
+    """
+    Export to the file at `path`, checkpointing every `checkpoint_every` rows to `path.checkpoint`.
+
+    An export interrupted earlier resumes from its checkpoint, after cutting off the lines written past it.
+    The checkpoint is removed once the export completes. Returns the number of rows written by this run.
+    """
+    checkpoint_path = f"{path}.checkpoint"
+    after, offset = None, 0
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as f:
+            checkpoint = json.load(f)
+        if checkpoint["author_id"] != author_id:
+            raise ValueError(f"{checkpoint_path} belongs to an export of author {checkpoint['author_id']!r}")
+        after, offset = Cursor.parse(checkpoint["cursor"]), checkpoint["offset"]
+        logger.info("resuming export to %s after %s", path, after)
+
+    written, start = 0, time.perf_counter()
+    with open(path, "r+b" if after else "wb") as out:
+        out.truncate(offset)
+        out.seek(offset)
+        for cursor, line in records(conn, author_id, after, batch_size):
+            out.write(line)
+            written += 1
+            if written % checkpoint_every == 0:
+                out.flush()
+                os.fsync(out.fileno())
+                with open(f"{checkpoint_path}.tmp", "w") as f:
+                    json.dump({"cursor": str(cursor), "offset": out.tell(), "author_id": author_id}, f)
+                os.replace(f"{checkpoint_path}.tmp", checkpoint_path)
+                logger.info("exported %d rows, %.0f rows/s, at %s", written, written / (time.perf_counter() - start), cursor)
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return written
@@ -0,0 +1,96 @@
+"""
+This module maintains `post_feed`, the denormalized read model `GET /posts` is served from.
+
+A feed row holds everything a post listing needs: the post columns, its counters and its images.
+Rows are projected from the source tables rather than patched with deltas, so re-projecting a post
+after any event is idempotent and a missed event is repaired by the next one or by `rebuild_batch`.
+"""
+
+import logging
+import typing as t
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from src.app.adapters import orm
+
+logger = logging.getLogger(__name__)
+
+
+def _projection(post_ids: sa.ColumnElement | None = None) -> sa.Select:
+    """
+    Select feed rows from the source tables, for the live posts matching `post_ids` or for every live post.
+    """
+    images = (
+        sa.select(
+            sa.func.coalesce(
+                sa.func.json_agg(
+                    postgresql.aggregate_order_by(
+                        sa.func.json_build_object("id", orm.images.c.id, "path", orm.images.c.path), orm.images.c.created_time
+                    )
+                ),
+                sa.text("'[]'::json"),
+            )
+        )
+        .where(orm.images.c.post_id == orm.posts.c.id)
+        .scalar_subquery()
+    )
+    stmt = sa.select(
+        orm.posts.c.id,
+        orm.posts.c.title,
+        orm.posts.c.author_id,
+        orm.posts.c.content,
+        orm.posts.c.like_count,
+        orm.posts.c.comment_count,
+        images.label("images"),
+        orm.posts.c.version,
+        orm.posts.c.created_time,
+        orm.posts.c.updated_time,
+    ).where(orm.posts.c.deleted_time.is_(None))
+    if post_ids is not None:
+        stmt = stmt.where(post_ids)
+    return stmt
+
+
+def _upsert(projection: sa.Select) -> postgresql.Insert:
+    insert = postgresql.insert(orm.post_feed).from_select([c.name for c in projection.selected_columns], projection)
+    return insert.on_conflict_do_update(
+        index_elements=[orm.post_feed.c.id],
+        set_={c.name: insert.excluded[c.name] for c in orm.post_feed.columns if c.name != "id"},
+    )
+
+
+def project(conn: sa.Connection | sa.orm.Session, post_ids: t.Sequence[str]) -> None:
+    """
+    Re-project the feed rows of `post_ids`, dropping those whose post was deleted.
+    """
+    conn.execute(_upsert(_projection(orm.posts.c.id.in_(post_ids))))
+    conn.execute(
+        orm.post_feed.delete().where(
+            orm.post_feed.c.id.in_(post_ids),
+            ~sa.exists().where(orm.posts.c.id == orm.post_feed.c.id, orm.posts.c.deleted_time.is_(None)),
+        )
+    )
+
+
+def rebuild_batch(conn: sa.Connection | sa.orm.Session, after: str | None, batch_size: int = 500) -> tuple[str | None, int]:
+    """
+    Re-project the next `batch_size` posts after `after` and drop the feed rows in the same id range left by
+    deleted posts. Calling it again with the returned id until that is None rebuilds the whole feed.
+
+    Returns the last post of the batch, None once there are no more, and the number of posts projected.
+    """
+    stmt = sa.select(orm.posts.c.id).order_by(orm.posts.c.id).limit(batch_size)
+    if after is not None:
+        stmt = stmt.where(orm.posts.c.id > after)
+    post_ids = list(conn.execute(stmt).scalars())
+    if post_ids:
+        conn.execute(_upsert(_projection(orm.posts.c.id.in_(post_ids))))
+
+    stale = orm.post_feed.delete().where(~sa.exists().where(orm.posts.c.id == orm.post_feed.c.id, orm.posts.c.deleted_time.is_(None)))
+    if after is not None:
+        stale = stale.where(orm.post_feed.c.id > after)
+    if post_ids:
+        stale = stale.where(orm.post_feed.c.id <= post_ids[-1])
+    conn.execute(stale)
+    return (post_ids[-1] if post_ids else None), len(post_ids)
@@ -7,10 +7,15 @@ import datetime
 import io
 import tempfile
 import typing as t
+import weakref
 
 import fastapi
-import minio
-import minio.helpers
+
+from src.app.config import settings
+
+if t.TYPE_CHECKING:
+    # imported when a client is made, as the package takes longer to import than the rest of the app
+    import minio
 
 
 class AbstractFileStorage(abc.ABC):
@@ -50,6 +55,39 @@ class AbstractFileStorage(abc.ABC):
         """
         self._delete(path)
 
+    def delete_many(self, paths: list[str]) -> list[str]:
+        """
+        Delete many paths from the FileStorage at once, returning the paths that could not be deleted.
+        """
+        if not paths:
+            return []
+        return self._delete_many(paths)
+
+    def _delete_many(self, paths: list[str]) -> list[str]:
+        """
+        Delete many paths one by one. Storages with a bulk delete override this.
+        """
+        failed = []
+        for path in paths:
+            try:
+                self._delete(path)
+            except Exception:
+                failed.append(path)
+        return failed
+
+    def iter_paths(self, prefix: str = "", start_after: str | None = None) -> t.Iterator[tuple[str, datetime.datetime]]:
+        """
+        Iterate over the paths under `prefix` after `start_after`, in lexicographic order, with their last modified time.
+        """
+        return self._iter_paths(prefix, start_after)
+
+    @abc.abstractmethod
+    def _iter_paths(self, prefix: str, start_after: str | None) -> t.Iterator[tuple[str, datetime.datetime]]:
+        """
+        Abstract method to iterate over the paths in the FileStorage.
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def _add(self, path: str, f: fastapi.UploadFile, **kwargs):
         """
@@ -80,16 +118,20 @@ class AbstractFileStorage(abc.ABC):
 
 
 class MinIOFileStorage(AbstractFileStorage):
+    # the clients known to have the bucket, so a storage made per unit of work doesn't ask again
+    _ready: weakref.WeakSet = weakref.WeakSet()
 
-    def __init__(self, client: minio.Minio):
+    def __init__(self, client: "minio.Minio"):
         """
         Initialize the MinIOFileStorage class.
         """
         super().__init__()
 
         self.client = client
-        if not self.client.bucket_exists(self.BUCKET_NAME):
-            self.client.make_bucket(self.BUCKET_NAME)
+        if client not in self._ready:
+            if not self.client.bucket_exists(self.BUCKET_NAME):
+                self.client.make_bucket(self.BUCKET_NAME)
+            self._ready.add(client)
 
     def _add(self, path: str, f: fastapi.UploadFile, **kwargs) -> int:
         """
@@ -109,16 +151,78 @@ class MinIOFileStorage(AbstractFileStorage):
         """
         Get a presigned URL from the FileStorage by path.
         """
-        return self.client.presigned_get_object(self.BUCKET_NAME, path)
+        return self.client.presigned_get_object(
+            self.BUCKET_NAME, path, expires=datetime.timedelta(seconds=settings.IMAGE_LINK_EXPIRY_SECONDS)
+        )
 
     def _edit(self, path: str, f: fastapi.UploadFile):
         """
         Upload a replacement file to the FileStorage by path.
         """
-        raise NotImplementedError
+        self._add(path, f)
 
     def _delete(self, path: str):
         """
         Delete from the FileStorage by path.
         """
-        raise NotImplementedError
+        self.client.remove_object(self.BUCKET_NAME, path)
+
+    def _delete_many(self, paths: list[str]) -> list[str]:
+        """
+        Delete many paths with multi-object delete requests of up to 1000 keys each.
+        """
+        from minio.deleteobjects import DeleteObject
+
+        errors = self.client.remove_objects(self.BUCKET_NAME, [DeleteObject(path) for path in paths])
+        return [error.name for error in errors if error.name is not None]
+
+    def _iter_paths(self, prefix: str, start_after: str | None) -> t.Iterator[tuple[str, datetime.datetime]]:
+        """
+        Iterate over the bucket listing, which the client fetches 1000 keys per request.
+        """
+        for obj in self.client.list_objects(self.BUCKET_NAME, prefix=prefix or None, recursive=True, start_after=start_after):
+            yield obj.object_name, obj.last_modified
+
+
+class InMemoryFileStorage(AbstractFileStorage):
+
+    def __init__(self, client=None):
+        """
+        Initialize the InMemoryFileStorage class. Objects are kept by path with their last modified time.
+        `client` is ignored, so that the class can stand in for a storage factory.
+        """
+        super().__init__()
+        self.objects = {}  # type: dict[str, tuple[bytes, datetime.datetime]]
+
+    def _add(self, path: str, f: fastapi.UploadFile, **kwargs) -> int:
+        """
+        Add a file to the FileStorage.
+        """
+        self.objects[path] = (f.file.read(), datetime.datetime.now(datetime.timezone.utc))
+        return 0
+
+    def _get(self, path: str) -> str:
+        """
+        Get a URL of the object, which only this storage understands.
+        """
+        return f"memory://{self.BUCKET_NAME}/{path}"
+
+    def _edit(self, path: str, f: fastapi.UploadFile):
+        """
+        Upload a replacement file to the FileStorage by path.
+        """
+        self._add(path, f)
+
+    def _delete(self, path: str):
+        """
+        Delete from the FileStorage by path. Deleting a missing path does nothing, as in MinIO.
+        """
+        self.objects.pop(path, None)
+
+    def _iter_paths(self, prefix: str, start_after: str | None) -> t.Iterator[tuple[str, datetime.datetime]]:
+        """
+        Iterate over the sorted paths.
+        """
+        for path in sorted(self.objects):
+            if path.startswith(prefix) and (start_after is None or path > start_after):
+                yield path, self.objects[path][1]
@@ -0,0 +1,198 @@
+"""
+This module bulk loads posts, images, comments and likes from NDJSON or CSV, in the line format of `adapters.export`.
+
+Records are read from the file as a stream and checked with the domain rules of `Post.create`, `Image.create`,
+`Comment.create` and `Like.create`. A record breaking them is logged with its position and skipped. The rest are
+inserted `batch_size` records at a time, one multi-row insert per table, parents first: posts, images, comments
+by level, then likes. Rows whose id exists already are left as they are, so loading a batch twice is harmless.
+
+Counters are not read from the input. Each batch recounts those of the posts and comments it touched, re-projects
+those posts into post_feed and logs the new posts and comments in `changes`. It then commits and checkpoints its
+position in the file to `path.checkpoint`, where an interrupted import resumes.
+
+A CSV file has a header row, with a `type` column and a column per field. Empty cells are missing fields.
+"""
+
+from __future__ import annotations
+
+import csv
+import dataclasses
+import datetime
+import itertools
+import json
+import logging
+import os
+import time
+import typing as t
+import uuid
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from src.app.adapters import changes
+from src.app.adapters import counters
+from src.app.adapters import export
+from src.app.domain import model
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = {"like_count", "comment_count", "reply_count"}
+
+
+@dataclasses.dataclass
+class ImportStats:
+    read: int = 0
+    inserted: int = 0
+    existing: int = 0
+    rejected: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.inserted / self.seconds if self.seconds else 0.0
+
+    def model_dump(self) -> dict:
+        return {**dataclasses.asdict(self), "rows_per_second": round(self.rows_per_second)}
+
+
+def _uuid(value: t.Any) -> str:
+    return str(uuid.UUID(value))
+
+
+def _timestamp(value: t.Any) -> datetime.datetime:
+    return datetime.datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _converter(column: sa.Column) -> t.Callable[[t.Any], t.Any]:
+    if isinstance(column.type, sa.Uuid):
+        return _uuid
+    if isinstance(column.type, sa.TIMESTAMP):
+        return _timestamp
+    if isinstance(column.type, sa.Integer):
+        return int
+    return lambda value: value
+
+
+# the columns read from the input and how to convert them, per type
+FIELDS = {entity: [(c.name, _converter(c)) for c in table.c if c.name not in COUNTERS] for entity, table in export.TABLES.items()}
+
+
+def row(record: str | dict) -> tuple[str, dict]:
+    """
+    The type and the insertable row of an NDJSON line or a CSV record, or a `ValueError`, `KeyError` or
+    `TypeError` if it breaks the domain rules. Missing ids and times are generated, counters are zeroed.
+    """
+    data: dict = json.loads(record) if isinstance(record, str) else record
+    entity = data["type"]
+    values = {name: convert(data[name]) for name, convert in FIELDS[entity] if data.get(name) is not None}
+
+    obj: model.BaseModel
+    if entity == "post":
+        obj = model.Post.create(values["title"], values["content"], values["author_id"])
+    elif entity == "image":
+        obj = model.Image.create(values["path"], values["post_id"])
+    elif entity == "comment":
+        obj = model.Comment.create(values["content"], values["author_id"], values["level"], values.get("post_id"), values.get("comment_id"))
+    else:
+        obj = model.Like.create(values["user_id"], values.get("post_id"), values.get("comment_id"))
+    return entity, {**{name: getattr(obj, name, None) for name in export.TABLES[entity].c.keys() if name not in values}, **values}
+
+
+def _read(path: str, start: int) -> t.Iterator[tuple[int, str | dict]]:
+    with open(path, newline="") as f:
+        if path.endswith(".csv"):
+            records: t.Iterable = ({k: v for k, v in record.items() if v != ""} for record in csv.DictReader(f))
+        else:
+            records = f
+        for position, record in enumerate(records, 1):
+            if position > start and (not isinstance(record, str) or record.strip()):
+                yield position, record
+
+
+def _insert(conn: sa.Connection | sa.orm.Session, batch: dict[str, list[dict]], stats: ImportStats) -> None:
+    # None for the post or comment a row doesn't belong to
+    post_ids: set[str | None] = set()
+    comment_ids: set[str | None] = set()
+    created: dict[str, list[tuple[str, str]]] = {changes.POST: [], changes.COMMENT: []}
+    for entity, table in export.TABLES.items():
+        rows = sorted(batch[entity], key=lambda r: r["level"]) if entity == "comment" else batch[entity]
+        if not rows:
+            continue
+        insert = postgresql.insert(table).on_conflict_do_nothing(index_elements=[table.c.id]).returning(table.c.id)
+        new = set(conn.execute(insert, rows).scalars())
+        stats.inserted += len(new)
+        stats.existing += len(rows) - len(new)
+
+        for r in rows:
+            if r["id"] not in new:
+                continue
+            post_ids.add(r["id"] if entity == "post" else r["post_id"])
+            if entity == "comment":
+                comment_ids.update((r["id"], r["comment_id"]))
+                if r["post_id"] is not None:
+                    created[changes.COMMENT].append((r["id"], r["post_id"]))
+            elif entity == "like":
+                comment_ids.add(r["comment_id"])
+            elif entity == "post":
+                created[changes.POST].append((r["id"], r["id"]))
+
+    counters.recount(conn, [i for i in post_ids if i is not None], [i for i in comment_ids if i is not None])
+    for entity, ids in created.items():
+        changes.record_created(conn, entity, ids)
+
+
+def load(
+    conn: sa.Connection | sa.orm.Session,
+    records: t.Iterable[tuple[int, str | dict]],
+    batch_size: int = 1000,
+    checkpoint: t.Callable[[int], None] | None = None,
+) -> ImportStats:
+    """
+    Import `records`, each with its position, committing every `batch_size` of them and then calling `checkpoint`
+    with the position of the last one.
+    """
+    stats, start = ImportStats(), time.perf_counter()
+    records = iter(records)
+    while chunk := list(itertools.islice(records, batch_size)):
+        batch: dict[str, list[dict]] = {entity: [] for entity in export.TABLES}
+        for position, record in chunk:
+            try:
+                entity, values = row(record)
+            except (KeyError, ValueError, TypeError) as e:
+                stats.rejected += 1
+                logger.warning("rejected record %d: %r", position, e)
+                continue
+            batch[entity].append(values)
+
+        _insert(conn, batch, stats)
+        conn.commit()
+        if checkpoint is not None:
+            checkpoint(chunk[-1][0])
+
+        stats.read += len(chunk)
+        stats.seconds = time.perf_counter() - start
+        logger.info("imported %s", stats.model_dump())
+    return stats
+
+
+def from_file(conn: sa.Connection | sa.orm.Session, path: str, batch_size: int = 1000) -> ImportStats:
+    """
+    Import the NDJSON or, for a `.csv` path, CSV file at `path`, committing and checkpointing every `batch_size`
+    records. An import interrupted earlier resumes after its checkpoint, which is removed once the import completes.
+    """
+    checkpoint_path = f"{path}.checkpoint"
+    position = 0
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as f:
+            position = json.load(f)["position"]
+        logger.info("resuming import of %s after record %d", path, position)
+
+    def checkpoint(position: int) -> None:
+        with open(f"{checkpoint_path}.tmp", "w") as f:
+            json.dump({"position": position}, f)
+        os.replace(f"{checkpoint_path}.tmp", checkpoint_path)
+
+    stats = load(conn, _read(path, position), batch_size, checkpoint)
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return stats
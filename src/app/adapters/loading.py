@@ -0,0 +1,62 @@
+"""
+This module contains the relationship loading plan of every view and handler.
+"""
+
+import typing as t
+
+from sqlalchemy import orm
+
+from src.app.domain import model
+
+STRATEGIES: dict[str, t.Callable] = {
+    "select": orm.lazyload,
+    "selectin": orm.selectinload,
+    "joined": orm.joinedload,
+    "noload": orm.noload,
+    "raise": orm.raiseload,
+}
+
+
+def options(name: str, _model: t.Type[model.BaseModel]) -> list:
+    """
+    Build the loader options a repository of `_model` applies inside the unit of work `name`.
+
+    Relationships the plan doesn't mention raise on access, so a forgotten lazy load fails loudly.
+    """
+    plan = LOADING_PLANS.get(name, {})
+    opts = [orm.raiseload("*")]
+    for path, strategy in plan.items():
+        entity, _, relationship = path.partition(".")
+        if entity == _model.__name__:
+            opts.append(STRATEGIES[strategy](getattr(_model, relationship)))
+    return opts
+
+
+LOADING_PLANS: dict[str, dict[str, str]] = {
+    # views
+    "get_post": {"Post.images": "selectin"},
+    "find_post": {"Post.images": "selectin"},
+    "get_posts": {"Post.images": "selectin"},
+    "get_comments": {},
+    "get_comment": {},
+    "get_reply_comments": {},
+    # handlers
+    "create_post": {},
+    "attach_image": {"Post.images": "noload"},
+    "edit_post": {},
+    "like_unlike_post": {"Post.likes": "selectin"},
+    "like_unlike_comment": {"Comment.likes": "selectin"},
+    "comment_post": {"Post.comments": "noload"},
+    "reply_comment": {},
+    "delete_post": {},
+    "delete_comment": {"Comment.replies": "selectin", "Comment.likes": "selectin", "Comment.post": "noload", "Comment.comment": "noload"},
+    "update_post_feed": {},
+    "rebuild_post_feed": {},
+    "reconcile_counters": {},
+    "rebuild_trending": {},
+    "get_trending": {},
+    "get_post_etag": {},
+    "get_changes": {},
+    "purge_deleted_posts": {},
+    "sweep_orphan_images": {},
+}
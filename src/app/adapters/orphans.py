@@ -0,0 +1,101 @@
+"""
+This module sweeps the file storage for objects no `images` row points to.
+
+Uploads that lost their row, for example to a failed commit, are never deleted by anything else. `sweep` walks
+the storage listing page by page in key order and looks each page up in the `images` table with one indexed
+select. Memory stays bounded by the page size whatever the size of the bucket or the table. Objects newer than
+`min_age` are skipped, since their row may not be committed yet. Orphans are deleted one multi-object delete per
+page, paced to at most `rate` deletes per second. Stats are logged after every page. Their `last_path` is where
+an interrupted sweep resumes.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import datetime
+import itertools
+import logging
+import time
+import typing as t
+
+import sqlalchemy as sa
+
+from src.app.adapters import file_storage
+from src.app.adapters import orm
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class SweepStats:
+    listed: int = 0
+    referenced: int = 0
+    recent: int = 0
+    orphans: int = 0
+    deleted: int = 0
+    failed: int = 0
+    last_path: str | None = None
+
+    def model_dump(self) -> dict:
+        return dataclasses.asdict(self)
+
+
+class _Pacer:
+    """
+    Spaces out batches so that they average at most `rate` items per second. No rate means no waiting.
+    """
+
+    def __init__(self, rate: float | None):
+        self.rate = rate
+        self._next = time.monotonic()
+
+    def wait(self, n: int) -> None:
+        if not self.rate:
+            return
+        now = time.monotonic()
+        if self._next > now:
+            time.sleep(self._next - now)
+        self._next = max(self._next, now) + n / self.rate
+
+
+def referenced(conn: sa.Connection | sa.orm.Session, paths: list[str]) -> set[str]:
+    """
+    The subset of `paths` some `images` row points to.
+    """
+    return set(conn.execute(sa.select(orm.images.c.path).where(orm.images.c.path.in_(paths))).scalars())
+
+
+def sweep(
+    storage: file_storage.AbstractFileStorage,
+    lookup: t.Callable[[list[str]], set[str]],
+    page_size: int = 1000,
+    rate: float | None = None,
+    min_age: datetime.timedelta = datetime.timedelta(hours=1),
+    dry_run: bool = False,
+    prefix: str = "posts/",
+    start_after: str | None = None,
+) -> SweepStats:
+    """
+    Delete the objects under `prefix` that `lookup` doesn't find, or with `dry_run` only count them.
+    """
+    stats = SweepStats(last_path=start_after)
+    pacer = _Pacer(rate)
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - min_age
+    listing = storage.iter_paths(prefix, start_after)
+    while page := list(itertools.islice(listing, page_size)):
+        paths = [path for path, modified in page if modified is None or modified < cutoff]
+        known = lookup(paths) if paths else set()
+        orphans = [path for path in paths if path not in known]
+
+        stats.listed += len(page)
+        stats.recent += len(page) - len(paths)
+        stats.referenced += len(known)
+        stats.orphans += len(orphans)
+        if orphans and not dry_run:
+            pacer.wait(len(orphans))
+            failed = storage.delete_many(orphans)
+            stats.failed += len(failed)
+            stats.deleted += len(orphans) - len(failed)
+        stats.last_path = page[-1][0]
+        logger.info("orphan sweep%s: %s", " (dry run)" if dry_run else "", stats.model_dump())
+    return stats
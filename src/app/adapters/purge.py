@@ -0,0 +1,63 @@
+"""
+This module purges soft-deleted posts.
+
+Deleting a post only sets `posts.deleted_time`, which hides it from every view at once. The purge then
+removes what the post owned in bounded batches, one short transaction each: the likes of the post and of
+its comments, its comments from the deepest replies up, its images and finally the post row. Every batch
+holds row locks for only `batch_size` rows, so purging a popular post never blocks other writes for long.
+"""
+
+import dataclasses
+
+import sqlalchemy as sa
+
+from src.app.adapters import orm
+
+
+@dataclasses.dataclass
+class Step:
+    """
+    One batch of a post's purge: the rows deleted, the storage paths of deleted images and whether the post is gone.
+    """
+
+    rows: int = 0
+    paths: list[str] = dataclasses.field(default_factory=list)
+    done: bool = False
+
+
+def deleted_posts(conn: sa.Connection | sa.orm.Session, limit: int) -> list[str]:
+    """
+    The ids of up to `limit` soft-deleted posts, deleted longest ago first.
+    """
+    stmt = sa.select(orm.posts.c.id).where(orm.posts.c.deleted_time.is_not(None)).order_by(orm.posts.c.deleted_time).limit(limit)
+    return list(conn.execute(stmt).scalars())
+
+
+def _delete_batch(conn: sa.Connection | sa.orm.Session, table: sa.Table, ids: sa.Select, *returning: sa.Column) -> sa.Result:
+    return conn.execute(table.delete().where(table.c.id.in_(ids.scalar_subquery())).returning(table.c.id, *returning))
+
+
+def step(conn: sa.Connection | sa.orm.Session, post_id: str, batch_size: int) -> Step:
+    """
+    Delete the next batch of at most `batch_size` rows owned by the soft-deleted post `post_id`.
+    """
+    comment_ids = sa.select(orm.comments.c.id).where(orm.comments.c.post_id == post_id)
+    batches = [
+        (orm.likes, sa.select(orm.likes.c.id).where(orm.likes.c.post_id == post_id)),
+        (orm.likes, sa.select(orm.likes.c.id).where(orm.likes.c.comment_id.in_(comment_ids))),
+        (orm.comments, comment_ids.order_by(orm.comments.c.level.desc())),
+    ]
+    for table, ids in batches:
+        rows = len(_delete_batch(conn, table, ids.limit(batch_size)).all())
+        if rows:
+            return Step(rows=rows)
+
+    images = _delete_batch(
+        conn, orm.images, sa.select(orm.images.c.id).where(orm.images.c.post_id == post_id).limit(batch_size), orm.images.c.path
+    )
+    paths = [image.path for image in images]
+    if paths:
+        return Step(rows=len(paths), paths=paths)
+
+    rows = conn.execute(orm.posts.delete().where(orm.posts.c.id == post_id, orm.posts.c.deleted_time.is_not(None))).rowcount
+    return Step(rows=rows, done=True)
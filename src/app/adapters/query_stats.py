@@ -0,0 +1,148 @@
+"""
+This module contains the SQL query accounting used by the unit of work.
+"""
+
+from __future__ import annotations
+
+import collections
+import contextlib
+import contextvars
+import dataclasses
+import logging
+import re
+import threading
+import time
+import typing as t
+
+import sqlalchemy as sa
+
+from src.app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_PARAM_LIST = re.compile(r"\((?:%\(\w+\)s|\?)(?:, (?:%\(\w+\)s|\?))*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """
+    Normalize a SQL statement so that executions differing only in bound values share a shape.
+    """
+    return _PARAM_LIST.sub("(?)", _WHITESPACE.sub(" ", statement).strip())
+
+
+@dataclasses.dataclass
+class QueryStats:
+    """
+    Statements, rows and DB time spent inside one unit of work.
+    """
+
+    name: str
+    statements: int = 0
+    rows: int = 0
+    db_time: float = 0.0
+    shapes: collections.Counter[str] = dataclasses.field(default_factory=collections.Counter)
+
+    def record(self, statement: str, rows: int, elapsed: float) -> None:
+        self.statements += 1
+        self.rows += max(rows, 0)
+        self.db_time += elapsed
+        self.shapes[statement_shape(statement)] += 1
+
+    def n_plus_one_suspects(self, threshold: int | None = None) -> list[tuple[str, int]]:
+        """
+        Statement shapes executed at least `threshold` times, most repeated first.
+        """
+        threshold = settings.N_PLUS_ONE_THRESHOLD if threshold is None else threshold
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+    def model_dump(self) -> dict:
+        return {
+            "name": self.name,
+            "statements": self.statements,
+            "rows": self.rows,
+            "db_time_ms": round(self.db_time * 1000, 3),
+        }
+
+
+@dataclasses.dataclass
+class QueryMetrics:
+    """
+    Running totals of every finished unit of work sharing a name.
+    """
+
+    count: int = 0
+    statements: int = 0
+    rows: int = 0
+    db_time: float = 0.0
+    n_plus_one: int = 0
+
+
+current: contextvars.ContextVar[QueryStats | None] = contextvars.ContextVar("query_stats", default=None)
+metrics: collections.defaultdict[str, QueryMetrics] = collections.defaultdict(QueryMetrics)
+_captures: list[list[QueryStats]] = []
+# units of work finish on many threads at once
+_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def track(name: str) -> t.Iterator[QueryStats]:
+    """
+    Count every statement executed in this context, then log and aggregate the totals.
+    """
+    stats = QueryStats(name)
+    token = current.set(stats)
+    try:
+        yield stats
+    finally:
+        current.reset(token)
+        report(stats)
+
+
+def report(stats: QueryStats) -> None:
+    """
+    Log the stats of a finished unit of work and add them to the metrics.
+    """
+    suspects = stats.n_plus_one_suspects()
+    with _lock:
+        totals = metrics[stats.name]
+        totals.count += 1
+        totals.statements += stats.statements
+        totals.rows += stats.rows
+        totals.db_time += stats.db_time
+        totals.n_plus_one += len(suspects)
+        for captured in _captures:
+            captured.append(stats)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("query stats %s", stats.model_dump(), extra={"query_stats": stats.model_dump()})
+    for shape, count in suspects:
+        logger.warning("possible N+1 in %s: %d x %s", stats.name, count, shape)
+
+
+@contextlib.contextmanager
+def capture() -> t.Iterator[list[QueryStats]]:
+    """
+    Collect the stats of every unit of work finished in this context.
+    """
+    captured: list[QueryStats] = []
+    with _lock:
+        _captures.append(captured)
+    try:
+        yield captured
+    finally:
+        with _lock:
+            _captures.remove(captured)
+
+
+@sa.event.listens_for(sa.Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_start"] = time.perf_counter()
+
+
+@sa.event.listens_for(sa.Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"]
+    stats = current.get()
+    if stats is not None:
+        stats.record(statement, cursor.rowcount, elapsed)
@@ -0,0 +1,189 @@
+"""
+This module shares the GET /posts cache invalidations and the live post updates between the worker processes
+of a server, over Postgres LISTEN/NOTIFY.
+
+`SharedResultCache` and `SharedBroadcaster` apply an invalidation or an update in their own process, as their
+in-process counterparts do, and notify it on `CHANNEL`. A listener thread in every worker applies the
+notifications of the other workers to its own cache and broadcaster. The bus runs these handlers after the write
+committed, so a worker never invalidates ahead of the write it learns about.
+
+A listener that loses its connection may miss notifications until it reconnects, so on every connect it clears
+its cache and has every live subscriber refetch its post.
+"""
+
+from __future__ import annotations
+
+import functools
+import json
+import logging
+import select
+import threading
+import typing as t
+import uuid
+
+from src.app.adapters import broadcast
+from src.app.adapters import cache
+
+if t.TYPE_CHECKING:
+    import psycopg2.extensions
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "post_updates"
+
+
+class Relay:
+    """
+    Notifications on a Postgres channel: sent on one connection, received by a listener thread on another.
+
+    Create it before forking the workers and `start` it in each of them: a notification carries the id its
+    relay drew on `start`, so that the worker that sent it skips it. The driver is only imported once it is used,
+    so that importing the app connects nowhere.
+    """
+
+    def __init__(self, uri: str, channel: str = CHANNEL, reconnect_delay: float = 1.0):
+        self.uri = uri
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self.origin = ""
+        self.listening = threading.Event()
+        self._handlers: dict[str, t.Callable[..., None]] = {}
+        self._on_connect: list[t.Callable[[], None]] = []
+        self._sender: psycopg2.extensions.connection | None = None
+        self._send_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def on(self, kind: str, handler: t.Callable[..., None]) -> None:
+        """
+        Call `handler` with the payload of every notification of `kind` another worker sends.
+        """
+        self._handlers[kind] = handler
+
+    def on_connect(self, handler: t.Callable[[], None]) -> None:
+        """
+        Call `handler` whenever the listener (re)connects, as it may have missed notifications meanwhile.
+        """
+        self._on_connect.append(handler)
+
+    def _connect(self) -> psycopg2.extensions.connection:
+        import psycopg2
+
+        conn = psycopg2.connect(self.uri)
+        conn.autocommit = True
+        return conn
+
+    def send(self, kind: str, **payload: t.Any) -> None:
+        """
+        Notify every other worker listening. Not sent before `start`, as no other worker is either.
+        """
+        if not self.origin:
+            return
+        import psycopg2
+
+        message = json.dumps({"kind": kind, "origin": self.origin, **payload}, separators=(",", ":"))
+        with self._send_lock:
+            # a connection dropped since the last send is only found out by using it, so retry once on a new one
+            for retry in (True, False):
+                try:
+                    if self._sender is None or self._sender.closed:
+                        self._sender = self._connect()
+                    with self._sender.cursor() as cursor:
+                        cursor.execute("SELECT pg_notify(%s, %s)", (self.channel, message))
+                    return
+                except psycopg2.OperationalError:
+                    self._sender = None
+                    if not retry:
+                        raise
+
+    def start(self) -> None:
+        """
+        Start listening, in a thread of the calling process.
+        """
+        self.origin = uuid.uuid4().hex
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen, name="relay", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._send_lock:
+            if self._sender is not None:
+                self._sender.close()
+                self._sender = None
+        self.origin = ""
+
+    def _listen(self) -> None:
+        import psycopg2
+
+        while not self._stop.is_set():
+            try:
+                conn = self._connect()
+            except psycopg2.Error:
+                logger.warning("relay cannot connect, retrying in %.1fs", self.reconnect_delay)
+                self._stop.wait(self.reconnect_delay)
+                continue
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.channel}"')
+                for handler in self._on_connect:
+                    handler()
+                self.listening.set()
+                while not self._stop.is_set():
+                    # wake up every second to notice `stop`
+                    if select.select([conn], [], [], 1.0)[0]:
+                        conn.poll()
+                        while conn.notifies:
+                            self._dispatch(conn.notifies.pop(0).payload)
+            except psycopg2.Error:
+                logger.warning("relay lost its connection, reconnecting")
+            finally:
+                self.listening.clear()
+                conn.close()
+
+    def _dispatch(self, payload: str) -> None:
+        message = json.loads(payload)
+        if message.pop("origin") == self.origin:
+            return
+        handler = self._handlers.get(message.pop("kind"))
+        if handler is None:
+            return
+        try:
+            handler(**message)
+        except Exception:
+            logger.exception("relay failed to apply %s", payload)
+
+
+class SharedResultCache(cache.ResultCache):
+    """
+    A `ResultCache` whose invalidations reach the caches of the other workers too.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, relay: Relay, generations: cache.Generations | None = None):
+        super().__init__(max_entries, ttl, generations)
+        self.relay = relay
+        relay.on("invalidate", functools.partial(cache.ResultCache.invalidate, self))
+        relay.on_connect(self.clear)
+
+    def invalidate(self, author_id: str) -> None:
+        super().invalidate(author_id)
+        self.relay.send("invalidate", author_id=author_id)
+
+
+class SharedBroadcaster(broadcast.Broadcaster):
+    """
+    A `Broadcaster` whose updates reach the subscribers of the other workers too.
+    """
+
+    def __init__(self, relay: Relay, **kwargs: t.Any):
+        super().__init__(**kwargs)
+        self.relay = relay
+        relay.on("publish", functools.partial(broadcast.Broadcaster.publish, self))
+        relay.on_connect(self.resync)
+
+    def publish(self, post_id: str, like_delta: int = 0, comment_delta: int = 0, version: int | None = None) -> None:
+        super().publish(post_id, like_delta, comment_delta, version)
+        self.relay.send("publish", post_id=post_id, like_delta=like_delta, comment_delta=comment_delta, version=version)
@@ -3,9 +3,11 @@ This module contains the AbstractRepository class and its subclasses.
 """
 
 import abc
+import collections
 import datetime
 import typing as t
 
+import sqlalchemy as sa
 from sqlalchemy import orm
 
 from src.app.domain import model
@@ -34,6 +36,15 @@ class AbstractRepository(abc.ABC):
             self.seen.add(r)
         return r
 
+    def get_existing(self, id: str) -> model.BaseModel:
+        """
+        Get a record from the repository by ID, raising model.NotFound when there is none.
+        """
+        r = self.get(id)
+        if r is None:
+            raise model.NotFound(id)
+        return r
+
     def edit(self, r: model.BaseModel, _new: dict) -> None:
         """
         Edit a record in the repository.
@@ -46,7 +57,7 @@ class AbstractRepository(abc.ABC):
         Delete a record from the repository.
         """
         self._delete(r)
-        self.seen.remove(r)
+        self.seen.add(r)  # still collect the events of deleted records
 
     def query(self, **kwargs) -> list[model.BaseModel]:
         """
@@ -56,13 +67,11 @@ class AbstractRepository(abc.ABC):
         self.seen.update(rcs)
         return rcs
 
-    @property
-    @abc.abstractmethod
-    def _q(self):
+    def increment(self, id: str, counter: str, by: int = 1) -> None:
         """
-        Abstract method to add a record to the repository.
+        Add `by` to the `counter` column of a record, without reading it first.
         """
-        raise NotImplementedError
+        self._increment(id, counter, by)
 
     @abc.abstractmethod
     def _add(self, r: model.BaseModel):
@@ -99,15 +108,24 @@ class AbstractRepository(abc.ABC):
         """
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def _increment(self, id: str, counter: str, by: int):
+        """
+        Abstract method to add to a counter of a record.
+        """
+        raise NotImplementedError
+
 
 class SqlAlchemyRepository(AbstractRepository):
-    def __init__(self, session: orm.Session, model: t.Type[model.BaseModel]):
+    def __init__(self, session: orm.Session, model: t.Type[model.BaseModel], options: t.Sequence = ()):
         """
         Initialize the SqlAlchemyRepository class.
+        `options` are the loader options applied to every query of this repository.
         """
         super().__init__()
         self.session = session
         self.model = model
+        self.options = options
 
     def _add(self, r: model.BaseModel):
         """
@@ -115,12 +133,11 @@ class SqlAlchemyRepository(AbstractRepository):
         """
         self.session.add(r)
 
-    def _get(self, r_id: str) -> model.BaseModel:
+    def _get(self, r_id: str) -> model.BaseModel | None:
         """
         Get a record Table from the SQL Alchemy repository by ID.
         """
-        _model = self.model
-        return self.session.query(_model).filter_by(id=r_id).first()
+        return self._q.filter_by(id=r_id).first()
 
     def _edit(self, r: model.BaseModel, _new: dict) -> None:
         """
@@ -136,16 +153,31 @@ class SqlAlchemyRepository(AbstractRepository):
     def _delete(self, r: model.BaseModel) -> None:
         """
         Delete a record Table from the SQL Alchemy repository.
+        Posts are only marked deleted, so that deleting one doesn't load and delete everything it owns at once.
         """
-        _model = self.model
-        self.session.delete(r)
+        if isinstance(r, model.Post):
+            r.delete()
+        else:
+            self.session.delete(r)
 
     def _query(self, **kwargs) -> list[model.BaseModel]:
         """
         Query from SQL Alchemy repository.
+        A list value matches any of its items.
         """
-        _model = self.model
-        return self.session.query(_model).filter_by(**kwargs).all()
+        q = self._q
+        for name, value in kwargs.items():
+            column = getattr(self.model, name)
+            q = q.filter(column.in_(value) if isinstance(value, list) else column == value)
+        return q.all()
+
+    def _increment(self, r_id: str, counter: str, by: int) -> None:
+        """
+        Add to a counter in one atomic UPDATE, so that concurrent writers never lose each other's updates.
+        A record already loaded in the session gets the new value too.
+        """
+        column = getattr(self.model, counter)
+        self.session.execute(sa.update(self.model).filter_by(id=r_id).values({column: column + by}))
 
     @property
     def _q(self) -> orm.query.Query:
@@ -153,4 +185,127 @@ class SqlAlchemyRepository(AbstractRepository):
         Get the query object.
         Use to execute complex queries.
         """
-        return self.session.query(self.model)
+        q = self.session.query(self.model).options(*self.options)
+        if self.model is model.Post:
+            q = q.filter_by(deleted_time=None)
+        elif self.model is model.Comment:
+            # the comments of a deleted post stay until it is purged, hidden with it
+            post = orm.aliased(model.Post)
+            q = q.filter(sa.exists().where(getattr(post, "id") == model.Comment.post_id, getattr(post, "deleted_time").is_(None)))
+        return q
+
+
+class InMemoryRepository(AbstractRepository):
+    # the fields every model that has them is indexed by, besides its id
+    INDEXED = ("post_id", "comment_id")
+
+    records: dict[str, model.BaseModel]
+    indexes: dict[str, dict[str, dict[str, None]]]
+
+    def __init__(self, model: t.Type[model.BaseModel], posts: "InMemoryRepository | None" = None):
+        """
+        Initialize the InMemoryRepository class.
+        Records are kept by id and indexed by `INDEXED`, so that lookups by those never scan the repository.
+        Records of a post deleted from `posts` are hidden with it, as in the database.
+        """
+        super().__init__()
+        self.model = model
+        self.posts = posts
+        self.records = {}
+        self.indexes = {field: collections.defaultdict(dict) for field in self.INDEXED}
+
+    def _add(self, r: model.BaseModel):
+        """
+        Add a record to the in-memory repository, giving it the relationships the mappers would.
+        """
+        for relationship in ("likes", "comments", "images"):
+            if relationship in self.model.__annotations__ and not hasattr(r, relationship):
+                setattr(r, relationship, [])
+        if isinstance(r, model.Comment) and getattr(r, "replies", None) is None:
+            # `replies` is the comment replied to
+            setattr(r, "replies", self.records.get(r.comment_id) if r.comment_id else None)
+        self.records[r.id] = r
+        for field, index in self.indexes.items():
+            if (value := getattr(r, field, None)) is not None:
+                index[value][r.id] = None
+
+    def _get(self, r_id: str) -> model.BaseModel | None:
+        """
+        Get a record from the in-memory repository by ID.
+        """
+        r = self.records.get(r_id)
+        if r is None or not self._live(r):
+            return None
+        return r
+
+    def _edit(self, r: model.BaseModel, _new: dict) -> None:
+        """
+        Edit a record in the in-memory repository.
+        """
+        if isinstance(r, model.Post):
+            r.edit(_new["title"], _new["content"])
+
+    def _delete(self, r: model.BaseModel) -> None:
+        """
+        Delete a record from the in-memory repository. Posts are only marked deleted, as in the database.
+        """
+        if isinstance(r, model.Post):
+            r.delete()
+            return
+        self._remove(r)
+
+    def _remove(self, r: model.BaseModel) -> None:
+        del self.records[r.id]
+        for field, index in self.indexes.items():
+            if (value := getattr(r, field, None)) is not None:
+                index[value].pop(r.id, None)
+
+    def deleted(self, limit: int) -> list[model.BaseModel]:
+        """
+        Up to `limit` soft-deleted records, deleted longest ago first.
+        """
+        deleted = [r for r in self.records.values() if getattr(r, "deleted_time", None) is not None]
+        return sorted(deleted, key=lambda r: getattr(r, "deleted_time"))[:limit]
+
+    def purge(self, post_id: str) -> list[model.BaseModel]:
+        """
+        Remove for good the records of the post `post_id`, hidden or not, or that post itself from a repository
+        of posts, as purging a deleted post does. Returns the removed records.
+        """
+        if self.model is model.Post:
+            ids = [post_id] if post_id in self.records else []
+        else:
+            ids = list(self.indexes["post_id"].get(post_id, ()))
+        removed = [self.records[r_id] for r_id in ids]
+        for r in removed:
+            self._remove(r)
+        return removed
+
+    def _query(self, **kwargs) -> list[model.BaseModel]:
+        """
+        Query the in-memory repository, through the index of an indexed field when one is given.
+        A list value matches any of its items.
+        """
+        values = {name: set(value) if isinstance(value, list) else {value} for name, value in kwargs.items()}
+        ids: t.Iterable[str]
+        if "id" in values:
+            ids = values.pop("id")
+        elif indexed := [name for name in values if name in self.indexes]:
+            name = indexed[0]
+            ids = [r_id for value in values.pop(name) for r_id in self.indexes[name].get(value, ())]
+        else:
+            ids = self.records
+        records = (self.records[r_id] for r_id in ids if r_id in self.records)
+        return [r for r in records if self._live(r) and all(getattr(r, name) in allowed for name, allowed in values.items())]
+
+    def _live(self, r: model.BaseModel) -> bool:
+        if getattr(r, "deleted_time", None) is not None:
+            return False
+        return self.posts is None or self.posts._get(getattr(r, "post_id")) is not None
+
+    def _increment(self, r_id: str, counter: str, by: int) -> None:
+        """
+        Add to a counter of a record in the in-memory repository.
+        """
+        r = self.records[r_id]
+        setattr(r, counter, getattr(r, counter) + by)
@@ -0,0 +1,110 @@
+"""
+This module coalesces concurrent identical reads, so that only one of them reaches the database.
+
+The first caller for a key runs the read; callers arriving while it is in flight wait for its result,
+or its exception, for at most `timeout` seconds and then raise TimeoutError. Nothing is cached:
+once the read finishes, the next caller starts a new one.
+`Group` serves threads, such as FastAPI's threadpool, and `AsyncGroup` serves coroutines on one event loop.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import threading
+import typing as t
+
+from src.app.config import settings
+
+T = t.TypeVar("T")
+
+
+@dataclasses.dataclass
+class FlightStats:
+    leaders: int = 0
+    followers: int = 0
+    timeouts: int = 0
+
+    def model_dump(self) -> dict:
+        return dataclasses.asdict(self)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: t.Any = None
+        self.error: BaseException | None = None
+
+
+class Group:
+    """
+    Single flight for threads.
+    """
+
+    def __init__(self, timeout: float = settings.SINGLE_FLIGHT_TIMEOUT_SECONDS):
+        self.timeout = timeout
+        self.stats = FlightStats()
+        self._calls: dict[t.Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: t.Hashable, fn: t.Callable[[], T], timeout: float | None = None) -> T:
+        """
+        Run `fn`, or wait for the run of `fn` already in flight for `key`, and return its result.
+        """
+        with self._lock:
+            in_flight = self._calls.get(key)
+            leader = in_flight is None
+            if in_flight is None:
+                call = self._calls[key] = _Call()
+                self.stats.leaders += 1
+            else:
+                call = in_flight
+                self.stats.followers += 1
+
+        if not leader:
+            if not call.done.wait(self.timeout if timeout is None else timeout):
+                self.stats.timeouts += 1
+                raise TimeoutError(f"timed out waiting for the read of {key!r} in flight")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class AsyncGroup:
+    """
+    Single flight for coroutines. Followers are shielded, so one timing out doesn't cancel the read.
+    """
+
+    def __init__(self, timeout: float = settings.SINGLE_FLIGHT_TIMEOUT_SECONDS):
+        self.timeout = timeout
+        self.stats = FlightStats()
+        self._calls: dict[t.Hashable, asyncio.Future] = {}
+
+    async def do(self, key: t.Hashable, fn: t.Callable[[], t.Awaitable[T]], timeout: float | None = None) -> T:
+        """
+        Await `fn()`, or the run of it already in flight for `key`, and return its result.
+        """
+        call = self._calls.get(key)
+        if call is None:
+            self.stats.leaders += 1
+            call = self._calls[key] = asyncio.ensure_future(fn())
+            call.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.stats.followers += 1
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(call), self.timeout if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            self.stats.timeouts += 1
+            raise TimeoutError(f"timed out waiting for the read of {key!r} in flight") from None
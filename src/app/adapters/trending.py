@@ -0,0 +1,290 @@
+"""
+This module contains the trending ranking of posts.
+
+Scores use forward exponential decay: an event at time `t` adds `weight * 2 ** ((t - epoch) / half_life)`
+to its post. Every score decays at the same rate, so the order of the raw scores is the order of the decayed
+ones and an event only touches its own post. `Trending.renormalize` moves the epoch forward and scales every
+raw score down, before the growth term gets large enough to lose float precision.
+
+An unlike or a deleted comment subtracts the weight of the like or comment as of when it was made, which is what
+it added. `rebuild` dates every like and comment to its post, so taking one back can overshoot a seeded score:
+no score goes below zero. The ranking is seeded from the stored counters with `rebuild`,
+by the app's lifespan when it finds the ranking empty, or by `python main.py --rebuild-trending`.
+
+Raw scores live in a sorted set: `HeapSortedSet` in process, or `RedisSortedSet` so that every worker shares it.
+"""
+
+from __future__ import annotations
+
+import abc
+import heapq
+import logging
+import threading
+import time
+import typing as t
+
+import sqlalchemy as sa
+
+from src.app.adapters import orm
+from src.app.config import Settings
+from src.app.config import settings
+from src.app.domain import events
+
+if t.TYPE_CHECKING:
+    # imported when the redis backend is configured, so that the in-process one runs without the package
+    import redis
+
+logger = logging.getLogger(__name__)
+
+LIKE_WEIGHT = 1.0
+COMMENT_WEIGHT = 2.0
+POST_WEIGHT = 1.0
+
+WEIGHTS: dict[type[events.Event], float] = {
+    events.CreatedPostEvent: POST_WEIGHT,
+    events.LikedPostEvent: LIKE_WEIGHT,
+    events.CreatedCommentEvent: COMMENT_WEIGHT,
+    events.RepliedCommentEvent: COMMENT_WEIGHT,
+}
+
+
+class AbstractSortedSet(abc.ABC):
+    """
+    The subset of a Redis sorted set the ranking needs, plus the epoch its scores are relative to.
+    """
+
+    @abc.abstractmethod
+    def incr(self, member: str, amount: float) -> None:
+        """
+        Add `amount` to the score of `member`, leaving it at zero if it would go below.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def remove(self, member: str) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def top(self, k: int) -> list[tuple[str, float]]:
+        """
+        The `k` members with the highest scores, highest first.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def scale(self, factor: float, epoch: float) -> None:
+        """
+        Multiply every score by `factor` and record the new `epoch`, as one step.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def epoch(self) -> float | None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class HeapSortedSet(AbstractSortedSet):
+    """
+    In-process sorted set: a score dict plus a max-heap with lazy invalidation.
+
+    `incr` pushes a fresh heap entry in O(log N) and leaves the old one stale. `top` pops entries until it has
+    `k` current ones and pushes those back, so it costs O(K log N) plus the stale entries it discards.
+    The heap is rebuilt once stale entries outnumber the members.
+    """
+
+    def __init__(self):
+        self._scores: dict[str, float] = {}
+        self._heap: list[tuple[float, str]] = []
+        self._epoch: float | None = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def incr(self, member: str, amount: float) -> None:
+        with self._lock:
+            score = max(self._scores.get(member, 0.0) + amount, 0.0)
+            self._scores[member] = score
+            heapq.heappush(self._heap, (-score, member))
+            if len(self._heap) > 2 * len(self._scores) + 64:
+                self._compact()
+
+    def remove(self, member: str) -> None:
+        with self._lock:
+            self._scores.pop(member, None)
+
+    def top(self, k: int) -> list[tuple[str, float]]:
+        with self._lock:
+            found: dict[str, float] = {}
+            while self._heap and len(found) < k:
+                neg_score, member = heapq.heappop(self._heap)
+                if self._scores.get(member) == -neg_score:
+                    found[member] = -neg_score
+            for member, score in found.items():
+                heapq.heappush(self._heap, (-score, member))
+            return list(found.items())
+
+    def scale(self, factor: float, epoch: float) -> None:
+        with self._lock:
+            self._scores = {member: score * factor for member, score in self._scores.items()}
+            self._epoch = epoch
+            self._compact()
+
+    def epoch(self) -> float | None:
+        return self._epoch
+
+    def clear(self) -> None:
+        with self._lock:
+            self._scores, self._heap, self._epoch = {}, [], None
+
+    def _compact(self) -> None:
+        self._heap = [(-score, member) for member, score in self._scores.items()]
+        heapq.heapify(self._heap)
+
+
+class RedisSortedSet(AbstractSortedSet):
+    """
+    A Redis sorted set, shared by every worker. ZREVRANGE costs O(log N + K).
+    """
+
+    def __init__(self, client: redis.Redis, key: str = "trending:posts"):
+        self.client = client
+        self.key = key
+        self.epoch_key = f"{key}:epoch"
+
+    def incr(self, member: str, amount: float) -> None:
+        if self.client.zincrby(self.key, amount, member) < 0:
+            # GT only ever raises the score, so a concurrent increment isn't undone
+            self.client.zadd(self.key, {member: 0.0}, gt=True)
+
+    def remove(self, member: str) -> None:
+        self.client.zrem(self.key, member)
+
+    def top(self, k: int) -> list[tuple[str, float]]:
+        return [(m.decode() if isinstance(m, bytes) else m, s) for m, s in self.client.zrevrange(self.key, 0, k - 1, withscores=True)]
+
+    def scale(self, factor: float, epoch: float) -> None:
+        with self.client.pipeline() as pipe:
+            pipe.zunionstore(self.key, {self.key: factor})
+            pipe.set(self.epoch_key, epoch)
+            pipe.execute()
+
+    def epoch(self) -> float | None:
+        epoch = self.client.get(self.epoch_key)
+        return float(epoch) if epoch is not None else None
+
+    def clear(self) -> None:
+        self.client.delete(self.key, self.epoch_key)
+
+
+class Trending:
+    """
+    Decayed post scores over a sorted set.
+    """
+
+    def __init__(
+        self,
+        sorted_set: AbstractSortedSet,
+        half_life: float = settings.TRENDING_HALF_LIFE_HOURS * 3600,
+        renormalize_every: float = settings.TRENDING_RENORMALIZE_SECONDS,
+    ):
+        self.sorted_set = sorted_set
+        self.half_life = half_life
+        self.renormalize_every = renormalize_every
+
+    def _epoch(self, now: float) -> float:
+        epoch = self.sorted_set.epoch()
+        if epoch is None:
+            self.sorted_set.scale(1.0, now)
+            return now
+        if now - epoch > self.renormalize_every:
+            return self.renormalize(now)
+        return epoch
+
+    def _growth(self, t: float, epoch: float) -> float:
+        return 2 ** ((t - epoch) / self.half_life)
+
+    def record(self, post_id: str, weight: float, at: float | None = None) -> None:
+        """
+        Add `weight` to the score of `post_id`, as of `at` (now by default).
+        """
+        now = time.time()
+        epoch = self._epoch(now)
+        self.sorted_set.incr(post_id, weight * self._growth(now if at is None else at, epoch))
+
+    def remove(self, post_id: str) -> None:
+        self.sorted_set.remove(post_id)
+
+    def top(self, k: int) -> list[tuple[str, float]]:
+        """
+        The `k` hottest posts with their decayed scores as of now.
+        """
+        now = time.time()
+        decay = 1 / self._growth(now, self._epoch(now))
+        return [(post_id, score * decay) for post_id, score in self.sorted_set.top(k)]
+
+    def renormalize(self, now: float | None = None) -> float:
+        """
+        Move the epoch to `now`, scaling every raw score to its decayed value. Returns the new epoch.
+        """
+        now = time.time() if now is None else now
+        epoch = self.sorted_set.epoch()
+        factor = 1.0 if epoch is None else 1 / self._growth(now, epoch)
+        self.sorted_set.scale(factor, now)
+        logger.info("renormalized trending scores by %.3g", factor)
+        return now
+
+    def rebuild(self, conn: sa.Connection | sa.orm.Session, batch_size: int = 500) -> int:
+        """
+        Seed the scores from the stored counters, treating every like and comment as made when its post was.
+
+        Returns the number of posts scored.
+        """
+        self.sorted_set.clear()
+        scored, last_id = 0, None
+        while True:
+            stmt = sa.select(orm.posts.c.id, orm.posts.c.like_count, orm.posts.c.comment_count, orm.posts.c.created_time).where(
+                orm.posts.c.deleted_time.is_(None)
+            )
+            if last_id is not None:
+                stmt = stmt.where(orm.posts.c.id > last_id)
+            rows = conn.execute(stmt.order_by(orm.posts.c.id).limit(batch_size)).all()
+            if not rows:
+                break
+            scored += self._score(rows)
+            last_id = rows[-1].id
+        return scored
+
+    def seed(self, posts: t.Iterable[t.Any]) -> int:
+        """
+        Seed the scores as `rebuild` does, from posts already at hand.
+
+        Returns the number of posts scored.
+        """
+        self.sorted_set.clear()
+        return self._score(posts)
+
+    def _score(self, posts: t.Iterable[t.Any]) -> int:
+        scored = 0
+        for post in posts:
+            weight = POST_WEIGHT + LIKE_WEIGHT * (post.like_count or 0) + COMMENT_WEIGHT * post.comment_count
+            self.record(post.id, weight, at=post.created_time.timestamp())
+            scored += 1
+        return scored
+
+
+def from_settings(config: Settings = settings) -> Trending:
+    """
+    Build the ranking configured by TRENDING_BACKEND.
+    """
+    if config.TRENDING_BACKEND == "redis":
+        import redis
+
+        sorted_set: AbstractSortedSet = RedisSortedSet(redis.Redis(host=config.REDIS_HOST, port=config.REDIS_PORT, db=1))
+    else:
+        sorted_set = HeapSortedSet()
+    return Trending(sorted_set, config.TRENDING_HALF_LIFE_HOURS * 3600, config.TRENDING_RENORMALIZE_SECONDS)
@@ -5,7 +5,11 @@ This module contains the bootstrap function for the allocation application.
 import inspect
 import typing as t
 
+from src.app.adapters import broadcast
+from src.app.adapters import cache
 from src.app.adapters import orm
+from src.app.adapters import trending
+from src.app.config import settings
 from src.app.service_layer import handlers
 from src.app.service_layer import messagebus
 from src.app.service_layer import unit_of_work
@@ -13,14 +17,20 @@ from src.app.service_layer import unit_of_work
 
 def bootstrap(
     start_orm: bool = True,
-    uow: unit_of_work.AbstractUnitOfWork | t.Type[unit_of_work.AbstractUnitOfWork] = unit_of_work.SqlAlchemyUnitOfWork(),
+    uow: unit_of_work.AbstractUnitOfWork | t.Type[unit_of_work.AbstractUnitOfWork] = unit_of_work.SqlAlchemyUnitOfWork,
+    ranking: trending.Trending | None = None,
+    posts_cache: cache.ResultCache | None = None,
+    broadcaster: broadcast.Broadcaster | None = None,
 ) -> messagebus.MessageBus:
     """
     Bootstrap the allocation application.
 
     Args:
         start_orm: A boolean indicating whether to start the ORM.
-        uow: An instance of the unit of work.
+        uow: An instance of the unit of work, or a class to make one of.
+        ranking: The trending ranking, built from the settings by default.
+        posts_cache: The GET /posts result cache, sized from the settings by default.
+        broadcaster: The fan-out of live post updates.
         publish: A callable for publishing events.
 
     Returns:
@@ -32,9 +42,25 @@ def bootstrap(
     if isinstance(uow, type):
         uow = uow()
 
-    dependencies = {"uow": uow}
+    if ranking is None:
+        ranking = trending.from_settings()
+
+    if posts_cache is None:
+        posts_cache = cache.ResultCache(settings.POSTS_CACHE_SIZE, settings.POSTS_CACHE_TTL_SECONDS)
+
+    if broadcaster is None:
+        broadcaster = broadcast.Broadcaster()
+
+    # only the database keeps the read models
+    keep_read_models = isinstance(uow, unit_of_work.SqlAlchemyUnitOfWork)
+
+    dependencies = {"uow": uow, "ranking": ranking, "posts_cache": posts_cache, "broadcaster": broadcaster}
     injected_event_handlers = {
-        event_type: [inject_dependencies(handler, dependencies) for handler in event_handlers]
+        event_type: [
+            inject_dependencies(handler, dependencies)
+            for handler in event_handlers
+            if keep_read_models or handler not in handlers.READ_MODEL_HANDLERS
+        ]
         for event_type, event_handlers in handlers.EVENT_HANDLERS.items()
     }
     injected_command_handlers = {
@@ -45,6 +71,9 @@ def bootstrap(
         uow=uow,
         event_handlers=injected_event_handlers,
         command_handlers=injected_command_handlers,
+        ranking=ranking,
+        posts_cache=posts_cache,
+        broadcaster=broadcaster,
     )
 
 
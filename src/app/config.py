@@ -35,5 +35,37 @@ class Settings(pydantic_settings.BaseSettings):
 
     LOGGING_LEVEL: int = logging.INFO
 
+    N_PLUS_ONE_THRESHOLD: int = 5
+    CORE_READS: bool = False
+    FAST_RESPONSES: bool = False
+    FEED_READS: bool = True
+
+    TRENDING_BACKEND: str = "memory"  # or "redis", to share the ranking between workers
+    TRENDING_HALF_LIFE_HOURS: float = 24.0
+    TRENDING_RENORMALIZE_SECONDS: int = 3600
+
+    POSTS_CACHE_SIZE: int = 1024  # 0 disables the GET /posts result cache
+    POSTS_CACHE_TTL_SECONDS: float = 5.0
+
+    # lifetime of presigned image links, a post with images gets a new ETag every half of it
+    IMAGE_LINK_EXPIRY_SECONDS: int = 7 * 24 * 3600
+
+    SINGLE_FLIGHT_TIMEOUT_SECONDS: float = 5.0
+
+    LIVE_UPDATES_WINDOW_SECONDS: float = 0.5  # deltas to a post within a window are sent as one message
+    LIVE_UPDATES_QUEUE_SIZE: int = 16  # a subscriber this many messages behind is told to resync
+    LIVE_UPDATES_HEARTBEAT_SECONDS: float = 15.0
+
+    PURGE_BATCH_SIZE: int = 500  # rows deleted per transaction when purging a deleted post
+    PURGE_INTERVAL_SECONDS: float = 60.0
+
+    ORPHAN_SWEEP_DELETES_PER_SECOND: float = 500.0
+
+    WEB_HOST: str = "0.0.0.0"
+    WEB_PORT: int = 8000
+    # processes forked by `python -m src.app.entrypoints.server`, 0 for one per core. More than one needs
+    # TRENDING_BACKEND=redis, see the server module.
+    WEB_WORKERS: int = 1
+
 
 settings = Settings()
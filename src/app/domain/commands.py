@@ -98,3 +98,48 @@ class DeleteCommentCommand(Command):
 
     user_id: str
     comment_id: str
+
+
+class RebuildPostFeedCommand(Command):
+    """
+    Command for re-projecting every post into the post_feed read model.
+    """
+
+    batch_size: int = 500
+
+
+class RebuildTrendingCommand(Command):
+    """
+    Command for re-seeding the trending scores from the stored post counters.
+    """
+
+    batch_size: int = 500
+
+
+class ReconcileCountersCommand(Command):
+    """
+    Command for recounting the comment and reply counters and repairing the ones that drifted.
+    """
+
+    batch_size: int = 500
+
+
+class PurgeDeletedPostsCommand(Command):
+    """
+    Command for removing up to `max_posts` soft-deleted posts with everything they own, `batch_size` rows at a time.
+    """
+
+    batch_size: int = 500
+    max_posts: int = 100
+
+
+class SweepOrphanImagesCommand(Command):
+    """
+    Command for deleting the stored image objects no image row points to, or with `dry_run` only counting them.
+    """
+
+    page_size: int = 1000
+    deletes_per_second: float | None = None
+    min_age_seconds: float = 3600
+    dry_run: bool = False
+    start_after: str | None = None
@@ -1,3 +1,5 @@
+import datetime
+
 import fastapi
 import pydantic
 
@@ -14,6 +16,7 @@ class CreatedPostEvent(Event):
     """
 
     post_id: str
+    author_id: str
 
 
 class EditedPostEvent(Event):
@@ -22,6 +25,7 @@ class EditedPostEvent(Event):
     """
 
     post_id: str
+    author_id: str
     version: int
 
 
@@ -31,6 +35,7 @@ class DeletedPostEvent(Event):
     """
 
     post_id: str
+    author_id: str
 
 
 class LikedPostEvent(Event):
@@ -49,6 +54,7 @@ class UnlikedPostEvent(Event):
 
     post_id: str
     user_id: str
+    liked_time: datetime.datetime | None = None  # when the like taken back was made
 
 
 class LikedCommentEvent(Event):
@@ -89,10 +95,22 @@ class RepliedCommentEvent(Event):
 
 class DeletedCommentEvent(Event):
     """
-    Event representing the deletion of a comment.
+    Event representing the deletion of a comment, which deletes its replies too.
     """
 
     comment_id: str
+    post_id: str
+    thread_size: int = 1  # the comments deleted, the comment and its replies
+    created_times: list[datetime.datetime] = []  # when each of them was made
+
+
+class AttachedImageEvent(Event):
+    """
+    Event representing an image attached to a post.
+    """
+
+    post_id: str
+    path: str
 
 
 class DeniedPostActionEvent(Event):
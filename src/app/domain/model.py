@@ -3,6 +3,8 @@ from __future__ import annotations
 import abc
 import dataclasses
 import datetime
+import os
+import time
 import typing as t
 import uuid
 
@@ -11,17 +13,39 @@ from src.app.domain import events
 MAX_LEVEL_DEPTH = t.Literal[0, 1, 2, 3]
 
 
+class NotFound(LookupError):
+    """
+    No record has the id a command refers to, or it was deleted.
+    """
+
+
+def uuid7() -> str:
+    """
+    A time-ordered UUID (RFC 9562 version 7): 48 bits of unix milliseconds followed by random bits,
+    so new ids land at the right edge of the primary key index instead of on a random page.
+    """
+    value = (time.time_ns() // 1_000_000) << 80 | int.from_bytes(os.urandom(10))
+    value = value & ~(0xF << 76) | 0x7 << 76
+    value = value & ~(0x3 << 62) | 0x2 << 62
+    return str(uuid.UUID(int=value))
+
+
 @dataclasses.dataclass(init=False)
 class BaseModel:
     """
     A abstract table.
     """
 
-    id: str = dataclasses.field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = dataclasses.field(default_factory=uuid7)
     events: list[events.Event] = dataclasses.field(default_factory=list)
     created_time: datetime.datetime = dataclasses.field(default_factory=datetime.datetime.now)
     updated_time: datetime.datetime = dataclasses.field(default_factory=datetime.datetime.now)
 
+    def __init__(self):
+        for field in dataclasses.fields(BaseModel):
+            if field.default_factory is not dataclasses.MISSING:
+                setattr(self, field.name, field.default_factory())
+
     @abc.abstractmethod
     def model_dump(self) -> dict:
         """Dump the model as a dictionary."""
@@ -35,7 +59,7 @@ class Image(BaseModel):
     """
 
     def __init__(self, path: str, post_id: str):
-
+        super().__init__()
         self.path = path
         self.post_id = post_id
         # self.events = []  # type: list[events.Event]
@@ -79,7 +103,7 @@ class Like(BaseModel):
         post_id: str | None,
         comment_id: str | None,
     ):
-
+        super().__init__()
         self.user_id = user_id
         self.post_id = post_id
         self.comment_id = comment_id
@@ -130,13 +154,14 @@ class Comment(BaseModel):
         post_id: str | None,
         comment_id: str | None,
     ):
-
+        super().__init__()
         self.content = content
         self.author_id = author_id
         self.level = level
         self.post_id = post_id
         self.comment_id = comment_id
         self.like_count = 0
+        self.reply_count = 0
         self.version = 1
         self.created_time = datetime.datetime.now()
         # self.replies = []  # type: list[Comment]
@@ -183,14 +208,16 @@ class Comment(BaseModel):
     def delete(self) -> None:
         """ """
 
-    def like_unlike(self, user_id: str) -> None:
+    def like_unlike(self, user_id: str) -> bool:
+        """Toggle the like of `user_id`, returning whether the comment is now liked."""
         like = Like.create(user_id, self.post_id, self.id)
         if like in self.likes:
             self.likes.remove(like)
             self.like_count -= 1
-        else:
-            self.likes.append(like)
-            self.like_count += 1
+            return False
+        self.likes.append(like)
+        self.like_count += 1
+        return True
 
     def reply(self, content: str, author_id: str) -> Comment:
         reply = Comment.create(content, author_id, t.cast(MAX_LEVEL_DEPTH, self.level + 1), self.post_id, self.id)
@@ -210,6 +237,7 @@ class Comment(BaseModel):
             "comment_id": self.comment_id,
             "created_time": self.created_time.isoformat(),
             "like_count": self.like_count,
+            "reply_count": self.reply_count,
         }
 
 
@@ -225,15 +253,17 @@ class Post(BaseModel):
         content: str,
         author_id: str,
     ):
-
+        super().__init__()
         self.title = title
         self.content = content
         self.author_id = author_id
         self.like_count = 0
+        self.comment_count = 0
         self.version = 1
+        self.deleted_time = None  # type: datetime.datetime | None
         # self.likes = []  # type: list[Like]
         # self.comments = []  # type: list[Comment]
-        self.events.append(events.CreatedPostEvent(post_id=self.id))
+        self.events.append(events.CreatedPostEvent(post_id=self.id, author_id=author_id))
 
     likes: list[Like]
     comments: list[Comment]
@@ -265,22 +295,30 @@ class Post(BaseModel):
         return self.created_time < other.created_time
 
     def delete(self) -> None:
-        """ """
+        """Mark the post deleted. Its comments, likes and images are purged later."""
+        self.deleted_time = datetime.datetime.now()
+        self.updated_time = self.deleted_time
 
-    def like_unlike(self, user_id: str) -> None:
+    def like_unlike(self, user_id: str) -> bool:
+        """Toggle the like of `user_id`, returning whether the post is now liked."""
         like = Like.create(user_id, self.id, None)
         if like in self.likes:
             self.likes.remove(like)
             self.like_count -= 1
-        else:
-            self.likes.append(like)
-            self.like_count += 1
+            return False
+        self.likes.append(like)
+        self.like_count += 1
+        return True
 
     def comment(self, content: str, author_id: str) -> Comment:
         comment = Comment.create(content, author_id, 0, self.id, None)
         self.comments.append(comment)
         return comment
 
+    def reply(self, comment: Comment, content: str, author_id: str) -> Comment:
+        """Reply to `comment`, which counts towards the comments of the post too."""
+        return comment.reply(content, author_id)
+
     def add_image(self, path: str) -> Image:
         image = Image.create(path, self.id)
         self.images.append(image)
@@ -296,6 +334,7 @@ class Post(BaseModel):
             "author_id": self.author_id,
             "content": self.content,
             "like_count": self.like_count,
+            "comment_count": self.comment_count,
             "images": [image.model_dump() for image in self.images],
             "version": self.version,
             "created_time": self.created_time.isoformat(),
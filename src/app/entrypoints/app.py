@@ -1,22 +1,173 @@
+"""
+The HTTP API. `create_app` builds it over a configuration without connecting anywhere: the ORM mappers, the
+database connections and the file storage bucket are set up by the app's lifespan, or by the first request.
+"""
+
+import contextlib
+import logging
 import typing as t
 
 import fastapi
-from icecream import ic
+import pydantic
+from fastapi.concurrency import run_in_threadpool
 
 from src.app import bootstrap
 from src.app import views
+from src.app.adapters import broadcast
+from src.app.adapters import cache
+from src.app.adapters import export
+from src.app.adapters import orm
+from src.app.adapters import relay
+from src.app.adapters import singleflight
+from src.app.adapters import trending
+from src.app.config import Settings
+from src.app.config import settings
 from src.app.domain import commands
+from src.app.domain import model
 from src.app.entrypoints import depends
 from src.app.entrypoints import schema
+from src.app.service_layer import messagebus
+from src.app.service_layer import unit_of_work
+
+logger = logging.getLogger(__name__)
+
+router = fastapi.APIRouter()
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: fastapi.FastAPI):
+    """
+    Map the models once per process and connect ahead of the first request, then close the connections on shutdown.
+    An empty trending ranking, as an in-process one always starts, is seeded from the stored counters.
+    With several workers, each one listens to the others' cache invalidations and live updates.
+    """
+    if not orm.mapper_registry.mappers:
+        orm.start_mappers()
+    bus: messagebus.MessageBus = app.state.bus
+    await run_in_threadpool(bus.uow.warm_up)
+    if app.state.relay is not None:
+        app.state.relay.start()
+    if bus.ranking is not None and not bus.ranking.top(1):
+        try:
+            await run_in_threadpool(bus.handle, commands.RebuildTrendingCommand())
+        except Exception:
+            logger.warning("serving without seeding the trending ranking")
+    yield
+    if app.state.relay is not None:
+        await run_in_threadpool(app.state.relay.stop)
+    bus.uow.dispose()
+
+
+def create_app(config: Settings = settings, bus: messagebus.MessageBus | None = None) -> fastapi.FastAPI:
+    """
+    Build the API over the database, file storage and caches of `config`, or over `bus`.
+
+    For more than one worker, the posts cache and the live updates are shared through a `relay.Relay`, and the
+    trending ranking must be kept in Redis.
+    """
+    shared: relay.Relay | None = None
+    if bus is None:
+        posts_cache: cache.ResultCache
+        broadcaster: broadcast.Broadcaster
+        if config.WEB_WORKERS == 1:
+            posts_cache = cache.ResultCache(config.POSTS_CACHE_SIZE, config.POSTS_CACHE_TTL_SECONDS)
+            broadcaster = broadcast.Broadcaster()
+        else:
+            if config.TRENDING_BACKEND != "redis":
+                raise ValueError(f"{config.WEB_WORKERS} workers would each rank posts apart, set TRENDING_BACKEND=redis")
+            shared = relay.Relay(unit_of_work.postgres_uri(config))
+            posts_cache = relay.SharedResultCache(config.POSTS_CACHE_SIZE, config.POSTS_CACHE_TTL_SECONDS, shared)
+            broadcaster = relay.SharedBroadcaster(shared)
+        bus = bootstrap.bootstrap(
+            start_orm=False,
+            uow=unit_of_work.SqlAlchemyUnitOfWork(config=config),
+            ranking=trending.from_settings(config),
+            posts_cache=posts_cache,
+            broadcaster=broadcaster,
+        )
+    app = fastapi.FastAPI(dependencies=[fastapi.Depends(depends.authorise_user)], lifespan=lifespan)
+    app.state.settings = config
+    app.state.bus = bus
+    app.state.relay = shared
+    app.state.flights = singleflight.Group(config.SINGLE_FLIGHT_TIMEOUT_SECONDS)
+    app.add_exception_handler(TimeoutError, timeout_handler)
+    app.add_exception_handler(model.NotFound, not_found_handler)
+    app.include_router(router)
+    return app
+
+
+def timeout_handler(request: fastapi.Request, exc: Exception):
+    """
+    A read coalesced with one that took too long.
+    """
+    return fastapi.responses.JSONResponse(status_code=fastapi.status.HTTP_504_GATEWAY_TIMEOUT, content={"detail": str(exc)})
+
 
-app = fastapi.FastAPI(dependencies=[fastapi.Depends(depends.authorise_user)])
-bus = bootstrap.bootstrap()
+def not_found_handler(request: fastapi.Request, exc: Exception):
+    """
+    A command on a post or comment that doesn't exist.
+    """
+    return fastapi.responses.JSONResponse(status_code=fastapi.status.HTTP_404_NOT_FOUND, content={"detail": f"{exc} not found"})
 
 
-@app.post("/posts", status_code=fastapi.status.HTTP_201_CREATED)
+def not_modified(if_none_match: str | None, etag: str) -> bool:
+    """
+    Weakly compare an If-None-Match header with an ETag.
+    """
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag.removeprefix("W/") in {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+
+
+def respond(
+    result: dict | list[dict],
+    response_model: t.Type[pydantic.BaseModel],
+    config: Settings,
+    response: fastapi.Response | None = None,
+    etag: str | None = None,
+):
+    """
+    Return a view result for FastAPI to validate against the response model, or, with FAST_RESPONSES,
+    as JSON bytes trimmed to the model's fields so FastAPI neither validates nor encodes it again.
+    An `etag` is sent in the ETag header.
+    """
+    headers = {"ETag": etag} if etag is not None else {}
+    if not config.FAST_RESPONSES:
+        if response is not None:
+            response.headers.update(headers)
+        return result
+
+    fields = response_model.model_fields.keys()
+    if isinstance(result, list):
+        trimmed: dict | list[dict] = [{field: r[field] for field in fields if field in r} for r in result]
+    else:
+        trimmed = {field: result[field] for field in fields if field in result}
+    return fastapi.Response(content=views.dumps(trimmed), media_type="application/json", headers=headers)
+
+
+def respond_list(
+    result: list[dict],
+    response_model: t.Type[pydantic.BaseModel],
+    config: Settings,
+    response: fastapi.Response,
+    if_none_match: str | None,
+):
+    """
+    Respond with a list view under a weak ETag, or with a 304 when the client already has it.
+    """
+    etag = views.list_etag(result)
+    if not_modified(if_none_match, etag):
+        return fastapi.Response(status_code=fastapi.status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return respond(result, response_model, config, response, etag)
+
+
+@router.post("/posts", status_code=fastapi.status.HTTP_201_CREATED)
 def create_post(
     request: schema.CreatePostRequest = fastapi.Depends(),
     user_id: str = fastapi.Header(),
+    bus: messagebus.MessageBus = fastapi.Depends(depends.get_bus),
 ):
     """
     Create a post.
@@ -31,10 +182,11 @@ def create_post(
     return fastapi.Response(status_code=201)
 
 
-@app.post("/posts/{id}/images", status_code=fastapi.status.HTTP_201_CREATED)
+@router.post("/posts/{id}/images", status_code=fastapi.status.HTTP_201_CREATED)
 def attach_image(
     request: schema.AttachImageRequest = fastapi.Depends(),
     user_id: str = fastapi.Header(),
+    bus: messagebus.MessageBus = fastapi.Depends(depends.get_bus),
 ):
     """
     Attach images to a post.
@@ -49,22 +201,108 @@ def attach_image(
     return fastapi.Response(status_code=201)
 
 
-@app.get("/posts/{id}")
+@router.get("/posts/trending")
+def get_trending(
+    limit: t.Annotated[int, fastapi.Query(gt=0, le=100)] = 10,
+    bus: messagebus.MessageBus = fastapi.Depends(depends.get_bus),
+    ranking: trending.Trending = fastapi.Depends(depends.get_ranking),
+    config: Settings = fastapi.Depends(depends.get_settings),
+) -> list[schema.TrendingPostResponse]:
+    """
+    Get the hottest posts by likes and comments, decayed over time.
+    """
+    posts = views.get_trending(limit, uow=bus.uow, ranking=ranking)
+    return respond(posts, schema.TrendingPostResponse, config)
+
+
+@router.get("/export", response_class=fastapi.responses.StreamingResponse)
+def export_ndjson(
+    author_id: str | None = None,
+    after: str | None = None,
+    bus: messagebus.MessageBus = fastapi.Depends(depends.get_bus),
+):
+    """
+    Stream every post, image, comment and like, or an author's history, as NDJSON in constant memory.
+    An interrupted export resumes with `after` set to `<type>:<id>` of the last line received.
+    """
+    try:
+        cursor = export.Cursor.parse(after) if after else None
+    except ValueError as e:
+        raise fastapi.HTTPException(status_code=fastapi.status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if not isinstance(bus.uow, unit_of_work.SqlAlchemyUnitOfWork):
+        raise fastapi.HTTPException(status_code=fastapi.status.HTTP_501_NOT_IMPLEMENTED, detail="Export reads from the database")
+    return fastapi.responses.StreamingResponse(views.export_ndjson(bus.uow, author_id, cursor), media_type="application/x-ndjson")
+
+
+@router.get("/posts/changes", response_model_exclude_none=True)
+def get_changes(
+    since: t.Annotated[int, fastapi.Query(ge=0)] = 0,
+    limit: t.Annotated[int, fastapi.Query(gt=0, le=1000)] = 100,
+    bus: messagebus.MessageBus = fastapi.Depends(depends.get_bus),
+    config: Settings = fastapi.Depends(depends.get_settings),
+) -> schema.ChangesResponse:
+    """
+    Get the posts and comments created, edited or deleted after the cursor `since`.
+    Sync by passing the returned cursor back until `has_more` is false.
+    """
+    result = views.get_changes(since, limit, uow=bus.uow)
+    return respond(result, schema.ChangesResponse, config)
+
+
+@router.get("/posts/{id}/events", response_class=fastapi.responses.StreamingResponse)
+async def get_post_events(
+    request: schema.GetPostRequest = fastapi.Depends(),
+    bus: messagebus.MessageBus = fastapi.Depends(depends.get_bus),
+    broadcaster: broadcast.Broadcaster = fastapi.Depends(depends.get_broadcaster),
+):
+    """
+    Stream the like, comment and version deltas of a post as Server-Sent Events.
+
+    The first event carries the post's current ETag, so a client can tell whether the post it fetched
+    is the one the deltas apply to. A `resync` event means deltas were dropped and the post should be refetched.
+    """
+    etag = await run_in_threadpool(views.get_post_etag, post_id=request.id, uow=bus.uow)
+    if etag is None:
+        raise fastapi.HTTPException(status_code=fastapi.status.HTTP_404_NOT_FOUND, detail="Post not found")
+
+    ready = f"event: ready\ndata: {views.dumps({'post_id': request.id, 'etag': etag}).decode()}\n\n".encode()
+    return fastapi.responses.StreamingResponse(
+        broadcaster.stream(request.id, first=ready),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/posts/{id}", response_model=schema.PostResponse)
 def get_post(
+    response: fastapi.Response,
     request: schema.GetPostRequest = fastapi.Depends(),
-) -> schema.PostResponse:
+    if_none_match: str | None = fastapi.Header(None),
+    bus: messagebus.MessageBus = fastapi.Depends(depends.get_bus),
+    config: Settings = fastapi.Depends(depends.get_settings),
+    flights: singleflight.Group = fastapi.Depends(depends.get_flights),
+) -> schema.PostResponse | fastapi.Response:
     """
-    Get a post by its id.
+    Get a post by its id. A matching If-None-Match gets a 304 after looking up only the post's version.
     """
     id = request.id
-    post = views.get_post(post_id=id, uow=bus.uow)
-    return post
+    if if_none_match is not None:
+        etag = views.get_post_etag(post_id=id, uow=bus.uow)
+        if etag is not None and not_modified(if_none_match, etag):
+            return fastapi.Response(status_code=fastapi.status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    post = views.get_post(post_id=id, uow=bus.uow, core=config.CORE_READS, flights=flights)
+    if post is None:
+        raise fastapi.HTTPException(status_code=fastapi.status.HTTP_404_NOT_FOUND, detail="Post not found")
+    etag = views.post_etag(post["version"], post["like_count"], post["comment_count"], [image["id"] for image in post["images"]])
+    return respond(post, schema.PostResponse, config, response, etag)
 
 
-@app.put("/posts/{id}", status_code=fastapi.status.HTTP_204_NO_CONTENT)
+@router.put("/posts/{id}", status_code=fastapi.status.HTTP_204_NO_CONTENT)
 def edit_post(
     request: schema.EditPostRequest = fastapi.Depends(),
     user_id: str = fastapi.Header(),
+    bus: messagebus.MessageBus = fastapi.Depends(depends.get_bus),
 ):
     """
     Edit a post.
@@ -80,10 +318,11 @@ def edit_post(
     return fastapi.Response(status_code=204)
 
 
-@app.delete("/posts/{id}", status_code=fastapi.status.HTTP_204_NO_CONTENT)
+@router.delete("/posts/{id}", status_code=fastapi.status.HTTP_204_NO_CONTENT)
 def delete_post(
     request: schema.DeletePostRequest = fastapi.Depends(),
     user_id: str = fastapi.Header(),
+    bus: messagebus.MessageBus = fastapi.Depends(depends.get_bus),
 ):
     """
     Delete a post.
@@ -97,10 +336,11 @@ def delete_post(
     return fastapi.Response(status_code=204)
 
 
-@app.post("/posts/{id}/like", status_code=fastapi.status.HTTP_204_NO_CONTENT)
+@router.post("/posts/{id}/like", status_code=fastapi.status.HTTP_204_NO_CONTENT)
 def like_post(
     request: schema.LikePostRequest = fastapi.Depends(),
     user_id: str = fastapi.Header(),
+    bus: messagebus.MessageBus = fastapi.Depends(depends.get_bus),
 ):
     """
     Like a post.
@@ -114,10 +354,11 @@ def like_post(
     return fastapi.Response(status_code=204)
 
 
-@app.post("/posts/{id}/comments", status_code=fastapi.status.HTTP_201_CREATED)
+@router.post("/posts/{id}/comments", status_code=fastapi.status.HTTP_201_CREATED)
 def comment_post(
     request: schema.CommentRequest = fastapi.Depends(),
     user_id: str = fastapi.Header(),
+    bus: messagebus.MessageBus = fastapi.Depends(depends.get_bus),
 ):
     """
     Comment a post.
@@ -132,10 +373,11 @@ def comment_post(
     return fastapi.Response(status_code=201)
 
 
-@app.post("/comments/{id}/reply", status_code=fastapi.status.HTTP_201_CREATED)
+@router.post("/comments/{id}/reply", status_code=fastapi.status.HTTP_201_CREATED)
 def reply_comment(
     request: schema.ReplyRequest = fastapi.Depends(),
     user_id: str = fastapi.Header(),
+    bus: messagebus.MessageBus = fastapi.Depends(depends.get_bus),
 ):
     """
     Reply to a comment.
@@ -150,10 +392,11 @@ def reply_comment(
     return fastapi.Response(status_code=201)
 
 
-@app.delete("/comments/{id}", status_code=fastapi.status.HTTP_204_NO_CONTENT)
+@router.delete("/comments/{id}", status_code=fastapi.status.HTTP_204_NO_CONTENT)
 def delete_comment(
     request: schema.DeleteCommentRequest = fastapi.Depends(),
     user_id: str = fastapi.Header(),
+    bus: messagebus.MessageBus = fastapi.Depends(depends.get_bus),
 ):
     """
     Delete a comment.
@@ -167,10 +410,11 @@ def delete_comment(
     return fastapi.Response(status_code=204)
 
 
-@app.post("/comments/{id}/like", status_code=fastapi.status.HTTP_204_NO_CONTENT)
+@router.post("/comments/{id}/like", status_code=fastapi.status.HTTP_204_NO_CONTENT)
 def like_comment(
     request: schema.LikeCommentRequest = fastapi.Depends(),
     user_id: str = fastapi.Header(),
+    bus: messagebus.MessageBus = fastapi.Depends(depends.get_bus),
 ):
     """
     Like a comment.
@@ -184,30 +428,53 @@ def like_comment(
     return fastapi.Response(status_code=204)
 
 
-@app.get("/posts/{id}/comments")
+@router.get("/posts/{id}/comments", response_model_exclude_unset=True)
 def get_comments(
+    response: fastapi.Response,
     request: schema.GetPostCommentRequest = fastapi.Depends(),
-) -> list[schema.CommentResponse]:
+    if_none_match: str | None = fastapi.Header(None),
+    bus: messagebus.MessageBus = fastapi.Depends(depends.get_bus),
+    config: Settings = fastapi.Depends(depends.get_settings),
+    flights: singleflight.Group = fastapi.Depends(depends.get_flights),
+) -> list[schema.SparseCommentResponse]:
     """
     Get comments of a post.
     """
-    comments = views.get_comments(post_id=request.id, uow=bus.uow)
-    return comments
+    comments = views.get_comments(
+        post_id=request.id,
+        uow=bus.uow,
+        core=config.CORE_READS,
+        fields=request.fields,
+        content_preview_len=request.content_preview_len,
+        flights=flights,
+    )
+    return respond_list(comments, schema.SparseCommentResponse, config, response, if_none_match)
 
 
-@app.get("/comments/{id}/reply")
+@router.get("/comments/{id}/reply", response_model_exclude_unset=True)
 def get_replies(
+    response: fastapi.Response,
     request: schema.GetCommentReplyRequest = fastapi.Depends(),
-) -> list[schema.CommentResponse]:
+    if_none_match: str | None = fastapi.Header(None),
+    bus: messagebus.MessageBus = fastapi.Depends(depends.get_bus),
+    config: Settings = fastapi.Depends(depends.get_settings),
+) -> list[schema.SparseCommentResponse]:
     """
     Get replies of a comment.
     """
-    replies = views.get_reply_comments(comment_id=request.id, uow=bus.uow)
-    return replies
+    replies = views.get_reply_comments(
+        comment_id=request.id,
+        uow=bus.uow,
+        core=config.CORE_READS,
+        fields=request.fields,
+        content_preview_len=request.content_preview_len,
+    )
+    return respond_list(replies, schema.SparseCommentResponse, config, response, if_none_match)
 
 
-@app.get("/posts")
+@router.get("/posts", response_model_exclude_unset=True)
 def get_posts(
+    response: fastapi.Response,
     # request: schema.GetPostsRequest = fastapi.Depends(),
     title: str | None = None,
     content: str | None = None,
@@ -215,7 +482,12 @@ def get_posts(
     order: t.Annotated[list[str] | None, fastapi.Query()] = ["-created_time"],
     limit: int = 10,
     offset: int = 0,
-) -> list[schema.PostResponse]:
+    fields: t.Annotated[list[str] | None, fastapi.Query()] = None,
+    content_preview_len: t.Annotated[int | None, fastapi.Query(gt=0)] = None,
+    if_none_match: str | None = fastapi.Header(None),
+    bus: messagebus.MessageBus = fastapi.Depends(depends.get_bus),
+    config: Settings = fastapi.Depends(depends.get_settings),
+) -> list[schema.SparsePostResponse]:
     """
     Get all posts.
     """
@@ -226,6 +498,11 @@ def get_posts(
         order=order,
         limit=limit,
         offset=offset,
+        fields=fields,
+        content_preview_len=content_preview_len,
     )
-    posts = views.get_posts(request, uow=bus.uow)
-    return posts
+    posts = views.get_posts(request, uow=bus.uow, core=config.CORE_READS, feed=config.FEED_READS, cache=bus.posts_cache)
+    return respond_list(posts, schema.SparsePostResponse, config, response, if_none_match)
+
+
+app = create_app()
@@ -1,6 +1,11 @@
 import fastapi
 
+from src.app.adapters import broadcast
+from src.app.adapters import singleflight
+from src.app.adapters import trending
+from src.app.config import Settings
 from src.app.entrypoints import schema
+from src.app.service_layer import messagebus
 
 
 async def authorise_user(user_id: str = fastapi.Header(...)) -> str:
@@ -12,3 +17,24 @@ async def authorise_user(user_id: str = fastapi.Header(...)) -> str:
 
 def get_query_params(params: schema.GetPostsRequest = fastapi.Depends()):
     return params
+
+
+# async, so FastAPI calls them inline instead of in its threadpool
+async def get_bus(request: fastapi.Request) -> messagebus.MessageBus:
+    return request.app.state.bus
+
+
+async def get_settings(request: fastapi.Request) -> Settings:
+    return request.app.state.settings
+
+
+async def get_flights(request: fastapi.Request) -> singleflight.Group:
+    return request.app.state.flights
+
+
+async def get_ranking(request: fastapi.Request) -> trending.Trending:
+    return request.app.state.bus.ranking
+
+
+async def get_broadcaster(request: fastapi.Request) -> broadcast.Broadcaster:
+    return request.app.state.bus.broadcaster
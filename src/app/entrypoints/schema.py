@@ -3,6 +3,9 @@ from typing import Annotated
 import fastapi
 import pydantic
 
+# a post or comment id, so that a malformed one is a 422 rather than a failed query
+PathId = Annotated[str, fastapi.Path(..., pattern=r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")]
+
 
 @pydantic.dataclasses.dataclass
 class CreatePostRequest:
@@ -12,62 +15,66 @@ class CreatePostRequest:
 
 @pydantic.dataclasses.dataclass
 class AttachImageRequest:
-    id: Annotated[str, fastapi.Path(...)]
+    id: PathId
     images: Annotated[list[fastapi.UploadFile], fastapi.File(default_factory=list)]
 
 
 @pydantic.dataclasses.dataclass
 class GetPostRequest:
-    id: Annotated[str, fastapi.Path(...)]
+    id: PathId
 
 
 @pydantic.dataclasses.dataclass
 class EditPostRequest:
-    id: Annotated[str, fastapi.Path(...)]
+    id: PathId
     title: Annotated[str, fastapi.Body(...)]
     content: Annotated[str, fastapi.Body(...)]
 
 
 @pydantic.dataclasses.dataclass
 class DeletePostRequest:
-    id: Annotated[str, fastapi.Path(...)]
+    id: PathId
 
 
 @pydantic.dataclasses.dataclass
 class LikePostRequest:
-    id: Annotated[str, fastapi.Path(...)]
+    id: PathId
 
 
 @pydantic.dataclasses.dataclass
 class CommentRequest:
-    id: Annotated[str, fastapi.Path(...)]
+    id: PathId
     content: Annotated[str, fastapi.Body(..., embed=True)]
 
 
 @pydantic.dataclasses.dataclass
 class ReplyRequest:
-    id: Annotated[str, fastapi.Path(...)]
+    id: PathId
     content: Annotated[str, fastapi.Body(..., embed=True)]
 
 
 @pydantic.dataclasses.dataclass
 class DeleteCommentRequest:
-    id: Annotated[str, fastapi.Path(...)]
+    id: PathId
 
 
 @pydantic.dataclasses.dataclass
 class LikeCommentRequest:
-    id: Annotated[str, fastapi.Path(...)]
+    id: PathId
 
 
 @pydantic.dataclasses.dataclass
 class GetPostCommentRequest:
-    id: Annotated[str, fastapi.Path(...)]
+    id: PathId
+    fields: Annotated[list[str] | None, fastapi.Query()] = None
+    content_preview_len: Annotated[int | None, fastapi.Query(gt=0)] = None
 
 
 @pydantic.dataclasses.dataclass
 class GetCommentReplyRequest:
-    id: Annotated[str, fastapi.Path(...)]
+    id: PathId
+    fields: Annotated[list[str] | None, fastapi.Query()] = None
+    content_preview_len: Annotated[int | None, fastapi.Query(gt=0)] = None
 
 
 @pydantic.dataclasses.dataclass
@@ -80,17 +87,22 @@ class GetPostsRequest:
     limit: Annotated[int, fastapi.Query(10)]
     offset: Annotated[int, fastapi.Query(0)]
 
+    fields: Annotated[list[str] | None, fastapi.Query(None)] = None
+    content_preview_len: Annotated[int | None, fastapi.Query(None)] = None
+
 
 class CommentResponse(pydantic.BaseModel):
     content: str
     author_id: str
     created_time: str
+    reply_count: int
 
 
 class ImageResponse(pydantic.BaseModel):
     id: str
     path: str
-    link: str
+    # only GET /posts/{id} presigns links, listings leave them out
+    link: str | None = None
 
 
 class PostResponse(pydantic.BaseModel):
@@ -100,5 +112,53 @@ class PostResponse(pydantic.BaseModel):
     created_time: str
     author_id: str
     like_count: int
+    comment_count: int
     version: int
     images: list[ImageResponse]
+
+
+# Fields left out of a sparse fieldset are unset, and the list endpoints taking `fields=` exclude unset fields.
+class SparseCommentResponse(pydantic.BaseModel):
+    content: str | None = None
+    author_id: str | None = None
+    created_time: str | None = None
+    reply_count: int | None = None
+
+
+class SparsePostResponse(pydantic.BaseModel):
+    id: str
+    title: str | None = None
+    content: str | None = None
+    created_time: str | None = None
+    author_id: str | None = None
+    like_count: int | None = None
+    comment_count: int | None = None
+    version: int | None = None
+    images: list[ImageResponse] | None = None
+
+
+class TrendingPostResponse(PostResponse):
+    score: float
+
+
+class ChangedCommentResponse(CommentResponse):
+    id: str
+    post_id: str
+    comment_id: str | None
+    like_count: int
+
+
+class ChangeResponse(pydantic.BaseModel):
+    cursor: int
+    entity: str
+    id: str
+    post_id: str
+    op: str
+    post: PostResponse | None = None
+    comment: ChangedCommentResponse | None = None
+
+
+class ChangesResponse(pydantic.BaseModel):
+    changes: list[ChangeResponse]
+    cursor: int
+    has_more: bool
@@ -0,0 +1,118 @@
+"""
+Serve the API from several worker processes forked from one that has loaded it.
+
+The parent builds the app, maps the models and warms up the database connection, so the workers start with
+all of it in memory they share copy-on-write. It then closes its connections and freezes the garbage
+collector's view of what it loaded, so that collections in the workers neither walk nor write to those pages.
+A worker drops whatever pooled connection or client it inherited and opens its own. The parent restarts
+workers that exit, and stops them on SIGTERM or SIGINT.
+
+Each worker keeps its own GET /posts result cache and live update broadcaster. With several workers, both relay
+what they apply to the other workers over Postgres LISTEN/NOTIFY, see the relay module, so a write handled by
+one worker invalidates every cache and reaches every client streaming the post's events. The trending ranking
+has to be shared as a whole, so several workers need TRENDING_BACKEND=redis, and the server refuses to start
+them without it.
+
+    python -m src.app.entrypoints.server                # WEB_WORKERS workers on WEB_HOST:WEB_PORT
+    python -m src.app.entrypoints.server --workers 4 --port 8080
+"""
+
+import argparse
+import contextlib
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+
+import fastapi
+import uvicorn
+
+from src.app.adapters import orm
+from src.app.config import settings
+from src.app.entrypoints import app as entrypoint
+
+logger = logging.getLogger(__name__)
+
+
+def preload(api: fastapi.FastAPI) -> None:
+    """
+    Load what every worker needs once, in the parent, and leave no connection open for them to share.
+    """
+    if not orm.mapper_registry.mappers:
+        orm.start_mappers()
+    uow = api.state.bus.uow
+    uow.warm_up()
+    uow.dispose()
+    gc.collect()
+    gc.freeze()
+
+
+def run_worker(api: fastapi.FastAPI, sock: socket.socket) -> None:
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    api.state.bus.uow.dispose(close=False)
+    server = uvicorn.Server(uvicorn.Config(api, lifespan="on", log_level=settings.LOGGING_LEVEL))
+    server.run(sockets=[sock])
+
+
+def spawn(api: fastapi.FastAPI, sock: socket.socket) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(api, sock)
+        except BaseException:
+            logger.exception("worker %d failed", os.getpid())
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def serve(workers: int, host: str, port: int) -> None:
+    api = entrypoint.create_app(settings.model_copy(update={"WEB_WORKERS": workers}))
+    sock = uvicorn.Config(api, host=host, port=port).bind_socket()
+    preload(api)
+    pids = {spawn(api, sock) for _ in range(workers)}
+    logger.info("serving on %s:%d with %d workers", host, port, workers)
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in pids:
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    while pids:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        pids.discard(pid)
+        if not stopping:
+            logger.warning("worker %d exited with %d, restarting it", pid, os.waitstatus_to_exitcode(status))
+            time.sleep(1)
+            if not stopping:
+                pids.add(spawn(api, sock))
+    sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=settings.WEB_WORKERS or os.cpu_count() or 1)
+    parser.add_argument("--host", default=settings.WEB_HOST)
+    parser.add_argument("--port", type=int, default=settings.WEB_PORT)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=settings.LOGGING_LEVEL)
+    serve(args.workers, args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
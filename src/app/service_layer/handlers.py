@@ -4,26 +4,45 @@ This module contains the handlers for post-related commands.
 
 from __future__ import annotations
 
+import datetime
+import logging
+import typing as t
 import uuid
 
+from src.app.adapters import broadcast
+from src.app.adapters import cache
+from src.app.adapters import changes
+from src.app.adapters import counters
+from src.app.adapters import feed
+from src.app.adapters import orphans
+from src.app.adapters import purge
+from src.app.adapters import trending
 from src.app.domain import commands
 from src.app.domain import events
 from src.app.domain import model
 from src.app.service_layer import unit_of_work
 
+logger = logging.getLogger(__name__)
+
+# Comments are written at READ COMMITTED: under REPEATABLE READ, two transactions incrementing the counters of
+# one post fail one another with a serialization error, however atomic the UPDATE. Batched maintenance commands
+# use it too, so that each batch sees the rows committed since the previous one.
+COUNTER_ISOLATION: t.Final = "READ COMMITTED"
+
 
 def create_post(cmd: commands.CreatePostCommand, uow: unit_of_work.AbstractUnitOfWork):
     """
     Handle the create post command.
     """
 
-    with uow.unit_of_work() as uow_ctx:
+    with uow.unit_of_work("create_post") as uow_ctx:
         new_post = model.Post(
             title=cmd.title,
             content=cmd.content,
             author_id=cmd.author_id,
         )
         uow_ctx.posts.add(new_post)
+        uow_ctx.record_change(changes.POST, new_post.id, new_post.id, changes.CREATED)
         uow_ctx.commit()
         # new_post.events.append(events.PostCreatedEvent(post_id=new_post.id))
 
@@ -33,9 +52,9 @@ def attach_image(cmd: commands.AttachImageCommand, uow: unit_of_work.AbstractUni
     Handle the attach image command.
     """
 
-    with uow.unit_of_work() as uow_ctx:
+    with uow.unit_of_work("attach_image") as uow_ctx:
         images = uow_ctx.images
-        post = uow_ctx.posts.get(cmd.post_id)
+        post = uow_ctx.posts.get_existing(cmd.post_id)
         if post.can_edit_or_delete(user_id=cmd.user_id):
             for file in cmd.images:
                 path = f"posts/{post.id}/{file.filename}"
@@ -43,7 +62,14 @@ def attach_image(cmd: commands.AttachImageCommand, uow: unit_of_work.AbstractUni
                 images.add(image)
                 err_code = uow_ctx.minio.add(path, file)
                 if err_code == 0:
-                    uow_ctx.commit()
+                    try:
+                        uow_ctx.record_change(changes.POST, post.id, post.id, changes.EDITED)
+                        uow_ctx.commit()
+                    except Exception:
+                        # don't leave the uploaded object without its row
+                        uow_ctx.minio.delete_many([path])
+                        raise
+                    post.events.append(events.AttachedImageEvent(post_id=post.id, path=path))
                 else:
                     # Notification.send(f"Failed to upload image {file.filename}.")
                     uow_ctx.rollback()
@@ -56,12 +82,13 @@ def edit_post(cmd: commands.EditPostCommand, uow: unit_of_work.AbstractUnitOfWor
     Handle the edit post command.
     """
 
-    with uow.unit_of_work() as uow_ctx:
-        post = uow_ctx.posts.get(cmd.post_id)
+    with uow.unit_of_work("edit_post") as uow_ctx:
+        post = uow_ctx.posts.get_existing(cmd.post_id)
         if post.can_edit_or_delete(user_id=cmd.user_id):
             post.edit(new_title=cmd.title, new_content=cmd.content)
+            uow_ctx.record_change(changes.POST, post.id, post.id, changes.EDITED)
             uow_ctx.commit()
-            post.events.append(events.EditedPostEvent(post_id=cmd.post_id, version=post.version))
+            post.events.append(events.EditedPostEvent(post_id=cmd.post_id, author_id=post.author_id, version=post.version))
         else:
             post.events.append(events.DeniedPostActionEvent(post_id=cmd.post_id, user_id=cmd.user_id))
 
@@ -71,14 +98,16 @@ def like_unlike_post(cmd: commands.LikePostCommand, uow: unit_of_work.AbstractUn
     Handle the like post command.
     """
 
-    with uow.unit_of_work() as uow_ctx:
-        post = uow_ctx.posts.get(cmd.post_id)
-        post.like_unlike(user_id=cmd.user_id)
+    with uow.unit_of_work("like_unlike_post") as uow_ctx:
+        post = uow_ctx.posts.get_existing(cmd.post_id)
+        liked_time = next((like.created_time for like in post.likes if like.user_id == cmd.user_id), None)
+        liked = post.like_unlike(user_id=cmd.user_id)
+        uow_ctx.record_change(changes.POST, post.id, post.id, changes.EDITED)
         uow_ctx.commit()
-        if cmd.user_id in post.likes:
+        if liked:
             post.events.append(events.LikedPostEvent(post_id=cmd.post_id, user_id=cmd.user_id))
         else:
-            post.events.append(events.UnlikedPostEvent(post_id=cmd.post_id, user_id=cmd.user_id))
+            post.events.append(events.UnlikedPostEvent(post_id=cmd.post_id, user_id=cmd.user_id, liked_time=liked_time))
 
 
 def like_unlike_comment(cmd: commands.LikeCommentCommand, uow: unit_of_work.AbstractUnitOfWork):
@@ -86,11 +115,13 @@ def like_unlike_comment(cmd: commands.LikeCommentCommand, uow: unit_of_work.Abst
     Handle the like comment command.
     """
 
-    with uow.unit_of_work() as uow_ctx:
-        comment = uow_ctx.comments.get(cmd.comment_id)
-        comment.like_unlike(user_id=cmd.user_id)
+    with uow.unit_of_work("like_unlike_comment") as uow_ctx:
+        comment = uow_ctx.comments.get_existing(cmd.comment_id)
+        liked = comment.like_unlike(user_id=cmd.user_id)
+        if comment.post_id is not None:
+            uow_ctx.record_change(changes.COMMENT, comment.id, comment.post_id, changes.EDITED)
         uow_ctx.commit()
-        if cmd.user_id in comment.likes:
+        if liked:
             comment.events.append(events.LikedCommentEvent(comment_id=cmd.comment_id, user_id=cmd.user_id))
         else:
             comment.events.append(events.UnlikedCommentEvent(comment_id=cmd.comment_id, user_id=cmd.user_id))
@@ -101,10 +132,12 @@ def comment_post(cmd: commands.CommentPostCommand, uow: unit_of_work.AbstractUni
     Handle the comment post command.
     """
 
-    with uow.unit_of_work() as uow_ctx:
-        post = uow_ctx.posts.get(cmd.post_id)
+    with uow.unit_of_work("comment_post", isolation_level=COUNTER_ISOLATION) as uow_ctx:
+        post = uow_ctx.posts.get_existing(cmd.post_id)
         comment = post.comment(content=cmd.content, author_id=cmd.user_id)
         uow_ctx.comments.add(comment)
+        uow_ctx.posts.increment(post.id, "comment_count")
+        uow_ctx.record_change(changes.COMMENT, comment.id, post.id, changes.CREATED)
         uow_ctx.commit()
         post.events.append(events.CreatedCommentEvent(comment_id=comment.id, post_id=cmd.post_id))
 
@@ -114,12 +147,13 @@ def delete_post(cmd: commands.DeletePostCommand, uow: unit_of_work.AbstractUnitO
     Handle the delete post command.
     """
 
-    with uow.unit_of_work() as uow_ctx:
-        post = uow_ctx.posts.get(cmd.post_id)
+    with uow.unit_of_work("delete_post") as uow_ctx:
+        post = uow_ctx.posts.get_existing(cmd.post_id)
         if post.can_edit_or_delete(user_id=cmd.user_id):
             uow_ctx.posts.delete(post)
+            uow_ctx.record_change(changes.POST, post.id, post.id, changes.DELETED)
             uow_ctx.commit()
-            post.events.append(events.DeletedPostEvent(post_id=cmd.post_id))
+            post.events.append(events.DeletedPostEvent(post_id=cmd.post_id, author_id=post.author_id))
         else:
             post.events.append(events.DeniedPostActionEvent(post_id=cmd.post_id, user_id=cmd.user_id))
 
@@ -129,12 +163,27 @@ def delete_comment(cmd: commands.DeleteCommentCommand, uow: unit_of_work.Abstrac
     Handle the delete comment command.
     """
 
-    with uow.unit_of_work() as uow_ctx:
-        comment = uow_ctx.comments.get(cmd.comment_id)
+    with uow.unit_of_work("delete_comment", isolation_level=COUNTER_ISOLATION) as uow_ctx:
+        comment = uow_ctx.comments.get_existing(cmd.comment_id)
         if comment.can_edit_or_delete(user_id=cmd.user_id):
-            uow_ctx.comments.delete(comment)
+            thread = replies = [comment]
+            while replies := uow_ctx.comments.query(comment_id=[r.id for r in replies]):
+                thread = thread + replies
+            if comment.comment_id is not None:
+                uow_ctx.comments.increment(comment.comment_id, "reply_count", -1)
+            uow_ctx.posts.increment(comment.post_id, "comment_count", -len(thread))
+            for c in reversed(thread):
+                uow_ctx.comments.delete(c)
+            uow_ctx.record_change(changes.COMMENT, comment.id, comment.post_id, changes.DELETED)
             uow_ctx.commit()
-            comment.events.append(events.DeletedCommentEvent(comment_id=cmd.comment_id))
+            comment.events.append(
+                events.DeletedCommentEvent(
+                    comment_id=cmd.comment_id,
+                    post_id=comment.post_id,
+                    thread_size=len(thread),
+                    created_times=[c.created_time for c in thread],
+                )
+            )
         else:
             comment.events.append(events.DeniedCommentActionEvent(comment_id=cmd.comment_id, user_id=cmd.user_id))
 
@@ -144,12 +193,240 @@ def reply_comment(cmd: commands.ReplyCommentCommand, uow: unit_of_work.AbstractU
     Handle the reply comment command.
     """
 
-    with uow.unit_of_work() as uow_ctx:
-        comment = uow_ctx.comments.get(cmd.comment_id)
-        reply = comment.reply(content=cmd.content, author_id=cmd.user_id)
+    with uow.unit_of_work("reply_comment", isolation_level=COUNTER_ISOLATION) as uow_ctx:
+        comment = uow_ctx.comments.get_existing(cmd.comment_id)
+        post = uow_ctx.posts.get_existing(comment.post_id)
+        reply = post.reply(comment, content=cmd.content, author_id=cmd.user_id)
         uow_ctx.comments.add(reply)
+        uow_ctx.comments.increment(comment.id, "reply_count")
+        uow_ctx.posts.increment(post.id, "comment_count")
+        uow_ctx.record_change(changes.COMMENT, reply.id, post.id, changes.CREATED)
+        comment.events.append(events.RepliedCommentEvent(comment_id=reply.id, post_id=post.id))
+        uow_ctx.commit()
+
+
+def rebuild_post_feed(cmd: commands.RebuildPostFeedCommand, uow: unit_of_work.AbstractUnitOfWork):
+    """
+    Re-project every post into post_feed, one batch per transaction, so that the rebuild neither holds the locks
+    of the whole feed nor pins a snapshot for its duration. In memory there is no post_feed to rebuild.
+    """
+
+    if isinstance(uow, unit_of_work.InMemoryUnitOfWork):
+        return
+    projected, after = 0, None
+    while True:
+        with uow.unit_of_work("rebuild_post_feed", isolation_level=COUNTER_ISOLATION) as uow_ctx:
+            last, n = feed.rebuild_batch(uow_ctx.session, after, cmd.batch_size)
+            uow_ctx.commit()
+        projected += n
+        if last is None:
+            break
+        after = last
+        logger.info("projected %d posts into post_feed", projected)
+
+
+def reconcile_counters(cmd: commands.ReconcileCountersCommand, uow: unit_of_work.AbstractUnitOfWork):
+    """
+    Recount the comment and reply counters and repair the drifted ones, one batch per transaction, so that
+    a comment written meanwhile waits on the locks of one batch at most.
+    """
+
+    if isinstance(uow, unit_of_work.InMemoryUnitOfWork):
+        with uow.unit_of_work("reconcile_counters") as uow_ctx:
+            repaired = _reconcile_in_memory(uow_ctx)
+            uow_ctx.commit()
+        if any(repaired.values()):
+            logger.warning("repaired drifted counters: %s", repaired)
+        return
+
+    repaired = {"comment_count": 0, "reply_count": 0}
+    for counter, reconcile in (("comment_count", counters.reconcile_posts), ("reply_count", counters.reconcile_comments)):
+        after: str | None = None
+        while True:
+            with uow.unit_of_work("reconcile_counters", isolation_level=COUNTER_ISOLATION) as uow_ctx:
+                last, n = reconcile(uow_ctx.session, after, cmd.batch_size)
+                uow_ctx.commit()
+            repaired[counter] += n
+            if last is None:
+                break
+            after = last
+    if any(repaired.values()):
+        logger.warning("repaired drifted counters: %s", repaired)
+
+
+def _reconcile_in_memory(uow_ctx: unit_of_work.InMemoryUnitOfWork) -> dict[str, int]:
+    """
+    Recount the counters of the in-memory repositories as `reconcile_posts` and `reconcile_comments` do.
+    """
+    repaired = {"comment_count": 0, "reply_count": 0}
+    for counter, repo, field in (("comment_count", uow_ctx.posts, "post_id"), ("reply_count", uow_ctx.comments, "comment_id")):
+        for r in repo.query():
+            count = len(uow_ctx.comments.query(**{field: r.id}))
+            if getattr(r, counter) != count:
+                setattr(r, counter, count)
+                repaired[counter] += 1
+    return repaired
+
+
+def purge_deleted_posts(cmd: commands.PurgeDeletedPostsCommand, uow: unit_of_work.AbstractUnitOfWork):
+    """
+    Purge soft-deleted posts one batch per transaction, deleting the image objects of each batch once it commits.
+    In memory each post is purged at once.
+    """
+
+    if isinstance(uow, unit_of_work.InMemoryUnitOfWork):
+        with uow.unit_of_work("purge_deleted_posts") as uow_ctx:
+            purged = uow_ctx.posts.deleted(cmd.max_posts)
+            for post in purged:
+                uow_ctx.comments.purge(post.id)
+                paths = [getattr(image, "path") for image in uow_ctx.images.purge(post.id)]
+                uow_ctx.posts.purge(post.id)
+                uow_ctx.commit()
+                uow_ctx.minio.delete_many(paths)
+        if purged:
+            logger.info("purged %d deleted posts", len(purged))
+        return
+
+    with uow.unit_of_work("purge_deleted_posts") as uow_ctx:
+        post_ids = purge.deleted_posts(uow_ctx.session, cmd.max_posts)
+
+    for post_id in post_ids:
+        step = purge.Step()
+        while not step.done:
+            with uow.unit_of_work("purge_deleted_posts") as uow_ctx:
+                step = purge.step(uow_ctx.session, post_id, cmd.batch_size)
+                uow_ctx.commit()
+                failed = uow_ctx.minio.delete_many(step.paths)
+            if failed:
+                logger.warning("could not delete %d image objects of post %s", len(failed), post_id)
+    if post_ids:
+        logger.info("purged %d deleted posts", len(post_ids))
+
+
+def sweep_orphan_images(cmd: commands.SweepOrphanImagesCommand, uow: unit_of_work.AbstractUnitOfWork):
+    """
+    Delete the stored image objects no image row points to, looking up one page of the listing per unit of work.
+    """
+
+    def lookup(paths: list[str]) -> set[str]:
+        with uow.unit_of_work("sweep_orphan_images") as uow_ctx:
+            if isinstance(uow_ctx, unit_of_work.InMemoryUnitOfWork):
+                return {getattr(image, "path") for image in uow_ctx.images.query(path=paths)}
+            return orphans.referenced(uow_ctx.session, paths)
+
+    with uow.unit_of_work("sweep_orphan_images") as uow_ctx:
+        storage = uow_ctx.minio
+    stats = orphans.sweep(
+        storage,
+        lookup,
+        page_size=cmd.page_size,
+        rate=cmd.deletes_per_second,
+        min_age=datetime.timedelta(seconds=cmd.min_age_seconds),
+        dry_run=cmd.dry_run,
+        start_after=cmd.start_after,
+    )
+    logger.info("swept orphan images: %s", stats.model_dump())
+
+
+def rebuild_trending(cmd: commands.RebuildTrendingCommand, uow: unit_of_work.AbstractUnitOfWork, ranking: trending.Trending):
+    """
+    Handle the rebuild trending command.
+    """
+
+    with uow.unit_of_work("rebuild_trending") as uow_ctx:
+        if isinstance(uow_ctx, unit_of_work.InMemoryUnitOfWork):
+            ranking.seed(uow_ctx.posts.query())
+        else:
+            ranking.rebuild(uow_ctx.session, batch_size=cmd.batch_size)
+
+
+def update_trending(
+    event: (
+        events.CreatedPostEvent
+        | events.DeletedPostEvent
+        | events.LikedPostEvent
+        | events.UnlikedPostEvent
+        | events.CreatedCommentEvent
+        | events.RepliedCommentEvent
+        | events.DeletedCommentEvent
+    ),
+    ranking: trending.Trending,
+):
+    """
+    Add the decayed weight of an event to the trending score of its post. An unlike or a deleted comment takes
+    back what the like or comment still adds, its weight as of when it was made.
+    """
+
+    if isinstance(event, events.DeletedPostEvent):
+        ranking.remove(event.post_id)
+    elif isinstance(event, events.UnlikedPostEvent):
+        if event.liked_time is not None:
+            ranking.record(event.post_id, -trending.LIKE_WEIGHT, at=event.liked_time.timestamp())
+    elif isinstance(event, events.DeletedCommentEvent):
+        for created_time in event.created_times:
+            ranking.record(event.post_id, -trending.COMMENT_WEIGHT, at=created_time.timestamp())
+    else:
+        ranking.record(event.post_id, trending.WEIGHTS[type(event)])
+
+
+def invalidate_posts_cache(
+    event: events.CreatedPostEvent | events.EditedPostEvent | events.DeletedPostEvent, posts_cache: cache.ResultCache
+):
+    """
+    Bump the generations the cached listings of the post's author and of all posts depend on.
+    """
+
+    posts_cache.invalidate(event.author_id)
+
+
+def broadcast_post_update(
+    event: (
+        events.EditedPostEvent
+        | events.LikedPostEvent
+        | events.UnlikedPostEvent
+        | events.CreatedCommentEvent
+        | events.RepliedCommentEvent
+        | events.DeletedCommentEvent
+    ),
+    broadcaster: broadcast.Broadcaster,
+):
+    """
+    Publish the delta an event made to its post to the post's live subscribers.
+    """
+
+    if isinstance(event, events.EditedPostEvent):
+        broadcaster.publish(event.post_id, version=event.version)
+    elif isinstance(event, events.LikedPostEvent):
+        broadcaster.publish(event.post_id, like_delta=1)
+    elif isinstance(event, events.UnlikedPostEvent):
+        broadcaster.publish(event.post_id, like_delta=-1)
+    elif isinstance(event, (events.CreatedCommentEvent, events.RepliedCommentEvent)):
+        broadcaster.publish(event.post_id, comment_delta=1)
+    elif isinstance(event, events.DeletedCommentEvent):
+        broadcaster.publish(event.post_id, comment_delta=-event.thread_size)
+
+
+def update_post_feed(
+    event: (
+        events.CreatedPostEvent
+        | events.EditedPostEvent
+        | events.DeletedPostEvent
+        | events.LikedPostEvent
+        | events.UnlikedPostEvent
+        | events.CreatedCommentEvent
+        | events.RepliedCommentEvent
+        | events.DeletedCommentEvent
+        | events.AttachedImageEvent
+    ),
+    uow: unit_of_work.AbstractUnitOfWork,
+):
+    """
+    Re-project the post_feed row of the post an event touched.
+    """
+
+    with uow.unit_of_work("update_post_feed", isolation_level=COUNTER_ISOLATION) as uow_ctx:
+        feed.project(uow_ctx.session, [event.post_id])
         uow_ctx.commit()
-        comment.events.append(events.RepliedCommentEvent(comment_id=reply.id, post_id=comment.post_id))
 
 
 def do_nothing(events: events.Event, uow: unit_of_work.AbstractUnitOfWork):
@@ -179,17 +456,21 @@ def handle_permission_denied(events: events.Event, uow: unit_of_work.AbstractUni
     # Notification.send(f"Permission denied for {events.__class__.__name__} event.")
 
 
+# handlers maintaining the read models kept in the database
+READ_MODEL_HANDLERS = {update_post_feed}
+
 EVENT_HANDLERS = {
-    events.CreatedPostEvent: [handle_post_created],
-    events.EditedPostEvent: [do_nothing],
-    events.DeletedPostEvent: [do_nothing],
-    events.LikedPostEvent: [do_nothing],
-    events.UnlikedPostEvent: [do_nothing],
-    events.CreatedCommentEvent: [do_nothing],
+    events.CreatedPostEvent: [handle_post_created, update_post_feed, update_trending, invalidate_posts_cache],
+    events.EditedPostEvent: [update_post_feed, invalidate_posts_cache, broadcast_post_update],
+    events.DeletedPostEvent: [update_post_feed, update_trending, invalidate_posts_cache],
+    events.LikedPostEvent: [update_post_feed, update_trending, broadcast_post_update],
+    events.UnlikedPostEvent: [update_post_feed, update_trending, broadcast_post_update],
+    events.CreatedCommentEvent: [update_post_feed, update_trending, broadcast_post_update],
     events.LikedCommentEvent: [do_nothing],
     events.UnlikedCommentEvent: [do_nothing],
-    events.RepliedCommentEvent: [do_nothing],
-    events.DeletedCommentEvent: [do_nothing],
+    events.RepliedCommentEvent: [update_post_feed, update_trending, broadcast_post_update],
+    events.DeletedCommentEvent: [update_post_feed, update_trending, broadcast_post_update],
+    events.AttachedImageEvent: [update_post_feed],
     events.DeniedPostActionEvent: [handle_permission_denied],
     events.DeniedCommentActionEvent: [handle_permission_denied],
 }
@@ -204,4 +485,9 @@ COMMAND_HANDLERS = {
     commands.DeleteCommentCommand: delete_comment,
     commands.ReplyCommentCommand: reply_comment,
     commands.AttachImageCommand: attach_image,
+    commands.RebuildPostFeedCommand: rebuild_post_feed,
+    commands.ReconcileCountersCommand: reconcile_counters,
+    commands.RebuildTrendingCommand: rebuild_trending,
+    commands.PurgeDeletedPostsCommand: purge_deleted_posts,
+    commands.SweepOrphanImagesCommand: sweep_orphan_images,
 }
@@ -8,6 +8,9 @@ from src.app.domain import commands
 from src.app.domain import events
 
 if t.TYPE_CHECKING:
+    from src.app.adapters import broadcast
+    from src.app.adapters import cache
+    from src.app.adapters import trending
     from src.app.service_layer import unit_of_work
 
 logger = logging.getLogger(__name__)
@@ -23,9 +26,15 @@ class MessageBus:
         uow: unit_of_work.AbstractUnitOfWork,
         event_handlers: dict[t.Type[events.Event], list[t.Callable]],
         command_handlers: dict[t.Type[commands.Command], t.Callable],
+        ranking: trending.Trending | None = None,
+        posts_cache: cache.ResultCache | None = None,
+        broadcaster: broadcast.Broadcaster | None = None,
     ):
         """Initializes the MessageBus with the given parameters."""
         self.uow = uow
+        self.ranking = ranking
+        self.posts_cache = posts_cache
+        self.broadcaster = broadcaster
         self.event_handlers = event_handlers
         self.command_handlers = command_handlers
 
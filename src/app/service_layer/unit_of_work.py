@@ -2,26 +2,39 @@ from __future__ import annotations
 
 import abc
 import contextlib
+import logging
+import threading
 import typing as t
 
-import minio
 from sqlalchemy import create_engine
 from sqlalchemy import orm
+from sqlalchemy import text
+from sqlalchemy.engine.interfaces import IsolationLevel
 
+from src.app.adapters import changes
 from src.app.adapters import file_storage
+from src.app.adapters import loading
+from src.app.adapters import query_stats
 from src.app.adapters import repository
+from src.app.config import Settings
 from src.app.config import settings
 from src.app.domain import model
 
+if t.TYPE_CHECKING:
+    import minio
+
+logger = logging.getLogger(__name__)
+
 
 class AbstractUnitOfWork(abc.ABC):
     posts: repository.AbstractRepository
     comments: repository.AbstractRepository
     images: repository.AbstractRepository
     minio: file_storage.AbstractFileStorage
+    stats: query_stats.QueryStats
 
     @contextlib.contextmanager
-    def unit_of_work(self):
+    def unit_of_work(self, name: str = "unit_of_work", isolation_level: IsolationLevel | None = None):
         yield self
 
     def __enter__(self) -> AbstractUnitOfWork:
@@ -33,10 +46,27 @@ class AbstractUnitOfWork(abc.ABC):
     def commit(self):
         self._commit()
 
+    def record_change(self, entity: str, entity_id: str, post_id: str, op: str) -> None:
+        """
+        Append a change to the change log clients sync from, in the transaction of this unit of work,
+        so that it commits with the write it describes.
+        """
+
+    def warm_up(self) -> None:
+        """
+        Open the connections the unit of work needs ahead of the first request.
+        """
+
+    def dispose(self, close: bool = True) -> None:
+        """
+        Drop the connections the unit of work opened. A process forked from the one that opened them passes
+        `close=False`, leaving them to the parent.
+        """
+
     def collect_new_events(self):
-        for post in self.posts.seen:
-            while post.events:
-                yield post.events.pop(0)
+        for r in [*self.posts.seen, *self.comments.seen]:
+            while r.events:
+                yield r.events.pop(0)
 
     @abc.abstractmethod
     def _commit(self):
@@ -47,40 +77,148 @@ class AbstractUnitOfWork(abc.ABC):
         raise NotImplementedError
 
 
-POSTGRES_URI = f"postgresql://{settings.POSTGRES_USER}:{settings.POSTGRES_PASSWORD}@{settings.POSTGRES_HOST}:{settings.POSTGRES_PORT}/{settings.POSTGRES_DB}"
-DEFAULT_SESSION_FACTORY = orm.sessionmaker(
-    bind=create_engine(
-        POSTGRES_URI,
-        isolation_level="REPEATABLE READ",
+def postgres_uri(config: Settings = settings) -> str:
+    return (
+        f"postgresql://{config.POSTGRES_USER}:{config.POSTGRES_PASSWORD}@{config.POSTGRES_HOST}:{config.POSTGRES_PORT}/{config.POSTGRES_DB}"
+    )
+
+
+POSTGRES_URI = postgres_uri()
+
+
+def make_session_factory(config: Settings = settings) -> orm.sessionmaker:
+    """
+    A session factory over a new engine. The engine connects, and imports its driver, on first use.
+    """
+    return orm.sessionmaker(bind=create_engine(postgres_uri(config), isolation_level="REPEATABLE READ"))
+
+
+def make_minio_client(config: Settings = settings) -> minio.Minio:
+    import minio
+
+    return minio.Minio(
+        endpoint=f"{config.MINIO_HOST}:{config.MINIO_PORT}",
+        access_key=config.MINIO_ACCESS_KEY,
+        secret_key=config.MINIO_SECRET_KEY,
+        secure=False,
     )
-)
-DEFAUL_MINIO_CLIENT = minio.Minio(
-    endpoint=f"{settings.MINIO_HOST}:{settings.MINIO_PORT}",
-    access_key=settings.MINIO_ACCESS_KEY,
-    secret_key=settings.MINIO_SECRET_KEY,
-    secure=False,
-)
+
+
+class _PerThread:
+    """
+    An instance attribute with one value per thread, so that requests served concurrently
+    by FastAPI's threadpool through one unit of work never share a session.
+    """
+
+    def __set_name__(self, owner, name: str):
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        try:
+            return getattr(obj._local, self.name)
+        except AttributeError:
+            raise AttributeError(self.name) from None
+
+    def __set__(self, obj, value):
+        setattr(obj._local, self.name, value)
 
 
 class SqlAlchemyUnitOfWork(AbstractUnitOfWork):
-    def __init__(self, session_factory=DEFAULT_SESSION_FACTORY, minio_client=DEFAUL_MINIO_CLIENT):
-        self.session_factory = session_factory
-        self.minio_client = minio_client
+    if t.TYPE_CHECKING:
+        # type checkers see what each thread gets, as declared by AbstractUnitOfWork
+        session: orm.Session
+    else:
+        session = _PerThread()
+        posts = _PerThread()
+        comments = _PerThread()
+        images = _PerThread()
+        minio = _PerThread()
+        stats = _PerThread()
 
-    @contextlib.contextmanager
-    def unit_of_work(self):
+    def __init__(
+        self,
+        session_factory: orm.sessionmaker | None = None,
+        minio_client: minio.Minio | None = None,
+        storage_factory=file_storage.MinIOFileStorage,
+        config: Settings = settings,
+    ):
+        """
+        The engine and MinIO client of `config` are made on first use, unless given.
+        """
+        self._session_factory = session_factory
+        self._minio_client = minio_client
+        self._owns_minio_client = minio_client is None
+        self.storage_factory = storage_factory
+        self.config = config
+        self._local = threading.local()
+        # so that threads serving the first requests together make one engine and client
+        self._lock = threading.Lock()
+
+    @property
+    def session_factory(self) -> orm.sessionmaker:
+        if self._session_factory is None:
+            with self._lock:
+                if self._session_factory is None:
+                    self._session_factory = make_session_factory(self.config)
+        return self._session_factory
+
+    @property
+    def minio_client(self) -> minio.Minio:
+        if self._minio_client is None:
+            with self._lock:
+                if self._minio_client is None:
+                    self._minio_client = make_minio_client(self.config)
+        return self._minio_client
+
+    def warm_up(self) -> None:
+        """
+        Connect to the database and MinIO ahead of the first request, logging rather than raising when one
+        is unreachable, as the first request will try again.
+        """
         try:
-            self.session = self.session_factory()
-            self.posts = repository.SqlAlchemyRepository(self.session, model.Post)
-            self.comments = repository.SqlAlchemyRepository(self.session, model.Comment)
-            self.images = repository.SqlAlchemyRepository(self.session, model.Image)
-            self.minio = file_storage.MinIOFileStorage(self.minio_client)
-            yield self
-        except:
-            self.rollback()
-            raise
-        finally:
-            self.session.close()
+            orm.configure_mappers()
+            with self.session_factory() as session:
+                session.execute(text("SELECT 1"))
+        except Exception as e:
+            logger.warning("database warm-up failed: %r", e)
+        try:
+            self.storage_factory(self.minio_client)
+        except Exception as e:
+            logger.warning("file storage warm-up failed: %r", e)
+
+    def dispose(self, close: bool = True) -> None:
+        """
+        Drop the pooled database connections, and the MinIO client made from the config, to be opened again on
+        next use. A process forked from the one that opened them passes `close=False`, leaving them to the parent.
+        """
+        if self._session_factory is not None:
+            self._session_factory.kw["bind"].dispose(close=close)
+        if self._owns_minio_client:
+            self._minio_client = None
+
+    @contextlib.contextmanager
+    def unit_of_work(self, name: str = "unit_of_work", isolation_level: IsolationLevel | None = None):
+        """
+        Open a session named `name` for the query stats. `isolation_level` overrides the REPEATABLE READ of the
+        engine for this unit of work alone.
+        """
+        with query_stats.track(name) as self.stats:
+            try:
+                self.session = self.session_factory()
+                if isolation_level is not None:
+                    self.session.connection(execution_options={"isolation_level": isolation_level})
+                self.posts = repository.SqlAlchemyRepository(self.session, model.Post, loading.options(name, model.Post))
+                self.comments = repository.SqlAlchemyRepository(self.session, model.Comment, loading.options(name, model.Comment))
+                self.images = repository.SqlAlchemyRepository(self.session, model.Image, loading.options(name, model.Image))
+                self.minio = self.storage_factory(self.minio_client)
+                yield self
+            except:
+                self.rollback()
+                raise
+            finally:
+                self.session.close()
 
     def __enter__(self):
         self.session = self.session_factory()
@@ -92,8 +230,54 @@ class SqlAlchemyUnitOfWork(AbstractUnitOfWork):
         super().__exit__(*args)
         self.session.close()
 
+    def record_change(self, entity: str, entity_id: str, post_id: str, op: str) -> None:
+        changes.record(self.session, entity, entity_id, post_id, op)
+
     def _commit(self):
         self.session.commit()
 
     def rollback(self):
         self.session.rollback()
+
+
+class InMemoryUnitOfWork(AbstractUnitOfWork):
+    """
+    A unit of work over in-memory repositories and file storage, for running the bus without Postgres or MinIO.
+
+    Records live on in the repositories across units of work. A rollback doesn't undo changes made to records.
+    There is no post_feed: the views read posts from the repository instead. The change log is a list, in which
+    a change's id is its position, counting from 1.
+    """
+
+    posts: repository.InMemoryRepository
+    comments: repository.InMemoryRepository
+    images: repository.InMemoryRepository
+    minio: file_storage.InMemoryFileStorage
+
+    def __init__(self):
+        self.posts = repository.InMemoryRepository(model.Post)
+        self.comments = repository.InMemoryRepository(model.Comment, posts=self.posts)
+        self.images = repository.InMemoryRepository(model.Image)
+        self.minio = file_storage.InMemoryFileStorage()
+        self.change_log: list[changes.Change] = []
+        self.committed = 0
+
+    @contextlib.contextmanager
+    def unit_of_work(self, name: str = "unit_of_work", isolation_level: IsolationLevel | None = None):
+        # like fresh repositories, only collect the events of the records this unit of work sees
+        for r in (self.posts, self.comments, self.images):
+            r.seen = set()
+        try:
+            yield self
+        except:
+            self.rollback()
+            raise
+
+    def record_change(self, entity: str, entity_id: str, post_id: str, op: str) -> None:
+        self.change_log.append(changes.Change(len(self.change_log) + 1, entity, entity_id, post_id, op))
+
+    def _commit(self):
+        self.committed += 1
+
+    def rollback(self):
+        pass
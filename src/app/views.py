@@ -1,66 +1,339 @@
 """
 All view requests are handled here
+
+`GET /posts` reads the denormalized `post_feed` table with `feed=True`: one indexed select per page,
+images and counts included. Other read views take `core=True` to skip the ORM: they then run Core selects over only the columns
+the response needs and map rows straight into dicts, with no identity map or `seen` tracking.
+List views always take that path when asked for a sparse fieldset or a content preview.
+
+Over an `InMemoryUnitOfWork` there are neither selects nor post_feed: every view reads the repositories, and the
+fieldset and preview are cut from the dumped records.
 """
 
+import collections
+import hashlib
+import operator
+import time
+import typing as t
+
+import orjson
+import sqlalchemy as sa
+
+from src.app.adapters import cache as result_cache
+from src.app.adapters import changes
+from src.app.adapters import export
+from src.app.adapters import orm
+from src.app.adapters import singleflight
+from src.app.adapters import trending
+from src.app.config import settings
+from src.app.domain import model
 from src.app.entrypoints import schema
 from src.app.service_layer import unit_of_work
 
+POST_COLUMNS = (
+    orm.posts.c.id,
+    orm.posts.c.title,
+    orm.posts.c.author_id,
+    orm.posts.c.content,
+    orm.posts.c.like_count,
+    orm.posts.c.comment_count,
+    orm.posts.c.version,
+    orm.posts.c.created_time,
+)
+
+FEED_COLUMNS = (
+    orm.post_feed.c.id,
+    orm.post_feed.c.title,
+    orm.post_feed.c.author_id,
+    orm.post_feed.c.content,
+    orm.post_feed.c.like_count,
+    orm.post_feed.c.comment_count,
+    orm.post_feed.c.images,
+    orm.post_feed.c.version,
+    orm.post_feed.c.created_time,
+)
+
+COMMENT_COLUMNS = (
+    orm.comments.c.id,
+    orm.comments.c.content,
+    orm.comments.c.author_id,
+    orm.comments.c.level,
+    orm.comments.c.post_id,
+    orm.comments.c.comment_id,
+    orm.comments.c.created_time,
+    orm.comments.c.like_count,
+    orm.comments.c.reply_count,
+)
+
+
+def dumps(result: dict | list) -> bytes:
+    """
+    Serialize a view result to JSON bytes.
+    """
+    return orjson.dumps(result)
+
+
+def post_etag(version: int, like_count: int, comment_count: int, image_ids: list[str]) -> str:
+    """
+    A strong ETag for a post: its version, plus the counters and the image set, which change without a new version.
+
+    The image links are presigned and expire, so with images the tag also changes every half link lifetime:
+    a cached copy is only revalidated while its links have at least that half left.
+    """
+    window = int(time.time() // (settings.IMAGE_LINK_EXPIRY_SECONDS / 2)) if image_ids else 0
+    digest = hashlib.blake2b(f"{like_count}:{comment_count}:{','.join(sorted(image_ids))}:{window}".encode(), digest_size=8).hexdigest()
+    return f'"v{version}-{digest}"'
+
+
+def list_etag(result: list[dict]) -> str:
+    """
+    A weak ETag for a list view: equal lists serialize to the same bytes.
+    """
+    return f'W/"{hashlib.blake2b(dumps(result), digest_size=8).hexdigest()}"'
+
+
+def _fields(fields: list[str] | None) -> list[str] | None:
+    """
+    Accept both `fields=a&fields=b` and `fields=a,b`.
+    """
+    if fields is None:
+        return None
+    return [f.strip() for field in fields for f in field.split(",")]
+
+
+def _columns(columns: tuple, fields: list[str] | None, content_preview_len: int | None) -> list:
+    """
+    Pick the requested columns, always keeping the id, and cut `content` down to a preview in SQL.
+    """
+    if fields is not None:
+        columns = tuple(c for c in columns if c.name == "id" or c.name in fields)
+    if content_preview_len is not None:
+        columns = tuple(sa.func.substr(c, 1, content_preview_len).label(c.name) if c.name == "content" else c for c in columns)
+    return list(columns)
+
+
+def _pick(result: dict, fields: list[str] | None, content_preview_len: int | None) -> dict:
+    """
+    Cut a dumped record down the way `_columns` cuts a select.
+    """
+    if fields is not None:
+        result = {key: value for key, value in result.items() if key == "id" or key in fields}
+    if content_preview_len is not None and "content" in result:
+        result["content"] = result["content"][:content_preview_len]
+    return result
+
+
+def _row(row: sa.Row) -> dict:
+    # column names are str subclasses, which orjson refuses as keys
+    result = {str(key): value for key, value in row._mapping.items()}
+    if "created_time" in result:
+        result["created_time"] = result["created_time"].isoformat()
+    return result
+
+
+def _select_posts(session, stmt: sa.Select, images: bool = True) -> list[dict]:
+    """
+    Run a select over POST_COLUMNS and attach the images of every post with one more select.
+    """
+    posts = [_row(row) for row in session.execute(stmt)]
+    if not posts or not images:
+        return posts
+
+    post_images = collections.defaultdict(list)
+    image_rows = session.execute(
+        sa.select(orm.images.c.id, orm.images.c.path, orm.images.c.post_id).where(orm.images.c.post_id.in_([post["id"] for post in posts]))
+    )
+    for image in image_rows:
+        post_images[image.post_id].append({"id": image.id, "path": image.path})
+
+    for post in posts:
+        post["images"] = post_images[post["id"]]
+    return posts
+
+
+def _select_comments(session, stmt: sa.Select) -> list[dict]:
+    return [_row(row) for row in session.execute(stmt)]
 
-def get_post(post_id: str, uow: unit_of_work.AbstractUnitOfWork):
+
+def _of_live_post(post_id) -> sa.Exists:
+    """
+    Whether the post `post_id` exists and isn't deleted, as comments outlive their post until it is purged.
+    """
+    return sa.exists().where(orm.posts.c.id == post_id, orm.posts.c.deleted_time.is_(None))
+
+
+def get_post(post_id: str, uow: unit_of_work.AbstractUnitOfWork, core: bool = False, flights: singleflight.Group | None = None):
     """
-    Get a post by its id, I think.
+    Get a post by its id, I think, or None when there is no such post. Concurrent calls sharing `flights` share one read.
     """
-    with uow.unit_of_work() as uow_ctx:
-        post = uow_ctx.posts.get(post_id)
-        result = post.model_dump()
+    if flights is not None:
+        return flights.do(("get_post", post_id, core), lambda: get_post(post_id, uow, core))
+
+    with uow.unit_of_work("get_post") as uow_ctx:
+        if core and not isinstance(uow_ctx, unit_of_work.InMemoryUnitOfWork):
+            posts = _select_posts(
+                uow_ctx.session, sa.select(*POST_COLUMNS).where(orm.posts.c.id == post_id, orm.posts.c.deleted_time.is_(None))
+            )
+            if not posts:
+                return None
+            result = posts[0]
+        else:
+            post = uow_ctx.posts.get(post_id)
+            if post is None:
+                return None
+            result = post.model_dump()
         for image in result["images"]:
             image["link"] = uow_ctx.minio.get(image["path"])
         return result
 
 
+def get_post_etag(post_id: str, uow: unit_of_work.AbstractUnitOfWork) -> str | None:
+    """
+    The ETag of a post from one select over its version, counters and image ids, without loading
+    the aggregate or presigning image links. None when there is no such post.
+    """
+    image_ids = (
+        sa.select(sa.func.string_agg(sa.cast(orm.images.c.id, sa.String), ","))
+        .where(orm.images.c.post_id == orm.posts.c.id)
+        .scalar_subquery()
+    )
+    with uow.unit_of_work("get_post_etag") as uow_ctx:
+        if isinstance(uow_ctx, unit_of_work.InMemoryUnitOfWork):
+            post = t.cast(model.Post | None, uow_ctx.posts.get(post_id))
+            if post is None:
+                return None
+            return post_etag(post.version, post.like_count, post.comment_count, [image.id for image in post.images])
+        row = uow_ctx.session.execute(
+            sa.select(orm.posts.c.version, orm.posts.c.like_count, orm.posts.c.comment_count, image_ids.label("image_ids")).where(
+                orm.posts.c.id == post_id, orm.posts.c.deleted_time.is_(None)
+            )
+        ).first()
+    if row is None:
+        return None
+    return post_etag(row.version, row.like_count, row.comment_count, row.image_ids.split(",") if row.image_ids else [])
+
+
 def find_post(title: str, uow: unit_of_work.AbstractUnitOfWork):
     """
     Find a post by its title.
     """
-    with uow.unit_of_work() as uow_ctx:
+    with uow.unit_of_work("find_post") as uow_ctx:
         post = uow_ctx.posts.query(title=title)
         return [post.model_dump() for post in post]
 
 
-def get_comments(post_id: str, uow: unit_of_work.AbstractUnitOfWork):
+def get_comments(
+    post_id: str,
+    uow: unit_of_work.AbstractUnitOfWork,
+    core: bool = False,
+    fields: list[str] | None = None,
+    content_preview_len: int | None = None,
+    flights: singleflight.Group | None = None,
+):
     """
-    Get comments of a post.
+    Get comments of a post. Concurrent calls sharing `flights` share one read.
     """
-    with uow.unit_of_work() as uow_ctx:
-        comments = uow_ctx.comments.query(post_id=post_id)
-        return [comment.model_dump() for comment in comments]
+    if flights is not None:
+        key = ("get_comments", post_id, core, None if fields is None else tuple(fields), content_preview_len)
+        return flights.do(key, lambda: get_comments(post_id, uow, core, fields, content_preview_len))
+
+    with uow.unit_of_work("get_comments") as uow_ctx:
+        if not isinstance(uow_ctx, unit_of_work.InMemoryUnitOfWork) and (core or fields is not None or content_preview_len is not None):
+            columns = _columns(COMMENT_COLUMNS, _fields(fields), content_preview_len)
+            stmt = (
+                sa.select(*columns)
+                .where(orm.comments.c.post_id == post_id, _of_live_post(orm.comments.c.post_id))
+                .order_by(orm.comments.c.created_time)
+            )
+            return _select_comments(uow_ctx.session, stmt)
+        comments = sorted(uow_ctx.comments.query(post_id=post_id))
+        return [_pick(comment.model_dump(), _fields(fields), content_preview_len) for comment in comments]
 
 
-def get_comment(comment_id: str, uow: unit_of_work.AbstractUnitOfWork):
+def get_comment(comment_id: str, uow: unit_of_work.AbstractUnitOfWork, core: bool = False):
     """
-    Get a comment by its id.
+    Get a comment by its id, or None when there is no such comment or its post was deleted.
     """
-    with uow.unit_of_work() as uow_ctx:
+    with uow.unit_of_work("get_comment") as uow_ctx:
+        if core and not isinstance(uow_ctx, unit_of_work.InMemoryUnitOfWork):
+            stmt = sa.select(*COMMENT_COLUMNS).where(orm.comments.c.id == comment_id, _of_live_post(orm.comments.c.post_id))
+            comments = _select_comments(uow_ctx.session, stmt)
+            return comments[0] if comments else None
         comment = uow_ctx.comments.get(comment_id)
-        return comment.model_dump()
+        return comment.model_dump() if comment is not None else None
 
 
-def get_reply_comments(comment_id: str, uow: unit_of_work.AbstractUnitOfWork):
+def get_reply_comments(
+    comment_id: str,
+    uow: unit_of_work.AbstractUnitOfWork,
+    core: bool = False,
+    fields: list[str] | None = None,
+    content_preview_len: int | None = None,
+):
     """
     Get reply comments of a comment.
     """
-    with uow.unit_of_work() as uow_ctx:
-        comments = uow_ctx.comments.query(comment_id=comment_id)
-        return [comment.model_dump() for comment in comments]
+    with uow.unit_of_work("get_reply_comments") as uow_ctx:
+        if not isinstance(uow_ctx, unit_of_work.InMemoryUnitOfWork) and (core or fields is not None or content_preview_len is not None):
+            columns = _columns(COMMENT_COLUMNS, _fields(fields), content_preview_len)
+            stmt = (
+                sa.select(*columns)
+                .where(orm.comments.c.comment_id == comment_id, _of_live_post(orm.comments.c.post_id))
+                .order_by(orm.comments.c.created_time)
+            )
+            return _select_comments(uow_ctx.session, stmt)
+        comments = sorted(uow_ctx.comments.query(comment_id=comment_id))
+        return [_pick(comment.model_dump(), _fields(fields), content_preview_len) for comment in comments]
+
+
+def _posts_key(params: schema.GetPostsRequest, core: bool, feed: bool) -> tuple:
+    """
+    Normalize a posts query so that requests for the same page share a cache entry.
+    """
+    fields = _fields(params.fields)
+    return (
+        params.title or None,
+        params.content or None,
+        params.author_id,
+        tuple(params.order),
+        params.limit,
+        params.offset,
+        None if fields is None else tuple(sorted(set(fields))),
+        params.content_preview_len,
+        core,
+        feed,
+    )
 
 
-def get_posts(params: schema.GetPostsRequest, uow: unit_of_work.AbstractUnitOfWork):
+def get_posts(
+    params: schema.GetPostsRequest,
+    uow: unit_of_work.AbstractUnitOfWork,
+    core: bool = False,
+    feed: bool = False,
+    cache: result_cache.ResultCache | None = None,
+):
     """
-    Get all posts.
+    Get all posts, through `cache` when one is given.
     """
-    with uow.unit_of_work() as uow_ctx:
-        post = uow_ctx.posts.model
-        q = uow_ctx.posts._q
+    if cache is not None:
+        return cache.get_or_compute(_posts_key(params, core, feed), params.author_id, lambda: get_posts(params, uow, core, feed))
+
+    fields = _fields(params.fields)
+    core = not feed and (core or fields is not None or params.content_preview_len is not None)
+    table = orm.post_feed if feed else orm.posts
+    q: t.Any  # a core select, or the repository's ORM query
+    with uow.unit_of_work("get_posts") as uow_ctx:
+        if isinstance(uow_ctx, unit_of_work.InMemoryUnitOfWork):
+            return _get_posts_in_memory(uow_ctx, params, table, fields)
+        if feed:
+            post = orm.post_feed.c
+            q = sa.select(*_columns(FEED_COLUMNS, fields, params.content_preview_len))
+        elif core:
+            post = orm.posts.c
+            q = sa.select(*_columns(POST_COLUMNS, fields, params.content_preview_len)).where(post.deleted_time.is_(None))
+        else:
+            post = uow_ctx.posts.model
+            q = uow_ctx.posts._q
 
         if params.title is not None:
             q = q.filter(post.title.like(f"%{params.title}%"))
@@ -76,10 +349,125 @@ def get_posts(params: schema.GetPostsRequest, uow: unit_of_work.AbstractUnitOfWo
                 *[
                     getattr(post, field[1:]).desc() if field.startswith("-") else getattr(post, field[1:]).asc()
                     for field in params.order
-                    if field[1:] in post.__table__.columns.keys() and field[0] in ["-", "+"]
+                    if field[1:] in table.columns.keys() and field[0] in ["-", "+"]
                 ]
             )
         q = q.limit(params.limit).offset(params.offset)
 
+        if feed:
+            return [_row(row) for row in uow_ctx.session.execute(q)]
+        if core:
+            return _select_posts(uow_ctx.session, q, images=fields is None or "images" in fields)
         posts = q.all()
         return [post.model_dump() for post in posts]
+
+
+def _get_posts_in_memory(
+    uow_ctx: unit_of_work.InMemoryUnitOfWork, params: schema.GetPostsRequest, table: sa.Table, fields: list[str] | None
+) -> list[dict]:
+    """
+    Filter, sort and page the posts of the repository as the selects of `get_posts` do, nulls last when ascending.
+    """
+    filters = {} if params.author_id is None else {"author_id": params.author_id}
+    posts = t.cast(list[model.Post], uow_ctx.posts.query(**filters))
+    if params.title is not None:
+        posts = [post for post in posts if params.title in (post.title or "")]
+    if params.content is not None:
+        posts = [post for post in posts if params.content in (post.content or "")]
+    # sorting by the last key first leaves the earlier keys deciding, as sorts are stable
+    for field in reversed(params.order):
+        if field[1:] in table.columns.keys() and field[0] in ["-", "+"]:
+            value = operator.attrgetter(field[1:])
+            posts.sort(key=lambda post: (value(post) is None, value(post)), reverse=field.startswith("-"))
+    page = posts[params.offset : params.offset + params.limit]
+    return [_pick(post.model_dump(), fields, params.content_preview_len) for post in page]
+
+
+def get_trending(limit: int, uow: unit_of_work.AbstractUnitOfWork, ranking: trending.Trending):
+    """
+    Get the hottest posts, highest score first, from the ranking and one select over post_feed.
+    """
+    scores = dict(ranking.top(limit))
+    if not scores:
+        return []
+    with uow.unit_of_work("get_trending") as uow_ctx:
+        if isinstance(uow_ctx, unit_of_work.InMemoryUnitOfWork):
+            posts = {post.id: post.model_dump() for post in uow_ctx.posts.query(id=list(scores))}
+        else:
+            rows = uow_ctx.session.execute(sa.select(*FEED_COLUMNS).where(orm.post_feed.c.id.in_(list(scores))))
+            posts = {post["id"]: post for post in map(_row, rows)}
+    return [{**posts[post_id], "score": score} for post_id, score in scores.items() if post_id in posts]
+
+
+def get_changes(since: int, limit: int, uow: unit_of_work.AbstractUnitOfWork) -> dict:
+    """
+    Get the posts and comments changed after cursor `since`, with the cursor to sync from next.
+
+    Only the latest change of each post or comment in the page is returned, with its current row unless it was
+    deleted. A change whose row is already gone is skipped, since its tombstone follows later in the log.
+    """
+    rows: t.Sequence[sa.Row | changes.Change]
+    with uow.unit_of_work("get_changes") as uow_ctx:
+        in_memory = isinstance(uow_ctx, unit_of_work.InMemoryUnitOfWork)
+        if in_memory:
+            log = uow_ctx.change_log[since : since + limit + 1]
+            rows, has_more = log[:limit], len(log) > limit
+        else:
+            rows, has_more = changes.read(uow_ctx.session, since, limit)
+        latest = {(row.entity, row.entity_id): row for row in rows}
+        live = collections.defaultdict(list)
+        for row in latest.values():
+            if row.op != changes.DELETED:
+                live[row.entity].append(row.entity_id)
+
+        current = {}
+        if in_memory:
+            # the repository hides the comments of a deleted post too
+            for entity, repo in ((changes.POST, uow_ctx.posts), (changes.COMMENT, uow_ctx.comments)):
+                current.update({(entity, record.id): record.model_dump() for record in repo.query(id=live[entity])})
+        if not in_memory and live[changes.POST]:
+            posts = uow_ctx.session.execute(sa.select(*FEED_COLUMNS).where(orm.post_feed.c.id.in_(live[changes.POST])))
+            current.update({(changes.POST, post["id"]): post for post in map(_row, posts)})
+        if not in_memory and live[changes.COMMENT]:
+            # the comments of a deleted post stay until it is purged
+            comments = uow_ctx.session.execute(
+                sa.select(*COMMENT_COLUMNS).where(orm.comments.c.id.in_(live[changes.COMMENT]), _of_live_post(orm.comments.c.post_id))
+            )
+            current.update({(changes.COMMENT, comment["id"]): comment for comment in map(_row, comments)})
+
+    result = []
+    for key, row in sorted(latest.items(), key=lambda item: item[1].id):
+        change = {"cursor": row.id, "entity": row.entity, "id": row.entity_id, "post_id": row.post_id, "op": row.op}
+        if row.op != changes.DELETED:
+            if key not in current:
+                continue
+            change[row.entity] = current[key]
+        result.append(change)
+    return {"changes": result, "cursor": rows[-1].id if rows else since, "has_more": has_more}
+
+
+def export_ndjson(
+    uow: unit_of_work.SqlAlchemyUnitOfWork,
+    author_id: str | None = None,
+    after: export.Cursor | None = None,
+    batch_size: int = 1000,
+    chunk_rows: int = 500,
+) -> t.Iterator[bytes]:
+    """
+    Stream the NDJSON export in chunks of up to `chunk_rows` lines.
+
+    The export reads through a session of its own rather than the unit of work's, as a streaming response
+    may pull every chunk on a different thread.
+    """
+    session = uow.session_factory()
+    try:
+        chunk = []
+        for _, line in export.records(session, author_id, after, batch_size):
+            chunk.append(line)
+            if len(chunk) >= chunk_rows:
+                yield b"".join(chunk)
+                chunk = []
+        if chunk:
+            yield b"".join(chunk)
+    finally:
+        session.close()
@@ -1,17 +1,22 @@
 import json
+import subprocess
+import sys
 import uuid
 
 import pytest
 from fastapi.testclient import TestClient
-from icecream import ic
 from sqlalchemy.orm import clear_mappers
 
 from src.app import bootstrap
 from src.app import views
+from src.app.config import settings
 from src.app.domain import commands
+from src.app.entrypoints import schema
 from src.app.entrypoints.app import app
+from src.app.entrypoints.app import create_app
 from src.app.service_layer import unit_of_work
 from tests.confest import bus  # noqa: F811, F401
+from tests.confest import query_budget  # noqa: F811, F401
 from tests.confest import sql_session_factory  # noqa: F811, F401
 
 client = TestClient(app)
@@ -64,6 +69,7 @@ def test_get_post(bus, post_id):
 
     assert response.status_code == 200
     assert response.json()["id"] == post_id
+    assert set(response.json()) == set(schema.PostResponse.model_fields)
 
 
 def test_edit_post(bus, post_id, user_id):
@@ -82,6 +88,23 @@ def test_delete_post(bus, post_id, user_id):
     assert response.status_code == 204
 
 
+def test_get_deleted_post(bus, post_id):
+    client.delete(f"/posts/{post_id}", headers={"user-id": "test_author_id"})
+    response = client.get(f"/posts/{post_id}", headers={"user-id": "test_user_id"})
+
+    assert response.status_code == 404
+
+
+def test_malformed_and_missing_ids(bus):
+    headers = {"user-id": "test_user_id"}
+    missing = str(uuid.uuid4())
+
+    assert client.get("/posts/not-a-uuid", headers=headers).status_code == 422
+    assert client.get(f"/posts/{missing}", headers=headers).status_code == 404
+    assert client.post(f"/posts/{missing}/like", headers=headers).status_code == 404
+    assert client.post(f"/comments/{missing}/reply", headers=headers, json={"content": "reply"}).status_code == 404
+
+
 def test_like_post(bus, post_id):
     response = client.post(f"/posts/{post_id}/like", headers={"user-id": "test_user_id"})
 
@@ -152,3 +175,120 @@ def test_get_posts(bus):
     response = client.get("/posts", headers={"user-id": "test_user_id"})
 
     assert response.status_code == 200
+
+
+def test_get_posts_sparse_fields(bus, post_id):
+    response = client.get(
+        "/posts",
+        params={"author_id": "test_author_id", "fields": "title,content", "content_preview_len": 4},
+        headers={"user-id": "test_user_id"},
+    )
+
+    assert response.status_code == 200
+    assert all(post.keys() == {"id", "title", "content"} for post in response.json())
+    assert all(len(post["content"]) <= 4 for post in response.json())
+
+
+def test_fast_responses_match_validated_responses(bus, post_id, comment_id, monkeypatch):
+    urls = [f"/posts/{post_id}", f"/posts/{post_id}/comments", f"/comments/{comment_id}/reply", "/posts?author_id=test_author_id"]
+    validated = [client.get(url, headers={"user-id": "test_user_id"}).json() for url in urls]
+
+    monkeypatch.setattr(settings, "FAST_RESPONSES", True)
+    fast = [client.get(url, headers={"user-id": "test_user_id"}) for url in urls]
+
+    assert [response.status_code for response in fast] == [200] * len(urls)
+    assert [response.json() for response in fast] == validated
+
+
+def test_get_trending(user_id, bus):
+    client.post("/posts", headers={"user-id": user_id}, json={"title": "test trending title", "content": "test trending content"})
+    response = client.get("/posts/trending?limit=5", headers={"user-id": user_id})
+
+    assert response.status_code == 200
+    posts = response.json()
+    assert 0 < len(posts) <= 5
+    assert [post["score"] for post in posts] == sorted((post["score"] for post in posts), reverse=True)
+
+
+def test_sync_changes(user_id, bus):
+    cursor = 0
+    while True:
+        page = client.get(f"/posts/changes?since={cursor}&limit=1000", headers={"user-id": user_id}).json()
+        cursor = page["cursor"]
+        if not page["has_more"]:
+            break
+
+    title = f"test sync {uuid.uuid4()}"
+    client.post("/posts", headers={"user-id": user_id}, json={"title": title, "content": "test sync content"})
+    post_id = views.find_post(title, bus.uow)[0]["id"]
+    client.delete(f"/posts/{post_id}", headers={"user-id": user_id})
+
+    response = client.get(f"/posts/changes?since={cursor}", headers={"user-id": user_id})
+    assert response.status_code == 200
+    assert [(c["id"], c["op"]) for c in response.json()["changes"]] == [(post_id, "deleted")]
+    assert response.json()["cursor"] > cursor
+
+
+def test_export(bus):
+    author_id = "test_export_e2e_" + str(uuid.uuid4())
+    for i in range(3):
+        client.post("/posts", headers={"user-id": author_id}, json={"title": f"export {i}", "content": "export"})
+
+    response = client.get(f"/export?author_id={author_id}", headers={"user-id": author_id})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["title"] for line in lines] == ["export 0", "export 1", "export 2"]
+
+    response = client.get(f"/export?author_id={author_id}&after=post:{lines[0]['id']}", headers={"user-id": author_id})
+    assert [json.loads(line)["title"] for line in response.text.splitlines()] == ["export 1", "export 2"]
+    assert client.get("/export?after=nothing:1", headers={"user-id": author_id}).status_code == 400
+    assert client.get("/export?after=post:not-a-uuid", headers={"user-id": author_id}).status_code == 400
+
+
+def test_get_post_events_of_missing_post(user_id, bus):
+    response = client.get(f"/posts/{uuid.uuid4()}/events", headers={"user-id": user_id})
+    assert response.status_code == 404
+
+
+def test_get_post_etag(bus, post_id, query_budget):
+    response = client.get(f"/posts/{post_id}", headers={"user-id": "test_user_id"})
+    etag = response.headers["etag"]
+    assert etag.startswith('"v1-')
+
+    with query_budget(1):
+        response = client.get(f"/posts/{post_id}", headers={"user-id": "test_user_id", "if-none-match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+
+    client.post(f"/posts/{post_id}/like", headers={"user-id": "test_etag_user_id"})
+    response = client.get(f"/posts/{post_id}", headers={"user-id": "test_user_id", "if-none-match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_list_weak_etags(bus, post_id, comment_id):
+    for url in [f"/posts/{post_id}/comments", f"/comments/{comment_id}/reply", "/posts?author_id=test_author_id"]:
+        response = client.get(url, headers={"user-id": "test_user_id"})
+        etag = response.headers["etag"]
+        assert etag.startswith('W/"')
+
+        response = client.get(url, headers={"user-id": "test_user_id", "if-none-match": f'"other", {etag}'})
+        assert response.status_code == 304
+
+
+def test_importing_the_app_connects_nowhere():
+    code = "import sys, src.app.entrypoints.app; print(sorted({'minio', 'psycopg2', 'icecream'} & set(sys.modules)))"
+    assert subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.strip() == "[]"
+
+
+def test_create_app_connects_in_its_lifespan(bus):
+    api = create_app()
+    uow = api.state.bus.uow
+    assert uow._session_factory is None and uow._minio_client is None
+
+    with TestClient(api, headers={"user-id": "test_user_id"}) as lifespan_client:
+        assert uow._session_factory is not None and uow._minio_client is not None
+        assert api.state.bus.ranking.top(1) != []  # seeded from the stored posts
+        assert lifespan_client.get("/posts?limit=1").status_code == 200
@@ -0,0 +1,182 @@
+import json
+import uuid
+
+import pytest
+import sqlalchemy as sa
+
+from src.app import views
+from src.app.adapters import migrations
+from src.app.adapters import orphans
+from src.app.domain import commands
+from src.app.domain import model
+from src.app.entrypoints import schema
+from tests.confest import bus  # noqa: F811, F401
+from tests.confest import sql_session_factory  # noqa: F811, F401
+
+
+@pytest.fixture
+def engine(sql_session_factory):
+    return sql_session_factory.kw["bind"]
+
+
+def test_migrate_is_idempotent(engine):
+    assert migrations.migrate(engine) == []
+    assert set(migrations.applied(engine)) == {migration.version for migration in migrations.MIGRATIONS}
+
+    indexes = {index["name"] for table in ["posts", "comments", "likes", "images"] for index in sa.inspect(engine).get_indexes(table)}
+    assert {
+        "ix_posts_created_time",
+        "ix_posts_author_id_created_time",
+        "ix_comments_post_id_created_time",
+        "ix_comments_comment_id_created_time",
+        "ix_likes_post_id_user_id",
+        "ix_likes_comment_id_user_id",
+        "ix_images_post_id",
+    } <= indexes
+
+
+# the schema before migrations existed, as `metadata.create_all` built it
+BASELINE_SCHEMA = """
+CREATE TABLE likes (id varchar PRIMARY KEY, user_id varchar, post_id varchar, comment_id varchar, created_time timestamp);
+CREATE TABLE images (id varchar PRIMARY KEY, path varchar, post_id varchar, created_time timestamp);
+CREATE TABLE comments (
+    id varchar PRIMARY KEY, content varchar, author_id varchar, level integer, post_id varchar, comment_id varchar,
+    like_count integer, version integer, created_time timestamp, updated_time timestamp
+);
+CREATE TABLE posts (
+    id varchar PRIMARY KEY, title varchar, author_id varchar, content varchar, like_count integer, version integer,
+    created_time timestamp, updated_time timestamp
+);
+"""
+
+
+@pytest.fixture
+def baseline_engine(engine):
+    name = f"test_baseline_{uuid.uuid4().hex}"
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql(f'CREATE DATABASE "{name}"')
+    baseline = sa.create_engine(engine.url.set(database=name))
+    yield baseline
+    baseline.dispose()
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql(f'DROP DATABASE "{name}" WITH (FORCE)')
+
+
+def test_migrate_a_baseline_database(baseline_engine):
+    post_id, comment_id, reply_id = (str(uuid.uuid4()) for _ in range(3))
+    with baseline_engine.begin() as conn:
+        conn.exec_driver_sql(BASELINE_SCHEMA)
+        conn.execute(
+            sa.text("INSERT INTO posts VALUES (:id, 'title', 'author', 'content', 1, 1, '2024-01-01', '2024-01-01')"), {"id": post_id}
+        )
+        conn.execute(
+            sa.text("INSERT INTO comments VALUES (:id, 'comment', 'author', 0, :post_id, NULL, 0, 1, '2024-01-02', '2024-01-02')"),
+            {"id": comment_id, "post_id": post_id},
+        )
+        conn.execute(
+            sa.text("INSERT INTO comments VALUES (:id, 'reply', 'author', 1, :post_id, :comment_id, 0, 1, '2024-01-03', '2024-01-03')"),
+            {"id": reply_id, "post_id": post_id, "comment_id": comment_id},
+        )
+        conn.execute(
+            sa.text("INSERT INTO likes VALUES (:id, 'fan', :post_id, NULL, '2024-01-02')"), {"id": str(uuid.uuid4()), "post_id": post_id}
+        )
+        conn.execute(
+            sa.text("INSERT INTO images VALUES (:id, :path, :post_id, '2024-01-02')"),
+            {"id": str(uuid.uuid4()), "path": f"posts/{post_id}/image.png", "post_id": post_id},
+        )
+
+    assert [m.version for m in migrations.migrate(baseline_engine)] == [m.version for m in migrations.MIGRATIONS]
+    assert migrations.migrate(baseline_engine) == []
+
+    with baseline_engine.connect() as conn:
+        assert conn.execute(sa.text("SELECT comment_count FROM posts")).scalar() == 2
+        assert dict(conn.execute(sa.text("SELECT id::text, reply_count FROM comments")).all()) == {comment_id: 1, reply_id: 0}
+        feed = conn.execute(sa.text("SELECT id::text, like_count, comment_count, images FROM post_feed")).one()
+        assert feed[:3] == (post_id, 1, 2)
+        assert [image["path"] for image in feed.images] == [f"posts/{post_id}/image.png"]
+        logged = conn.execute(sa.text("SELECT entity, entity_id::text FROM changes ORDER BY id")).all()
+        assert logged == [("post", post_id), ("comment", comment_id), ("comment", reply_id)]
+        assert conn.execute(sa.text("SELECT deleted_time FROM posts")).scalar() is None
+
+        # the uuid columns took the place of the text ones, with their key and indexes
+        inspector = sa.inspect(conn)
+        for table in ("posts", "comments", "likes", "images"):
+            assert not [c["name"] for c in inspector.get_columns(table) if c["name"].endswith("_uuid")]
+            assert isinstance({c["name"]: c["type"] for c in inspector.get_columns(table)}["id"], sa.Uuid)
+            assert inspector.get_pk_constraint(table) == {"name": f"{table}_pkey", "constrained_columns": ["id"], "comment": None}
+        indexes = {index["name"]: index["column_names"] for index in inspector.get_indexes("comments")}
+        assert indexes["ix_comments_post_id_created_time"] == ["post_id", "created_time"]
+
+
+def _seq_scans(plan: dict) -> list[str]:
+    scans = [plan["Relation Name"]] if plan["Node Type"] == "Seq Scan" else []
+    for child in plan.get("Plans", []):
+        scans += _seq_scans(child)
+    return scans
+
+
+def test_view_queries_use_indexes(bus, engine):
+    selects = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("SELECT"):
+            selects.append((statement, parameters))
+
+    author_id = str(uuid.uuid4())
+    bus.handle(commands.CreatePostCommand(title="explain", content="explain", author_id=author_id))
+    params = schema.GetPostsRequest(title=None, content=None, author_id=author_id, order=["-created_time"], limit=10, offset=0)
+    post_id = views.get_posts(params, bus.uow)[0]["id"]
+    bus.handle(commands.CommentPostCommand(post_id=post_id, user_id=author_id, content="explain"))
+    comment_id = views.get_comments(post_id, bus.uow)[0]["id"]
+    with bus.uow.unit_of_work() as uow_ctx:
+        uow_ctx.images.add(model.Image.create(f"posts/{post_id}/explain.png", post_id))
+        uow_ctx.commit()
+
+    sa.event.listen(engine, "before_cursor_execute", record)
+    try:
+        for core in (False, True):
+            views.get_posts(params, bus.uow, core=core)
+            views.get_post(post_id, bus.uow, core=core)
+            views.get_comments(post_id, bus.uow, core=core)
+            views.get_reply_comments(comment_id, bus.uow, core=core)
+        views.get_posts(params, bus.uow, feed=True)
+        views.get_changes(0, 100, bus.uow)
+        with bus.uow.unit_of_work() as uow_ctx:
+            orphans.referenced(uow_ctx.session, [f"posts/{post_id}/explain.png"])
+    finally:
+        sa.event.remove(engine, "before_cursor_execute", record)
+
+    assert selects
+    with engine.connect() as conn:
+        conn.exec_driver_sql("SET enable_seqscan = off")
+        for statement, parameters in selects:
+            plan = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+            plan = plan if isinstance(plan, list) else json.loads(plan)
+            assert _seq_scans(plan[0]["Plan"]) == [], statement
+
+
+def test_post_filters_use_trigram_indexes(bus, engine):
+    with engine.connect() as conn:
+        if conn.execute(sa.text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first() is None:
+            pytest.skip("pg_trgm is not installed on this server")
+
+    selects = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("SELECT"):
+            selects.append((statement, parameters))
+
+    params = schema.GetPostsRequest(title="xplai", content="xplai", author_id=None, order=[], limit=10, offset=0)
+    sa.event.listen(engine, "before_cursor_execute", record)
+    try:
+        for core, feed in ((False, False), (True, False), (False, True)):
+            views.get_posts(params, bus.uow, core=core, feed=feed)
+    finally:
+        sa.event.remove(engine, "before_cursor_execute", record)
+
+    with engine.connect() as conn:
+        conn.exec_driver_sql("SET enable_seqscan = off")
+        for statement, parameters in selects:
+            plan = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+            plan = plan if isinstance(plan, list) else json.loads(plan)
+            assert _seq_scans(plan[0]["Plan"]) == [], statement
@@ -0,0 +1,82 @@
+import asyncio
+import contextlib
+import json
+import time
+
+import pytest
+
+from src.app.adapters import relay
+from src.app.config import settings
+from src.app.entrypoints import app
+from tests.confest import sql_session_factory  # noqa: F811, F401
+
+
+@pytest.fixture
+def workers(sql_session_factory):
+    """
+    Two relays on one channel, standing for two workers of a server.
+    """
+    uri = sql_session_factory.kw["bind"].url.render_as_string(hide_password=False)
+    relays = [relay.Relay(uri, channel="test_post_updates") for _ in range(2)]
+
+    @contextlib.contextmanager
+    def listening():
+        for r in relays:
+            r.start()
+        try:
+            for r in relays:
+                assert r.listening.wait(10)
+            yield
+        finally:
+            for r in relays:
+                r.stop()
+
+    return relays, listening
+
+
+def eventually(check, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not check():
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+
+
+def test_invalidations_reach_the_other_workers(workers):
+    (a, b), listening = workers
+    cache_a, cache_b = relay.SharedResultCache(100, 60, a), relay.SharedResultCache(100, 60, b)
+    with listening():
+        cache_b.get_or_compute("page", "author", lambda: "stale")
+        cache_b.get_or_compute("other page", "other author", lambda: "kept")
+        cache_a.invalidate("author")
+
+        eventually(lambda: cache_b.get_or_compute("page", "author", lambda: "fresh") == "fresh")
+        assert cache_b.get_or_compute("other page", "other author", lambda: "recomputed") == "kept"
+
+
+def test_live_updates_reach_the_other_workers(workers):
+    (a, b), listening = workers
+
+    async def main():
+        broadcaster_a, broadcaster_b = relay.SharedBroadcaster(a, window=60), relay.SharedBroadcaster(b, window=60)
+        queue = broadcaster_b.subscribe("post")
+        with listening():
+            # connecting, the listener may have missed updates
+            broadcaster_b.flush()
+            assert queue.get_nowait() == b"event: resync\ndata: {}\n\n"
+
+            broadcaster_a.publish("post", like_delta=1)
+            while queue.empty():
+                await asyncio.sleep(0.02)
+                broadcaster_b.flush()
+        event, data = queue.get_nowait().decode().strip().split("\n")
+        assert (event, json.loads(data.removeprefix("data: "))) == (
+            "event: update",
+            {"post_id": "post", "like_delta": 1, "comment_delta": 0},
+        )
+
+    asyncio.run(asyncio.wait_for(main(), 10))
+
+
+def test_several_workers_need_a_shared_ranking():
+    with pytest.raises(ValueError, match="TRENDING_BACKEND=redis"):
+        app.create_app(settings.model_copy(update={"WEB_WORKERS": 2, "TRENDING_BACKEND": "memory"}))
@@ -1,17 +1,32 @@
+import asyncio
+import concurrent.futures
+import json
 import os
 import uuid
 
+import minio
 import pytest
+import sqlalchemy as sa
 from fastapi import UploadFile
-from icecream import ic
 from sqlalchemy.orm import clear_mappers
+from starlette.datastructures import Headers
 
 from src.app import bootstrap
 from src.app import views
+from src.app.adapters import changes
+from src.app.adapters import export
+from src.app.adapters import importer
+from src.app.adapters import orm
+from src.app.adapters import query_stats
+from src.app.adapters import singleflight
+from src.app.config import settings
 from src.app.domain import commands
+from src.app.domain import model
 from src.app.entrypoints import schema
+from src.app.service_layer import handlers
 from src.app.service_layer import unit_of_work
 from tests.confest import bus  # noqa: F811, F401
+from tests.confest import query_budget  # noqa: F811, F401
 from tests.confest import sql_session_factory  # noqa: F811, F401
 
 
@@ -72,6 +87,151 @@ def test_delete_post(bus, post):
     assert len(posts) == 0
 
 
+def test_post_etag_outlives_no_image_link(bus, post, monkeypatch):
+    image = UploadFile(open("tests/assets/test_image.png", "rb"), filename="test_image.png", headers=Headers({"content-type": "image/png"}))
+    bus.handle(commands.AttachImageCommand(post_id=post["id"], user_id=post["author_id"], images=[image]))
+    expiry = settings.IMAGE_LINK_EXPIRY_SECONDS
+    monkeypatch.setattr(views.time, "time", lambda: 10 * expiry)
+    etag, bare = views.get_post_etag(post["id"], bus.uow), views.post_etag(1, 0, 0, [])
+
+    monkeypatch.setattr(views.time, "time", lambda: 10.5 * expiry - 1)
+    assert views.get_post_etag(post["id"], bus.uow) == etag
+    monkeypatch.setattr(views.time, "time", lambda: 10.5 * expiry)
+    assert views.get_post_etag(post["id"], bus.uow) != etag
+    # without images there are no links to expire
+    assert views.post_etag(1, 0, 0, []) == bare
+
+
+def test_purge_deleted_post(bus, comment, query_budget):
+    post_id = comment["post_id"]
+    bus.handle(commands.LikePostCommand(post_id=post_id, user_id="test_purge_user"))
+    bus.handle(commands.LikeCommentCommand(comment_id=comment["id"], user_id="test_purge_user"))
+    bus.handle(commands.ReplyCommentCommand(comment_id=comment["id"], user_id="test_purge_user", content="purged reply"))
+    image = UploadFile(open("tests/assets/test_image.png", "rb"), filename="test_image.png", headers=Headers({"content-type": "image/png"}))
+    bus.handle(commands.AttachImageCommand(post_id=post_id, user_id="test_author_id", images=[image]))
+    [path] = [image["path"] for image in views.get_post(post_id, bus.uow)["images"]]
+
+    with query_budget(7):  # the soft delete loads nothing the post owns
+        bus.handle(commands.DeletePostCommand(post_id=post_id, user_id="test_author_id"))
+    assert views.get_post_etag(post_id, bus.uow) is None
+    assert views.get_post(post_id, bus.uow) is None
+    assert views.get_post(post_id, bus.uow, core=True) is None
+    for core in (False, True):
+        assert views.get_comments(post_id, bus.uow, core=core) == []
+        assert views.get_reply_comments(comment["id"], bus.uow, core=core) == []
+        assert views.get_comment(comment["id"], bus.uow, core=core) is None
+
+    bus.handle(commands.PurgeDeletedPostsCommand(batch_size=1))
+    with bus.uow.unit_of_work() as uow_ctx:
+        for table, column in [(orm.posts, orm.posts.c.id), (orm.comments, orm.comments.c.post_id), (orm.images, orm.images.c.post_id)]:
+            assert uow_ctx.session.execute(sa.select(table).where(column == post_id)).all() == []
+        assert uow_ctx.session.execute(sa.select(orm.likes).where(orm.likes.c.comment_id == comment["id"])).all() == []
+        with pytest.raises(minio.error.S3Error):
+            uow_ctx.minio_client.stat_object(uow_ctx.minio.BUCKET_NAME, path)
+
+
+def test_sweep_orphan_images(bus, post):
+    image = UploadFile(open("tests/assets/test_image.png", "rb"), filename="kept.png", headers=Headers({"content-type": "image/png"}))
+    bus.handle(commands.AttachImageCommand(post_id=post["id"], user_id=post["author_id"], images=[image]))
+    with bus.uow.unit_of_work() as uow_ctx:
+        orphan = UploadFile(
+            open("tests/assets/test_image.png", "rb"), filename="orphan.png", headers=Headers({"content-type": "image/png"})
+        )
+        uow_ctx.minio.add(f"posts/{post['id']}/orphan.png", orphan)
+        storage = uow_ctx.minio
+
+    prefix = f"posts/{post['id']}/"
+    bus.handle(commands.SweepOrphanImagesCommand(min_age_seconds=0, dry_run=True))
+    assert sorted(path for path, _ in storage.iter_paths(prefix)) == [prefix + "kept.png", prefix + "orphan.png"]
+
+    bus.handle(commands.SweepOrphanImagesCommand(min_age_seconds=0))
+    assert [path for path, _ in storage.iter_paths(prefix)] == [prefix + "kept.png"]
+
+
+def test_export_author_history(bus, comment, tmp_path, monkeypatch):
+    author_id = "test_export_author_" + str(uuid.uuid4())
+    bus.handle(commands.CreatePostCommand(title="exported", content="exported", author_id=author_id))
+    bus.handle(commands.CommentPostCommand(post_id=comment["post_id"], user_id=author_id, content="exported comment"))
+    bus.handle(commands.LikePostCommand(post_id=comment["post_id"], user_id=author_id))
+    bus.handle(commands.LikeCommentCommand(comment_id=comment["id"], user_id=author_id))
+
+    with bus.uow.unit_of_work() as uow_ctx:
+        lines = [json.loads(line) for _, line in export.records(uow_ctx.session, author_id, batch_size=2)]
+        assert [line["type"] for line in lines] == ["post", "comment", "like", "like"]
+        assert lines[0]["title"] == "exported"
+        assert lines[1]["content"] == "exported comment"
+
+        path = str(tmp_path / "export.ndjson")
+        records = export.records
+
+        def interrupted(*args, **kwargs):
+            for i, record in enumerate(records(*args, **kwargs)):
+                if i == 3:
+                    raise ConnectionError
+                yield record
+
+        monkeypatch.setattr(export, "records", interrupted)
+        with pytest.raises(ConnectionError):
+            export.to_file(uow_ctx.session, path, author_id, checkpoint_every=2)
+        assert json.load(open(path + ".checkpoint"))["cursor"] == f"comment:{lines[1]['id']}"
+
+        monkeypatch.setattr(export, "records", records)
+        assert export.to_file(uow_ctx.session, path, author_id, checkpoint_every=2) == 2
+    assert [json.loads(line) for line in open(path)] == lines
+    assert not os.path.exists(path + ".checkpoint")
+
+
+def test_import_records(bus, tmp_path, monkeypatch):
+    post_id, comment_id, reply_id = (str(model.uuid7()) for _ in range(3))
+    author_id = "test_import_author_" + str(uuid.uuid4())
+    records = [
+        {"type": "post", "id": post_id, "title": "imported", "content": "imported", "author_id": author_id, "like_count": 99},
+        {
+            "type": "comment",
+            "id": reply_id,
+            "content": "reply",
+            "author_id": author_id,
+            "level": 1,
+            "post_id": post_id,
+            "comment_id": comment_id,
+        },
+        {"type": "comment", "id": comment_id, "content": "comment", "author_id": author_id, "level": 0, "post_id": post_id},
+        {"type": "comment", "content": "orphan reply", "author_id": author_id, "level": 1, "post_id": post_id},
+        {"type": "like", "user_id": author_id, "post_id": post_id},
+        {"type": "like", "user_id": author_id, "post_id": post_id, "comment_id": comment_id},
+        {"type": "image", "path": f"posts/{post_id}/image.png", "post_id": post_id},
+    ]
+    path = str(tmp_path / "import.ndjson")
+    with open(path, "w") as f:
+        f.writelines(json.dumps(record) + "\n" for record in records)
+
+    insert = importer._insert
+
+    def interrupted(conn, batch, stats):
+        if batch["image"]:
+            raise ConnectionError
+        insert(conn, batch, stats)
+
+    monkeypatch.setattr(importer, "_insert", interrupted)
+    with bus.uow.unit_of_work() as uow_ctx:
+        with pytest.raises(ConnectionError):
+            importer.from_file(uow_ctx.session, path, batch_size=3)
+    assert json.load(open(path + ".checkpoint")) == {"position": 6}
+    assert views.get_comment(comment_id, bus.uow)["reply_count"] == 1
+
+    monkeypatch.setattr(importer, "_insert", insert)
+    with bus.uow.unit_of_work() as uow_ctx:
+        stats = importer.from_file(uow_ctx.session, path, batch_size=3)
+    assert (stats.read, stats.inserted, stats.rejected) == (1, 1, 0)
+    assert not os.path.exists(path + ".checkpoint")
+
+    imported = views.get_post(post_id, bus.uow)
+    assert (imported["like_count"], imported["comment_count"], len(imported["images"])) == (1, 2, 1)
+    assert views.get_comment(comment_id, bus.uow)["like_count"] == 1
+    params = schema.GetPostsRequest(title=None, content=None, author_id=author_id, order=[], limit=5, offset=0)
+    assert [p["comment_count"] for p in views.get_posts(params, bus.uow, feed=True)] == [2]
+
+
 def test_like_unlike_post(bus, post):
     cmd_like_1 = commands.LikePostCommand(post_id=post["id"], user_id="test_user_id_like")
     cmd_like_2 = commands.LikePostCommand(post_id=post["id"], user_id="test_user_id_like_2")
@@ -287,10 +447,12 @@ def test_attach_image(bus, post):
         open(file_path, "rb"),
         filename="test_image.png",
         size=os.path.getsize(file_path),
-        headers={
-            "content-disposition": 'form-data; name="images"; filename="test_image.png"',
-            "content-type": "image/png",
-        },
+        headers=Headers(
+            {
+                "content-disposition": 'form-data; name="images"; filename="test_image.png"',
+                "content-type": "image/png",
+            }
+        ),
     )
 
     cmd = commands.AttachImageCommand(
@@ -304,3 +466,363 @@ def test_attach_image(bus, post):
 
     assert len(post["images"]) == 1
     # assert post["images"][0]["path"] == f"posts/{post['id']}/test_image.png"
+
+
+def test_get_posts_query_stats(bus, query_budget):
+    author_id = str(uuid.uuid4())
+    for i in range(6):
+        bus.handle(commands.CreatePostCommand(title=f"title {i}", content="content", author_id=author_id))
+
+    params = schema.GetPostsRequest(title=None, content=None, author_id=author_id, order=["-created_time"], limit=10, offset=0)
+    with query_budget(2) as captured:
+        posts = views.get_posts(params, bus.uow)
+
+    assert len(posts) == 6
+    stats = captured[0]
+    assert stats.name == "get_posts"
+    assert stats.rows == 6
+    assert stats.n_plus_one_suspects() == []
+
+
+def test_views_query_budget(bus, query_budget, comment):
+    with query_budget(2):
+        views.get_post(comment["post_id"], bus.uow)
+    with query_budget(1):
+        views.get_comments(comment["post_id"], bus.uow)
+    with query_budget(1):
+        views.get_comment(comment["id"], bus.uow)
+    with query_budget(1):
+        views.get_reply_comments(comment["id"], bus.uow)
+
+
+def test_handlers_query_budget(bus, query_budget, comment):
+    with query_budget(7):  # the like, the change log and the post_feed projection
+        bus.handle(commands.LikePostCommand(post_id=comment["post_id"], user_id="test_budget_user_id"))
+    with query_budget(5):  # the like and the change log
+        bus.handle(commands.LikeCommentCommand(comment_id=comment["id"], user_id="test_budget_user_id"))
+    with query_budget(9):  # the reply, both counters, the post_feed projection and the change log
+        bus.handle(commands.ReplyCommentCommand(comment_id=comment["id"], user_id="test_budget_user_id", content="reply"))
+
+
+def test_core_views_match_orm_views(bus, comment):
+    post_id = comment["post_id"]
+    bus.handle(commands.ReplyCommentCommand(comment_id=comment["id"], user_id="test_user_reply_id", content="test core reply"))
+    params = schema.GetPostsRequest(title=None, content=None, author_id="test_author_id", order=["-created_time"], limit=5, offset=0)
+
+    assert views.get_post(post_id, bus.uow, core=True) == views.get_post(post_id, bus.uow)
+    assert views.get_posts(params, bus.uow, core=True) == views.get_posts(params, bus.uow)
+    assert views.get_comments(post_id, bus.uow, core=True) == views.get_comments(post_id, bus.uow)
+    assert views.get_comment(comment["id"], bus.uow, core=True) == views.get_comment(comment["id"], bus.uow)
+    assert views.get_reply_comments(comment["id"], bus.uow, core=True) == views.get_reply_comments(comment["id"], bus.uow)
+
+
+def test_get_posts_sparse_fields(bus, post, query_budget):
+    params = schema.GetPostsRequest(
+        title=post["title"],
+        content=None,
+        author_id=None,
+        order=["-created_time"],
+        limit=10,
+        offset=0,
+        fields=["title,content"],
+        content_preview_len=4,
+    )
+
+    with query_budget(1):
+        posts = views.get_posts(params, bus.uow)
+
+    assert posts == [{"id": post["id"], "title": post["title"], "content": post["content"][:4]}]
+
+
+def test_get_comments_sparse_fields(bus, comment):
+    comments = views.get_comments(comment["post_id"], bus.uow, fields=["author_id"])
+    assert comments == [{"id": comment["id"], "author_id": comment["author_id"]}]
+
+    replies = views.get_reply_comments(comment["id"], bus.uow, fields=["content"], content_preview_len=3)
+    assert replies == []
+
+
+def test_post_feed_follows_events(bus, query_budget):
+    author_id = str(uuid.uuid4())
+    params = schema.GetPostsRequest(title=None, content=None, author_id=author_id, order=["-created_time"], limit=10, offset=0)
+    bus.handle(commands.CreatePostCommand(title="feed title", content="feed content", author_id=author_id))
+    [post] = views.get_posts(params, bus.uow, feed=True)
+    assert post["title"] == "feed title"
+    assert post["comment_count"] == 0
+    assert post["images"] == []
+
+    bus.handle(commands.EditPostCommand(user_id=author_id, post_id=post["id"], title="feed title 2", content="feed content 2"))
+    bus.handle(commands.LikePostCommand(post_id=post["id"], user_id="test_feed_user_id"))
+    bus.handle(commands.CommentPostCommand(post_id=post["id"], user_id="test_feed_user_id", content="feed comment"))
+    comment_id = views.get_comments(post["id"], bus.uow)[0]["id"]
+    bus.handle(commands.ReplyCommentCommand(comment_id=comment_id, user_id="test_feed_user_id", content="feed reply"))
+    with query_budget(1):
+        [post] = views.get_posts(params, bus.uow, feed=True)
+    assert post["title"] == "feed title 2"
+    assert post["version"] == 2
+    assert post["like_count"] == 1
+    assert post["comment_count"] == 2
+
+    bus.handle(commands.LikePostCommand(post_id=post["id"], user_id="test_feed_user_id"))
+    bus.handle(commands.DeleteCommentCommand(comment_id=comment_id, user_id="test_feed_user_id"))
+    [post] = views.get_posts(params, bus.uow, feed=True)
+    assert post["like_count"] == 0
+    assert post["comment_count"] == 0
+
+    bus.handle(commands.DeletePostCommand(post_id=post["id"], user_id=author_id))
+    assert views.get_posts(params, bus.uow, feed=True) == []
+
+
+def test_post_feed_matches_core_view(bus, comment):
+    params = schema.GetPostsRequest(title=None, content=None, author_id="test_author_id", order=["-created_time"], limit=5, offset=0)
+    assert views.get_posts(params, bus.uow, feed=True) == views.get_posts(params, bus.uow, core=True)
+
+
+def test_rebuild_post_feed(bus, post):
+    params = schema.GetPostsRequest(title=post["title"], content=None, author_id=post["author_id"], order=[], limit=5, offset=0)
+    with bus.uow.unit_of_work() as uow_ctx:
+        uow_ctx.session.execute(orm.post_feed.delete().where(orm.post_feed.c.id == post["id"]))
+        uow_ctx.commit()
+    assert views.get_posts(params, bus.uow, feed=True) == []
+
+    with query_stats.capture() as captured:
+        bus.handle(commands.RebuildPostFeedCommand(batch_size=200))
+    assert len([s for s in captured if s.name == "rebuild_post_feed"]) >= 2
+    [feed_post] = views.get_posts(params, bus.uow, feed=True)
+    assert feed_post["id"] == post["id"]
+
+
+def test_comment_and_reply_counts(bus, comment):
+    post_id, comment_id = comment["post_id"], comment["id"]
+    bus.handle(commands.ReplyCommentCommand(comment_id=comment_id, user_id="test_count_user_id", content="reply"))
+    reply_id = views.get_reply_comments(comment_id, bus.uow)[0]["id"]
+    bus.handle(commands.ReplyCommentCommand(comment_id=reply_id, user_id="test_count_user_id", content="reply to reply"))
+    bus.handle(commands.ReplyCommentCommand(comment_id=comment_id, user_id="test_count_user_id", content="second reply"))
+
+    assert views.get_post(post_id, bus.uow)["comment_count"] == 4
+    assert views.get_comment(comment_id, bus.uow)["reply_count"] == 2
+    assert views.get_comment(reply_id, bus.uow)["reply_count"] == 1
+
+    bus.handle(commands.DeleteCommentCommand(comment_id=reply_id, user_id="test_count_user_id"))
+    assert views.get_post(post_id, bus.uow)["comment_count"] == 2
+    assert views.get_comment(comment_id, bus.uow)["reply_count"] == 1
+    assert len(views.get_comments(post_id, bus.uow)) == 2
+
+    bus.handle(commands.DeleteCommentCommand(comment_id=comment_id, user_id=comment["author_id"]))
+    assert views.get_post(post_id, bus.uow)["comment_count"] == 0
+    assert views.get_comments(post_id, bus.uow) == []
+
+
+def test_comment_waits_out_a_concurrent_counter_update(bus, comment):
+    post_id = comment["post_id"]
+    increment = orm.posts.update().where(orm.posts.c.id == post_id).values(comment_count=orm.posts.c.comment_count + 1)
+    waiting = sa.text("SELECT count(*) FROM pg_stat_activity WHERE wait_event_type = 'Lock' AND datname = current_database()")
+
+    def blocked() -> bool:
+        # on a connection of its own, as a transaction sees pg_stat_activity as of its first read of it
+        with bus.uow.session_factory.kw["bind"].connect() as conn:
+            return bool(conn.execute(waiting).scalar())
+
+    with bus.uow.unit_of_work() as other, concurrent.futures.ThreadPoolExecutor(1) as pool:
+        other.session.execute(increment)
+        commented = pool.submit(bus.handle, commands.CommentPostCommand(post_id=post_id, user_id="test_count_user_id", content="c"))
+        # the comment blocks on the row lock of the other update, having read the post before it commits
+        while not blocked() and not commented.done():
+            pass
+        other.commit()
+        commented.result(timeout=10)
+
+    assert views.get_post(post_id, bus.uow)["comment_count"] == 3
+
+
+def test_reconcile_counters(bus, comment):
+    bus.handle(commands.ReplyCommentCommand(comment_id=comment["id"], user_id="test_count_user_id", content="reply"))
+    with bus.uow.unit_of_work() as uow_ctx:
+        uow_ctx.session.execute(orm.posts.update().where(orm.posts.c.id == comment["post_id"]).values(comment_count=42))
+        uow_ctx.session.execute(orm.post_feed.update().where(orm.post_feed.c.id == comment["post_id"]).values(comment_count=42))
+        uow_ctx.session.execute(orm.comments.update().where(orm.comments.c.id == comment["id"]).values(reply_count=0))
+        uow_ctx.commit()
+
+    with query_stats.capture() as captured:
+        bus.handle(commands.ReconcileCountersCommand(batch_size=100))
+    # a transaction per batch of posts or comments, plus the empty batch ending each
+    assert len([s for s in captured if s.name == "reconcile_counters"]) >= 4
+    assert views.get_post(comment["post_id"], bus.uow)["comment_count"] == 2
+    assert views.get_comment(comment["id"], bus.uow)["reply_count"] == 1
+    title = views.get_post(comment["post_id"], bus.uow)["title"]
+    params = schema.GetPostsRequest(title=title, content=None, author_id=None, order=[], limit=5, offset=0)
+    assert [(p["id"], p["comment_count"]) for p in views.get_posts(params, bus.uow, feed=True)] == [(comment["post_id"], 2)]
+
+
+def test_trending_follows_events(bus):
+    author_id = str(uuid.uuid4())
+    params = schema.GetPostsRequest(title=None, content=None, author_id=author_id, order=["+created_time"], limit=3, offset=0)
+    for i in range(3):
+        bus.handle(commands.CreatePostCommand(title=f"trending {i}", content="content", author_id=author_id))
+    quiet, liked, discussed = [post["id"] for post in views.get_posts(params, bus.uow, feed=True)]
+
+    for i in range(3):
+        bus.handle(commands.LikePostCommand(post_id=liked, user_id=f"test_trending_user_{i}"))
+    for _ in range(3):
+        bus.handle(commands.CommentPostCommand(post_id=discussed, user_id="test_trending_user", content="comment"))
+
+    ranked = [post["id"] for post in views.get_trending(1000, bus.uow, bus.ranking)]
+    assert ranked.index(discussed) < ranked.index(liked) < ranked.index(quiet)
+
+    bus.handle(commands.DeletePostCommand(post_id=discussed, user_id=author_id))
+    assert discussed not in [post_id for post_id, _ in bus.ranking.top(1000)]
+
+
+def test_rebuild_trending(bus, comment):
+    bus.handle(commands.RebuildTrendingCommand(batch_size=50))
+    assert comment["post_id"] in dict(bus.ranking.top(100_000))
+
+
+def test_changes_follow_events(bus, post):
+    with bus.uow.unit_of_work() as uow_ctx:
+        since = uow_ctx.session.scalar(sa.select(sa.func.max(orm.changes.c.id)))
+
+    bus.handle(commands.CommentPostCommand(post_id=post["id"], user_id="test_changes_user", content="first"))
+    bus.handle(commands.CommentPostCommand(post_id=post["id"], user_id="test_changes_user", content="second"))
+    first, second = sorted(views.get_comments(post["id"], bus.uow), key=lambda comment: comment["content"])
+    bus.handle(commands.ReplyCommentCommand(comment_id=second["id"], user_id="test_changes_user", content="reply"))
+    bus.handle(commands.EditPostCommand(post_id=post["id"], user_id=post["author_id"], title="synced", content="synced"))
+    bus.handle(commands.DeleteCommentCommand(comment_id=first["id"], user_id="test_changes_user"))
+
+    page = views.get_changes(since, 3, bus.uow)
+    assert page["has_more"]
+    assert [(c["entity"], c["op"]) for c in page["changes"]] == [("comment", "created")] * 2
+    assert {c["comment"]["content"] for c in page["changes"]} == {"second", "reply"}
+
+    rest = views.get_changes(page["cursor"], 100, bus.uow)
+    assert not rest["has_more"]
+    assert [(c["entity"], c["id"], c["op"]) for c in rest["changes"]] == [
+        ("post", post["id"], "edited"),
+        ("comment", first["id"], "deleted"),
+    ]
+    assert rest["changes"][0]["post"]["title"] == "synced"
+    assert "comment" not in rest["changes"][1]
+    assert views.get_changes(rest["cursor"], 100, bus.uow) == {"changes": [], "cursor": rest["cursor"], "has_more": False}
+
+
+def test_changes_commit_with_their_write(bus, post):
+    with bus.uow.unit_of_work() as uow_ctx:
+        since = uow_ctx.session.scalar(sa.select(sa.func.max(orm.changes.c.id)))
+
+    # the command handler alone, without the events that follow it
+    handlers.comment_post(commands.CommentPostCommand(post_id=post["id"], user_id="test_changes_user", content="logged"), bus.uow)
+    [comment] = views.get_comments(post["id"], bus.uow)
+    assert [(c["id"], c["op"]) for c in views.get_changes(since, 100, bus.uow)["changes"]] == [(comment["id"], "created")]
+
+
+def test_changes_log_likes(bus, post):
+    with bus.uow.unit_of_work() as uow_ctx:
+        since = uow_ctx.session.scalar(sa.select(sa.func.max(orm.changes.c.id)))
+
+    bus.handle(commands.LikePostCommand(post_id=post["id"], user_id="test_changes_fan"))
+    [change] = views.get_changes(since, 100, bus.uow)["changes"]
+    assert (change["id"], change["op"], change["post"]["like_count"]) == (post["id"], "edited", 1)
+
+
+def test_changes_wait_for_writes_in_flight(bus, post, sql_session_factory):
+    with bus.uow.unit_of_work() as uow_ctx:
+        since = uow_ctx.session.scalar(sa.select(sa.func.max(orm.changes.c.id)))
+
+    def logged():
+        with bus.uow.unit_of_work() as uow_ctx:
+            return [row.op for row in changes.read(uow_ctx.session, since, 100)[0]]
+
+    with sql_session_factory() as slow:
+        # the slow writer starts first but logs its change after a faster one committed, without waiting on it
+        slow.execute(sa.select(sa.func.pg_current_xact_id()))
+        bus.handle(commands.EditPostCommand(post_id=post["id"], user_id=post["author_id"], title="fast", content="fast"))
+        changes.record(slow, changes.POST, post["id"], post["id"], changes.DELETED)
+        assert logged() == []
+        slow.commit()
+    assert logged() == [changes.DELETED, changes.EDITED]
+
+
+def test_live_updates_follow_events(bus, comment):
+    post_id = comment["post_id"]
+
+    async def main():
+        queue = bus.broadcaster.subscribe(post_id)
+        try:
+            await asyncio.to_thread(bus.handle, commands.LikePostCommand(post_id=post_id, user_id="test_live_user"))
+            await asyncio.to_thread(bus.handle, commands.CommentPostCommand(post_id=post_id, user_id="test_live_user", content="live"))
+            await asyncio.to_thread(
+                bus.handle, commands.ReplyCommentCommand(comment_id=comment["id"], user_id="test_live_user", content="live reply")
+            )
+            bus.broadcaster.flush()
+            first = queue.get_nowait()
+            # deleting the comment deletes the reply with it
+            await asyncio.to_thread(bus.handle, commands.DeleteCommentCommand(comment_id=comment["id"], user_id=comment["author_id"]))
+            bus.broadcaster.flush()
+            return first, queue.get_nowait()
+        finally:
+            bus.broadcaster.unsubscribe(post_id, queue)
+
+    first, second = asyncio.run(main())
+    assert first.startswith(b"event: update\n")
+    assert json.loads(first.split(b"data: ")[1]) == {"post_id": post_id, "like_delta": 1, "comment_delta": 2}
+    assert json.loads(second.split(b"data: ")[1]) == {"post_id": post_id, "like_delta": 0, "comment_delta": -2}
+
+
+def test_get_posts_cache(bus, query_budget):
+    author_id = str(uuid.uuid4())
+    params = schema.GetPostsRequest(title=None, content=None, author_id=author_id, order=["-created_time"], limit=10, offset=0)
+    bus.handle(commands.CreatePostCommand(title="cached", content="cached", author_id=author_id))
+
+    hits = bus.posts_cache.stats.hits
+    assert len(views.get_posts(params, bus.uow, feed=True, cache=bus.posts_cache)) == 1
+    with query_budget(0):
+        assert len(views.get_posts(params, bus.uow, feed=True, cache=bus.posts_cache)) == 1
+
+    bus.handle(commands.CreatePostCommand(title="cached 2", content="cached", author_id=author_id))
+    assert len(views.get_posts(params, bus.uow, feed=True, cache=bus.posts_cache)) == 2
+    assert bus.posts_cache.stats.hits == hits + 1
+
+
+def test_single_flight_views(bus, comment):
+    flights = singleflight.Group()
+    post_id = comment["post_id"]
+
+    assert views.get_post(post_id, bus.uow, flights=flights) == views.get_post(post_id, bus.uow)
+    assert views.get_comments(post_id, bus.uow, flights=flights) == views.get_comments(post_id, bus.uow)
+    assert flights.stats.leaders == 2
+
+
+def test_concurrent_units_of_work_do_not_share_sessions(bus, comment):
+    with concurrent.futures.ThreadPoolExecutor(8) as pool:
+        posts = list(pool.map(lambda _: views.get_post(comment["post_id"], bus.uow), range(32)))
+
+    assert all(post["id"] == comment["post_id"] for post in posts)
+
+
+def test_forked_process_opens_its_own_connections(bus):
+    uow = unit_of_work.SqlAlchemyUnitOfWork()
+    backend_pid = sa.text("SELECT pg_backend_pid()")
+    with uow.session_factory() as session:
+        parent_backend = session.execute(backend_pid).scalar()
+    client = uow.minio_client
+
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            uow.dispose(close=False)
+            with uow.session_factory() as session:
+                child_backend = session.execute(backend_pid).scalar()
+            os.write(write, json.dumps([child_backend, uow.minio_client is client]).encode())
+        finally:
+            os._exit(0)
+    os.close(write)
+    with os.fdopen(read) as f:
+        child_backend, same_client = json.load(f)
+    os.waitpid(pid, 0)
+
+    assert child_backend != parent_backend
+    assert not same_client
+    with uow.session_factory() as session:
+        assert session.execute(backend_pid).scalar() == parent_backend
+    uow.dispose()
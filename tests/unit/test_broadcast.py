@@ -0,0 +1,87 @@
+import asyncio
+import json
+import threading
+
+from src.app.adapters import broadcast
+
+
+def updates(queue: asyncio.Queue) -> list[tuple[str, dict]]:
+    messages = []
+    while not queue.empty():
+        event, data = queue.get_nowait().decode().strip().split("\n")
+        messages.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return messages
+
+
+def test_deltas_within_a_window_are_coalesced():
+    async def main():
+        broadcaster = broadcast.Broadcaster(window=60)
+        queue = broadcaster.subscribe("post")
+
+        threads = [threading.Thread(target=broadcaster.publish, args=("post",), kwargs={"like_delta": 1}) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        broadcaster.publish("post", like_delta=-1)
+        broadcaster.publish("post", comment_delta=1)
+        broadcaster.publish("post", version=3)
+        broadcaster.publish("post", version=2)
+        broadcaster.flush()
+
+        assert updates(queue) == [("update", {"post_id": "post", "like_delta": 9, "comment_delta": 1, "version": 3})]
+        broadcaster.flush()
+        assert updates(queue) == []
+
+    asyncio.run(main())
+
+
+def test_one_message_is_shared_by_every_subscriber():
+    async def main():
+        broadcaster = broadcast.Broadcaster(window=60)
+        queues = [broadcaster.subscribe("post") for _ in range(1000)]
+        other = broadcaster.subscribe("other")
+
+        broadcaster.publish("post", like_delta=1)
+        broadcaster.publish("unwatched", like_delta=1)
+        broadcaster.flush()
+
+        messages = [queue.get_nowait() for queue in queues]
+        assert all(message is messages[0] for message in messages)
+        assert other.empty()
+        assert broadcaster.stats.model_dump() == {"published": 1, "messages": 1, "deliveries": 1000, "resyncs": 0}
+
+    asyncio.run(main())
+
+
+def test_slow_subscribers_are_told_to_resync():
+    async def main():
+        broadcaster = broadcast.Broadcaster(window=60, queue_size=2)
+        queue = broadcaster.subscribe("post")
+        for _ in range(3):
+            broadcaster.publish("post", like_delta=1)
+            broadcaster.flush()
+
+        assert updates(queue) == [("resync", {})]
+        assert broadcaster.stats.resyncs == 1
+
+    asyncio.run(main())
+
+
+def test_stream_sends_updates_and_heartbeats_then_unsubscribes():
+    async def main():
+        broadcaster = broadcast.Broadcaster(window=0.01)
+        stream = broadcaster.stream("post", first=b"event: ready\n\n", heartbeat=0.05)
+
+        assert await anext(stream) == b"event: ready\n\n"
+        assert broadcaster.subscribers("post") == 1
+        broadcaster.publish("post", like_delta=1)
+        assert b'"like_delta":1' in await anext(stream)
+        assert await anext(stream) == b": ping\n\n"
+
+        await stream.aclose()
+        assert broadcaster.subscribers("post") == 0
+        broadcaster.publish("post", like_delta=1)
+        assert broadcaster.stats.published == 1
+
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+import threading
+import time
+
+from src.app.adapters import cache
+
+
+def test_hits_until_the_generation_moves():
+    posts_cache = cache.ResultCache(max_entries=10, ttl=60)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert posts_cache.get_or_compute("all", None, compute) == 1
+    assert posts_cache.get_or_compute("alice", "alice", compute) == 2
+    assert posts_cache.get_or_compute("all", None, compute) == 1
+    assert posts_cache.get_or_compute("alice", "alice", compute) == 2
+
+    posts_cache.invalidate("bob")
+    assert posts_cache.get_or_compute("all", None, compute) == 3
+    assert posts_cache.get_or_compute("alice", "alice", compute) == 2
+
+    posts_cache.invalidate("alice")
+    assert posts_cache.get_or_compute("alice", "alice", compute) == 4
+    assert posts_cache.stats.model_dump() == {
+        "hits": 3,
+        "misses": 4,
+        "invalidated": 2,
+        "expired": 0,
+        "evicted": 0,
+        "coalesced": 0,
+        "hit_rate": 0.4286,
+    }
+
+
+def test_entries_expire_and_are_evicted_least_recently_used_first():
+    posts_cache = cache.ResultCache(max_entries=2, ttl=0.05)
+    for key in ["a", "b", "a", "c"]:
+        posts_cache.get_or_compute(key, None, lambda: key)
+
+    assert len(posts_cache) == 2
+    assert posts_cache.stats.evicted == 1
+    assert posts_cache.get_or_compute("b", None, lambda: "recomputed") == "recomputed"
+
+    time.sleep(0.06)
+    assert posts_cache.get_or_compute("b", None, lambda: "expired") == "expired"
+    assert posts_cache.stats.expired == 1
+
+
+def test_dropped_authors_never_validate_old_entries():
+    posts_cache = cache.ResultCache(max_entries=10, ttl=60, generations=cache.Generations(max_authors=1))
+    posts_cache.get_or_compute("alice", "alice", lambda: "before")
+    posts_cache.invalidate("alice")
+    posts_cache.invalidate("bob")  # drops alice
+
+    assert posts_cache.get_or_compute("alice", "alice", lambda: "after") == "after"
+
+
+def test_concurrent_misses_compute_once():
+    posts_cache = cache.ResultCache(max_entries=10, ttl=60)
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(1)
+        return "page"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(posts_cache.get_or_compute("k", None, compute))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["page"] * 8
+    assert len(calls) == 1
+    assert posts_cache.stats.coalesced >= 1
@@ -0,0 +1,138 @@
+from unittest.mock import ANY
+
+import pytest
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+
+from src.app import bootstrap
+from src.app import views
+from src.app.adapters import file_storage
+from src.app.adapters import repository
+from src.app.adapters import trending
+from src.app.domain import commands
+from src.app.domain import model
+from src.app.entrypoints import schema
+from src.app.service_layer import unit_of_work
+
+
+def in_memory_bus():
+    return bootstrap.bootstrap(start_orm=False, uow=unit_of_work.InMemoryUnitOfWork())
+
+
+def create_post(bus, title: str = "in memory") -> dict:
+    bus.handle(commands.CreatePostCommand(title=title, content="content", author_id="author"))
+    [post] = views.find_post(title, bus.uow)
+    return post
+
+
+def test_posts_likes_and_images_in_memory():
+    bus = in_memory_bus()
+    post_id = create_post(bus)["id"]
+
+    bus.handle(commands.LikePostCommand(post_id=post_id, user_id="fan"))
+    bus.handle(commands.LikePostCommand(post_id=post_id, user_id="other fan"))
+    bus.handle(commands.LikePostCommand(post_id=post_id, user_id="fan"))
+    image = UploadFile(open("tests/assets/test_image.png", "rb"), filename="image.png", headers=Headers({"content-type": "image/png"}))
+    bus.handle(commands.AttachImageCommand(post_id=post_id, user_id="author", images=[image]))
+
+    post = views.get_post(post_id, bus.uow)
+    assert post["like_count"] == 1
+    # the unlike took back exactly the like's weight
+    assert dict(bus.ranking.top(1))[post_id] == pytest.approx(trending.POST_WEIGHT + trending.LIKE_WEIGHT, rel=1e-3)
+    assert [image["link"] for image in post["images"]] == [f"memory://posts/posts/{post_id}/image.png"]
+    assert [path for path, _ in bus.uow.minio.iter_paths("posts/")] == [f"posts/{post_id}/image.png"]
+
+    bus.handle(commands.DeletePostCommand(post_id=post_id, user_id="author"))
+    assert views.find_post("in memory", bus.uow) == []
+
+
+def test_comment_threads_in_memory():
+    bus = in_memory_bus()
+    post_id = create_post(bus)["id"]
+
+    bus.handle(commands.CommentPostCommand(post_id=post_id, user_id="commenter", content="comment"))
+    [comment] = views.get_comments(post_id, bus.uow)
+    bus.handle(commands.ReplyCommentCommand(comment_id=comment["id"], user_id="replier", content="reply"))
+    [reply] = views.get_reply_comments(comment["id"], bus.uow)
+    bus.handle(commands.ReplyCommentCommand(comment_id=reply["id"], user_id="replier", content="reply to reply"))
+
+    assert [c["content"] for c in views.get_comments(post_id, bus.uow)] == ["comment", "reply", "reply to reply"]
+    assert views.get_post(post_id, bus.uow)["comment_count"] == 3
+    assert views.get_comment(comment["id"], bus.uow)["reply_count"] == 1
+
+    bus.handle(commands.DeleteCommentCommand(comment_id=reply["id"], user_id="replier"))
+    assert [c["content"] for c in views.get_comments(post_id, bus.uow)] == ["comment"]
+    assert views.get_post(post_id, bus.uow)["comment_count"] == 1
+    assert views.get_comment(comment["id"], bus.uow)["reply_count"] == 0
+    assert dict(bus.ranking.top(1))[post_id] == pytest.approx(trending.POST_WEIGHT + trending.COMMENT_WEIGHT, rel=1e-3)
+
+    bus.handle(commands.DeletePostCommand(post_id=post_id, user_id="author"))
+    assert views.get_comments(post_id, bus.uow) == []
+    assert views.get_comment(comment["id"], bus.uow) is None
+
+
+def test_in_memory_repository_indexes():
+    comments = repository.InMemoryRepository(model.Comment)
+    first = model.Comment.create("first", "author", 0, post_id="post")
+    reply = model.Comment.create("reply", "author", 1, post_id="post", comment_id=first.id)
+    other = model.Comment.create("other", "author", 0, post_id="other post")
+    for comment in (first, reply, other):
+        comments.add(comment)
+
+    assert comments.query(post_id="post") == [first, reply]
+    assert comments.query(comment_id=[first.id, other.id]) == [reply]
+    assert comments.query(post_id="post", level=1) == [reply]
+    assert comments.query(author_id="author", content="other") == [other]
+    assert comments.get(reply.id) is reply and reply.replies is first
+
+    comments.delete(reply)
+    assert comments.query(comment_id=first.id) == []
+    assert comments.indexes["post_id"]["post"] == {first.id: None}
+
+
+def test_in_memory_file_storage_lists_after_a_path():
+    storage = file_storage.InMemoryFileStorage()
+    for name in ("b", "a", "c"):
+        storage.add(f"posts/{name}.png", UploadFile(open("tests/assets/test_image.png", "rb"), filename=f"{name}.png"))
+
+    assert [path for path, _ in storage.iter_paths("posts/", start_after="posts/a.png")] == ["posts/b.png", "posts/c.png"]
+    assert storage.delete_many(["posts/a.png", "posts/missing.png"]) == []
+    assert sorted(storage.objects) == ["posts/b.png", "posts/c.png"]
+
+
+def test_feed_reads_and_maintenance_in_memory():
+    bus = in_memory_bus()
+    first, second = create_post(bus, "first post")["id"], create_post(bus, "second post")["id"]
+    bus.handle(commands.LikePostCommand(post_id=second, user_id="fan"))
+    bus.handle(commands.CommentPostCommand(post_id=first, user_id="commenter", content="comment"))
+    image = UploadFile(open("tests/assets/test_image.png", "rb"), filename="image.png", headers=Headers({"content-type": "image/png"}))
+    bus.handle(commands.AttachImageCommand(post_id=first, user_id="author", images=[image]))
+
+    params = schema.GetPostsRequest(title=None, content=None, author_id="author", order=["-like_count", "+title"], limit=10, offset=0)
+    for feed, core in ((True, False), (False, True), (False, False)):
+        assert [post["id"] for post in views.get_posts(params, bus.uow, core=core, feed=feed)] == [second, first]
+    params = schema.GetPostsRequest(
+        title="first", content=None, author_id=None, order=["-created_time"], limit=10, offset=0, fields=["title"], content_preview_len=3
+    )
+    assert views.get_posts(params, bus.uow, feed=True) == [{"id": first, "title": "first post"}]
+    assert views.get_post_etag(first, bus.uow) != views.get_post_etag(second, bus.uow)
+    assert [post["id"] for post in views.get_trending(2, bus.uow, bus.ranking)] == [first, second]
+    changes = views.get_changes(0, 10, bus.uow)
+    assert [(change["entity"], change["id"]) for change in changes["changes"]][-2:] == [("comment", ANY), ("post", first)]
+    assert views.get_changes(changes["cursor"], 10, bus.uow) == {"changes": [], "cursor": changes["cursor"], "has_more": False}
+
+    bus.uow.posts.get(first).comment_count = 5
+    bus.handle(commands.RebuildPostFeedCommand())
+    bus.handle(commands.ReconcileCountersCommand())
+    assert views.get_post(first, bus.uow)["comment_count"] == 1
+    bus.handle(commands.RebuildTrendingCommand())
+    assert [post_id for post_id, _ in bus.ranking.top(2)] == [first, second]
+
+    bus.handle(commands.DeletePostCommand(post_id=first, user_id="author"))
+    bus.handle(commands.PurgeDeletedPostsCommand())
+    assert first not in bus.uow.posts.records and bus.uow.comments.records == {} and bus.uow.images.records == {}
+    assert list(bus.uow.minio.iter_paths("posts/")) == []
+
+    bus.uow.minio.add("posts/orphan.png", UploadFile(open("tests/assets/test_image.png", "rb"), filename="orphan.png"))
+    bus.handle(commands.SweepOrphanImagesCommand(min_age_seconds=0))
+    assert list(bus.uow.minio.iter_paths("posts/")) == []
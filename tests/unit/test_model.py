@@ -0,0 +1,21 @@
+import time
+import uuid
+
+from src.app.domain import model
+
+
+def test_uuid7_is_time_ordered():
+    first = model.uuid7()
+    time.sleep(0.002)
+    second = model.uuid7()
+
+    assert first < second
+    assert uuid.UUID(first).version == 7
+    assert uuid.UUID(first).variant == uuid.RFC_4122
+
+
+def test_new_records_get_uuid7_ids():
+    post = model.Post.create("title", "content", "author_id")
+
+    assert uuid.UUID(post.id).version == 7
+    assert post.events == [model.events.CreatedPostEvent(post_id=post.id, author_id=post.author_id)]
@@ -0,0 +1,101 @@
+import datetime
+
+import pytest
+
+from src.app.adapters import file_storage
+from src.app.adapters import orphans
+
+OLD = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class FakeFileStorage(file_storage.AbstractFileStorage):
+    def __init__(self, objects: dict[str, datetime.datetime], broken: frozenset[str] | set[str] = frozenset()):
+        super().__init__()
+        self.objects = objects
+        self.broken = broken
+        self.pages: list[int] = []
+
+    def _add(self, path, f, **kwargs):
+        raise NotImplementedError
+
+    def _get(self, path):
+        raise NotImplementedError
+
+    def _edit(self, path, f):
+        raise NotImplementedError
+
+    def _delete(self, path):
+        if path in self.broken:
+            raise OSError(path)
+        del self.objects[path]
+
+    def _iter_paths(self, prefix, start_after):
+        for path in sorted(self.objects):
+            if path.startswith(prefix) and (start_after is None or path > start_after):
+                yield path, self.objects[path]
+
+
+def storage_and_rows(n: int) -> tuple[FakeFileStorage, set[str]]:
+    objects = {f"posts/{i:04}/image.png": OLD for i in range(n)}
+    return FakeFileStorage(objects), {path for i, path in enumerate(sorted(objects)) if i % 3}
+
+
+def test_sweep_deletes_only_orphans_page_by_page():
+    storage, rows = storage_and_rows(100)
+    storage.objects["posts/new/image.png"] = datetime.datetime.now(datetime.timezone.utc)
+    storage.objects["other/image.png"] = OLD
+    lookups = []
+
+    def lookup(paths):
+        lookups.append(len(paths))
+        return rows & set(paths)
+
+    stats = orphans.sweep(storage, lookup, page_size=10)
+
+    assert set(storage.objects) == rows | {"posts/new/image.png", "other/image.png"}
+    assert max(lookups) == 10
+    assert stats.model_dump() == {
+        "listed": 101,
+        "referenced": len(rows),
+        "recent": 1,
+        "orphans": 34,
+        "deleted": 34,
+        "failed": 0,
+        "last_path": "posts/new/image.png",
+    }
+
+
+def test_dry_run_and_resume():
+    storage, rows = storage_and_rows(30)
+    before = dict(storage.objects)
+
+    stats = orphans.sweep(storage, lambda paths: rows & set(paths), page_size=7, dry_run=True)
+    assert storage.objects == before
+    assert (stats.orphans, stats.deleted) == (10, 0)
+
+    resumed = orphans.sweep(storage, lambda paths: rows & set(paths), page_size=7, start_after="posts/0014/image.png")
+    assert resumed.listed == 15
+    assert resumed.deleted == 5
+    assert "posts/0000/image.png" in storage.objects
+
+
+def test_failed_deletes_are_counted():
+    storage, rows = storage_and_rows(6)
+    storage.broken = {"posts/0003/image.png"}
+
+    stats = orphans.sweep(storage, lambda paths: rows & set(paths))
+    assert (stats.deleted, stats.failed) == (1, 1)
+    assert "posts/0003/image.png" in storage.objects
+
+
+def test_pacer_spaces_out_batches(monkeypatch):
+    sleeps: list[float] = []
+    clock = iter(range(100))
+    monkeypatch.setattr(orphans.time, "monotonic", lambda: next(clock) * 0.01)
+    monkeypatch.setattr(orphans.time, "sleep", sleeps.append)
+
+    pacer = orphans._Pacer(rate=100)
+    for _ in range(3):
+        pacer.wait(50)
+
+    assert sleeps == pytest.approx([0.49, 0.98])
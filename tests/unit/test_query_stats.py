@@ -0,0 +1,20 @@
+from src.app.adapters import query_stats
+
+
+def test_statement_shape_ignores_bound_values():
+    a = query_stats.statement_shape("SELECT * FROM images\n WHERE images.post_id IN (%(post_id_1_1)s, %(post_id_1_2)s)")
+    b = query_stats.statement_shape("SELECT * FROM images WHERE images.post_id IN (%(post_id_1_1)s)")
+
+    assert a == b == "SELECT * FROM images WHERE images.post_id IN (?)"
+
+
+def test_repeated_statements_are_n_plus_one_suspects():
+    stats = query_stats.QueryStats("get_posts")
+    stats.record("SELECT * FROM posts", 3, 0.001)
+    for _ in range(3):
+        stats.record("SELECT * FROM images WHERE %(param_1)s = images.post_id", 1, 0.001)
+
+    assert stats.statements == 4
+    assert stats.rows == 6
+    assert stats.n_plus_one_suspects(threshold=3) == [("SELECT * FROM images WHERE %(param_1)s = images.post_id", 3)]
+    assert stats.n_plus_one_suspects(threshold=4) == []
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.app.adapters import singleflight
+
+
+def run_concurrently(n: int, fn):
+    results, errors = [], []
+
+    def target():
+        try:
+            results.append(fn())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=target) for _ in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def wait_for_followers(flights: singleflight.Group, n: int):
+    # the leader's read outlasts the other threads joining it, however slowly they are scheduled
+    deadline = time.monotonic() + 1
+    while flights.stats.followers < n and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+def test_concurrent_calls_share_one_run():
+    flights = singleflight.Group(timeout=1)
+    calls = []
+
+    def read():
+        calls.append(1)
+        wait_for_followers(flights, 7)
+        return {"id": "post"}
+
+    results, errors = run_concurrently(8, lambda: flights.do("post", read))
+
+    assert errors == []
+    assert len(calls) == 1
+    assert results == [{"id": "post"}] * 8
+    assert flights.stats.model_dump() == {"leaders": 1, "followers": 7, "timeouts": 0}
+    assert flights.do("post", read) == {"id": "post"}
+    assert len(calls) == 2
+
+
+def test_errors_reach_every_caller():
+    flights = singleflight.Group(timeout=1)
+
+    def read():
+        wait_for_followers(flights, 3)
+        raise LookupError("no such post")
+
+    results, errors = run_concurrently(4, lambda: flights.do("post", read))
+
+    assert results == []
+    assert len(errors) == 4
+    assert all(isinstance(e, LookupError) for e in errors)
+
+
+def test_followers_time_out():
+    flights = singleflight.Group(timeout=1)
+    release = threading.Event()
+    leader = threading.Thread(target=lambda: flights.do("post", lambda: release.wait(1)))
+    leader.start()
+    time.sleep(0.02)
+
+    with pytest.raises(TimeoutError):
+        flights.do("post", lambda: "unused", timeout=0.01)
+    release.set()
+    leader.join()
+    assert flights.stats.timeouts == 1
+
+
+def test_async_group():
+    flights = singleflight.AsyncGroup(timeout=1)
+    calls = []
+
+    async def read():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "post"
+
+    async def fail():
+        await asyncio.sleep(0.05)
+        raise LookupError("no such post")
+
+    async def main():
+        assert await asyncio.gather(*[flights.do("post", read) for _ in range(5)]) == ["post"] * 5
+        errors = await asyncio.gather(*[flights.do("missing", fail) for _ in range(3)], return_exceptions=True)
+        assert all(isinstance(e, LookupError) for e in errors)
+        slow = asyncio.ensure_future(flights.do("slow", read))
+        with pytest.raises(TimeoutError):
+            await flights.do("slow", read, timeout=0.01)
+        assert await slow == "post"
+
+    asyncio.run(main())
+    assert len(calls) == 2
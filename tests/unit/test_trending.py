@@ -0,0 +1,72 @@
+import time
+
+import pytest
+
+from src.app.adapters import trending
+from src.app.domain import events
+
+
+def test_heap_sorted_set_top_skips_stale_entries():
+    scores = trending.HeapSortedSet()
+    for member, amount in [("a", 1), ("b", 2), ("c", 3), ("a", 5), ("c", -2)]:
+        scores.incr(member, amount)
+    scores.remove("b")
+
+    assert scores.top(2) == [("a", 6), ("c", 1)]
+    assert scores.top(10) == [("a", 6), ("c", 1)]
+
+    scores.incr("c", -5)
+    assert scores.top(10) == [("a", 6), ("c", 0)]
+
+
+def test_heap_sorted_set_compacts_stale_entries():
+    scores = trending.HeapSortedSet()
+    for i in range(1000):
+        scores.incr("a", 1)
+
+    assert len(scores._heap) <= 2 * len(scores) + 64
+    assert scores.top(1) == [("a", 1000)]
+
+
+def test_recent_events_outrank_older_ones():
+    ranking = trending.Trending(trending.HeapSortedSet(), half_life=3600)
+    now = time.time()
+    ranking.record("old", 3, at=now - 2 * 3600)
+    ranking.record("new", 1, at=now)
+
+    [(first, first_score), (second, second_score)] = ranking.top(2)
+    assert (first, second) == ("new", "old")
+    assert abs(first_score - 1) < 1e-3
+    assert abs(second_score - 0.75) < 1e-3
+
+
+def test_unlike_takes_back_only_what_the_like_adds():
+    ranking = trending.Trending(trending.HeapSortedSet(), half_life=3600)
+    now = time.time()
+    ranking.record("post", trending.WEIGHTS[events.LikedPostEvent], at=now - 3 * 3600)
+    ranking.record("post", trending.WEIGHTS[events.LikedPostEvent])
+    ranking.record("post", -trending.LIKE_WEIGHT, at=now - 3 * 3600)
+
+    [(_, score)] = ranking.top(1)
+    assert score == pytest.approx(trending.LIKE_WEIGHT, rel=1e-3)
+
+
+def test_overshooting_unlike_leaves_no_negative_score():
+    ranking = trending.Trending(trending.HeapSortedSet(), half_life=3600)
+    now = time.time()
+    ranking.record("post", trending.WEIGHTS[events.LikedPostEvent], at=now - 3 * 3600)
+    ranking.record("post", -trending.LIKE_WEIGHT)
+
+    assert ranking.top(1) == [("post", 0)]
+
+
+def test_renormalize_keeps_order_and_decayed_scores():
+    ranking = trending.Trending(trending.HeapSortedSet(), half_life=3600)
+    ranking.record("a", 2)
+    ranking.record("b", 1)
+    before = ranking.top(2)
+
+    ranking.renormalize(time.time() + 3600)
+
+    assert [post_id for post_id, _ in ranking.top(2)] == ["a", "b"]
+    assert ranking.sorted_set.top(2) == [("a", pytest.approx(before[0][1] / 2)), ("b", pytest.approx(before[1][1] / 2))]